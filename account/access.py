@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Profile
+
+
+class UserAccess:
+    """
+    Role of a user and the ids of the datasets they can access.
+    """
+
+    def __init__(self, role, dataset_ids):
+        self.role = role
+        self.dataset_ids = frozenset(dataset_ids)
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_operator(self):
+        return self.role == 'operator'
+
+    def can_access(self, dataset_id):
+        try:
+            return self.is_admin or int(dataset_id) in self.dataset_ids
+        except (TypeError, ValueError):
+            return False
+
+
+def access_cache_key(user_id):
+    return f"account:access:{user_id}"
+
+
+def access_version_key(user_id):
+    return f"account:access-version:{user_id}"
+
+
+def get_user_access(user):
+    """
+    Return the UserAccess of a user from the cache, loading it from the database
+    on a miss. The result is also kept on the user object for the rest of the request,
+    users authenticated with an access token get it from the claims of the token.
+    """
+    if not user.is_authenticated:
+        return UserAccess(None, ())
+
+    access = getattr(user, '_dataset_access', None)
+    if access is not None:
+        return access
+
+    key = access_cache_key(user.pk)
+    data = cache.get(key)
+
+    if data is None:
+        data = load_user_access(user)
+        cache.set(key, data, settings.DATASET_ACCESS_CACHE_TIMEOUT)
+
+    access = UserAccess(*data)
+    user._dataset_access = access
+    return access
+
+
+def load_user_access(user):
+    """
+    Return (role, sorted dataset ids) of a user from the database.
+    """
+    role = Profile.objects.filter(user_id=user.pk).values_list('role', flat=True).first()
+    if user.is_superuser:
+        role = 'admin'
+
+    dataset_ids = sorted(
+        Profile.available_datasets.through.objects
+        .filter(profile__user_id=user.pk)
+        .values_list('dataset_id', flat=True)
+    )
+    return role, dataset_ids
+
+
+def get_access_version(user_id):
+    """
+    Version of the access of a user, changed when their access is invalidated and kept
+    as long as an access token lives: tokens issued before the change are rejected.
+    """
+    return cache.get(access_version_key(user_id))
+
+
+def invalidate_user_access(*user_ids):
+    cache.delete_many([access_cache_key(user_id) for user_id in user_ids])
+
+    # Kept as long as the access tokens issued before the change
+    version = time.time_ns()
+    cache.set_many(
+        {access_version_key(user_id): version for user_id in user_ids},
+        settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds(),
+    )
@@ -3,6 +3,9 @@ from django.contrib import admin
 from .models import Profile
 
 
-admin.site.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    # Profile.__str__ reads the user
+    list_select_related = ['user']
 
 
+admin.site.register(Profile, ProfileAdmin)
@@ -0,0 +1,22 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .access import UserAccess
+from .tokens import is_token_revoked
+
+
+class AccessTokenAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticate "Authorization: Bearer <access token>" requests without any database query:
+    the user is a TokenUser built from the claims, and their UserAccess (role and
+    accessible datasets, see account.access.get_user_access) comes from the token too.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed("Token has been revoked.", code='token_revoked')
+
+        user._dataset_access = UserAccess(validated_token.get('role'), validated_token.get('datasets', ()))
+        return user
@@ -16,6 +16,14 @@ class Profile(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.role}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        # Remember the role to invalidate the cached access only when it changes
+        instance._loaded_role = instance.__dict__.get('role')
+        return instance
     
     
     def save(self, *args, **kwargs):
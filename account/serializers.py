@@ -1,11 +1,18 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (TokenObtainPairSerializer,
+                                                  TokenRefreshSerializer)
+from rest_framework_simplejwt.settings import api_settings
+from config.middleware import ProfiledSerializerMixin
 from .models import Profile
+from .tokens import AccessRefreshToken
+from datasets.fields import BulkPrimaryKeyRelatedField
 from datasets.models import Dataset
 
 
-class OperatorCreateSerializer(serializers.ModelSerializer):
-    available_datasets = serializers.PrimaryKeyRelatedField(
+class OperatorCreateSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    available_datasets = BulkPrimaryKeyRelatedField(
         queryset=Dataset.objects.all(), many=True, required=False
     )
     role = serializers.ChoiceField(choices=Profile.ROLE_CHOICES, default='operator')
@@ -36,11 +43,38 @@ class OperatorCreateSerializer(serializers.ModelSerializer):
         return user
     
 
-class UpdateAvailableDatasetsSerializer(serializers.ModelSerializer):
-    available_datasets = serializers.PrimaryKeyRelatedField(
+class UpdateAvailableDatasetsSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    available_datasets = BulkPrimaryKeyRelatedField(
         queryset=Dataset.objects.all(), many=True
     )
 
     class Meta:
         model = Profile
-        fields = ['available_datasets']
\ No newline at end of file
+        fields = ['available_datasets']
+
+class AccessTokenObtainSerializer(TokenObtainPairSerializer):
+    token_class = AccessRefreshToken
+
+
+class AccessTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Rotate a refresh token: the old one is blacklisted and the new tokens
+    carry the current role and datasets of the user.
+    """
+    token_class = AccessRefreshToken
+
+    def validate(self, attrs):
+        # Checks the signature, the expiry and the blacklist
+        refresh = self.token_class(attrs['refresh'])
+
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed("User not found or inactive.", code='user_inactive')
+
+        refresh.blacklist()
+        new_refresh = self.token_class.for_user(user)
+        return {'access': str(new_refresh.access_token), 'refresh': str(new_refresh)}
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
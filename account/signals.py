@@ -1,6 +1,12 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from datasets.models import Dataset
+
+from .access import invalidate_user_access
 from .models import Profile
 
 
@@ -11,3 +17,46 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
         
     instance.profile.save()
+
+
+def invalidate_user_access_on_commit(user_ids):
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_user_access(*user_ids))
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_access_on_role_change(sender, instance, created, **kwargs):
+    # Every User save saves the profile: the access tokens are only revoked when the role changes,
+    # the available datasets are followed by m2m_changed
+    if created or instance.role != getattr(instance, '_loaded_role', None):
+        invalidate_user_access_on_commit([instance.user_id])
+
+    instance._loaded_role = instance.role
+
+
+@receiver(post_delete, sender=Profile)
+def invalidate_access_on_profile_delete(sender, instance, **kwargs):
+    invalidate_user_access_on_commit([instance.user_id])
+
+
+@receiver(m2m_changed, sender=Profile.available_datasets.through)
+def invalidate_access_on_available_datasets_change(sender, instance, action, reverse, pk_set, **kwargs):
+
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_user_access_on_commit([instance.user_id])
+        return
+
+    # From the dataset side, pk_set holds profile ids
+    if action in ('post_add', 'post_remove'):
+        invalidate_user_access_on_commit(
+            Profile.objects.filter(pk__in=pk_set).values_list('user_id', flat=True)
+        )
+    elif action == 'pre_clear':
+        invalidate_user_access_on_commit(instance.operators.values_list('user_id', flat=True))
+
+
+@receiver(pre_delete, sender=Dataset)
+def invalidate_access_on_dataset_delete(sender, instance, **kwargs):
+    invalidate_user_access_on_commit(instance.operators.values_list('user_id', flat=True))
@@ -1,3 +1,174 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from datasets.models import Dataset
+from datasets.tests import DatasetTestCase, QueryBudgetTestCase
+
+from .access import get_user_access
+from .models import Profile
+
+
+class AccountQueryBudgetTests(QueryBudgetTestCase):
+
+    def create_operators(self, count):
+        start = User.objects.count()
+        for index in range(count):
+            Profile.objects.get_or_create(user=User.objects.create_user(f'operator{start + index}', password='operator'))
+
+    def test_create_operator(self):
+        self.assertQueryBudget(
+            lambda: self.client.post('/account/CreateOperator/',
+                                     {'username': f'operator{User.objects.count()}', 'password': 'operator',
+                                      'available_datasets': list(Dataset.objects.values_list('id', flat=True))},
+                                     format='json'),
+            self.create_datasets,
+        )
+
+    def test_update_operator_available_datasets(self):
+        profile = Profile.objects.get(user=self.create_operator([]))
+        self.assertQueryBudget(
+            lambda: self.client.put(f'/account/UpdateOperatorAvailableDatasets/{profile.pk}/',
+                                    {'available_datasets': list(Dataset.objects.values_list('id', flat=True))},
+                                    format='json'),
+            self.create_datasets,
+        )
+
+    def test_profile_changelist(self):
+        self.client.force_login(self.admin)
+        self.assertQueryBudget(
+            lambda: self.client.get('/admin/account/profile/'),
+            self.create_operators,
+        )
+
+
+class AccessCacheTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.operator = self.create_operator([self.dataset])
+
+    def access(self):
+        # A new user object for every request, like the authentication does
+        return get_user_access(User.objects.get(pk=self.operator.pk))
+
+    def assertAccess(self, role, dataset_ids):
+        access = self.access()
+        self.assertEqual((access.role, access.dataset_ids), (role, frozenset(dataset_ids)))
+
+    def test_access_cached(self):
+        self.assertAccess('operator', [self.dataset.id])
+
+        user = User.objects.get(pk=self.operator.pk)
+        with CaptureQueriesContext(connection) as queries:
+            access = get_user_access(user)
+            self.assertIs(get_user_access(user), access)
+        self.assertEqual(len(queries), 0)
+        self.assertTrue(access.can_access(str(self.dataset.id)))
+        self.assertFalse(access.can_access('unknown'))
+
+    def test_invalidated_when_the_access_changes(self):
+        other = Dataset.objects.create(name='other')
+        self.assertAccess('operator', [self.dataset.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.operator.profile.available_datasets.add(other)
+        self.assertAccess('operator', [self.dataset.id, other.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.operators.clear()
+        self.assertAccess('operator', [self.dataset.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dataset.delete()
+        self.assertAccess('operator', [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.get(user=self.operator).delete()
+        self.assertAccess(None, [])
+
+    def test_permission(self):
+        other = Dataset.objects.create(name='other')
+        client = APIClient()
+
+        def get_tags():
+            client.force_authenticate(User.objects.get(pk=self.operator.pk))
+            return client.get(f'/api/GetListOfTagsOfDatasetByDatasetID/{other.id}/')
+
+        self.assertEqual(get_tags().status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/account/UpdateOperatorAvailableDatasets/{self.operator.profile.pk}/',
+                            {'available_datasets': [other.id]}, format='json')
+        self.assertEqual(get_tags().status_code, 200)
+
+
+class TokenAuthenticationTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.operator = self.create_operator([self.dataset])
+        self.tokens = self.login()
+
+    def login(self):
+        response = APIClient().post('/account/TokenLogin/', {'username': 'operator', 'password': 'operator'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def get_tags(self, access, dataset=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client.get(f'/api/GetListOfTagsOfDatasetByDatasetID/{(dataset or self.dataset).id}/')
+
+    def test_no_session_user_or_access_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_tags(self.tokens['access'])
+
+        self.assertEqual(response.status_code, 200)
+        tables = ('auth_user', 'django_session', 'account_profile', 'token_blacklist')
+        self.assertFalse([query['sql'] for query in queries if any(table in query['sql'] for table in tables)])
+
+    def test_refresh_reads_the_current_access(self):
+        other = Dataset.objects.create(name='other')
+        self.assertEqual(self.get_tags(self.tokens['access'], other).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/account/UpdateOperatorAvailableDatasets/{self.operator.profile.pk}/',
+                            {'available_datasets': [self.dataset.id, other.id]}, format='json')
+        # Issued before the change of access
+        self.assertEqual(self.get_tags(self.tokens['access'], other).status_code, 401)
+
+        response = APIClient().post('/account/TokenRefresh/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.get_tags(response.data['access'], other).status_code, 200)
+
+        # Refresh tokens are rotated
+        response = APIClient().post('/account/TokenRefresh/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_saves_keep_the_tokens(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.login(username='operator', password='operator'))
+            self.operator.first_name = 'Operator'
+            self.operator.save()
+        self.assertEqual(self.get_tags(self.tokens['access']).status_code, 200)
+
+        # A change of role revokes them
+        with self.captureOnCommitCallbacks(execute=True):
+            self.operator.is_superuser = True
+            self.operator.save()
+        self.assertEqual(self.get_tags(self.tokens['access']).status_code, 401)
+
+    def test_revoke(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        response = client.post('/account/TokenRevoke/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self.get_tags(self.tokens['access']).status_code, 401)
+        response = APIClient().post('/account/TokenRefresh/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+        # Other tokens of the user are still valid
+        self.assertEqual(self.get_tags(self.login()['access']).status_code, 200)
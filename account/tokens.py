@@ -0,0 +1,55 @@
+import time
+
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .access import access_version_key, get_access_version, load_user_access
+
+
+def revoked_token_key(jti):
+    return f"account:revoked-token:{jti}"
+
+
+class AccessRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the role and the accessible datasets
+    of the user, read when the token is issued or refreshed.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+
+        role, dataset_ids = load_user_access(user)
+        token['username'] = user.username
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['role'] = role
+        token['datasets'] = dataset_ids
+        token['access_version'] = get_access_version(user.pk)
+        return token
+
+
+def is_token_revoked(token):
+    """
+    Return True if an access token was revoked (logout) or issued before a change of the
+    access of its user. One cache round trip, no database query.
+    """
+    user_id = token[api_settings.USER_ID_CLAIM]
+    revoked_key = revoked_token_key(token[api_settings.JTI_CLAIM])
+    version_key = access_version_key(user_id)
+
+    values = cache.get_many([revoked_key, version_key])
+    if values.get(revoked_key):
+        return True
+
+    version = values.get(version_key)
+    return version is not None and version != token.get('access_version')
+
+
+def revoke_access_token(token):
+    # Only kept until the token expires
+    timeout = token['exp'] - time.time()
+    if timeout > 0:
+        cache.set(revoked_token_key(token[api_settings.JTI_CLAIM]), True, timeout)
@@ -6,5 +6,8 @@ urlpatterns = [
     path('CreateOperator/', views.CreateOperatorAPIView.as_view(), name='create-operator'),
     path('Login/', views.LoginAPIView.as_view(), name='login'),
     path('Logout/', views.LogoutAPIView.as_view(), name='logout'),
+    path('TokenLogin/', views.TokenLoginAPIView.as_view(), name='token-login'),
+    path('TokenRefresh/', views.TokenRefreshAPIView.as_view(), name='token-refresh'),
+    path('TokenRevoke/', views.TokenRevokeAPIView.as_view(), name='token-revoke'),
     path('UpdateOperatorAvailableDatasets/<int:pk>/', views.UpdateOperatorAvailableDatasetsAPIView.as_view(), name='update-available-datasets'),
 ]
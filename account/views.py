@@ -5,10 +5,17 @@ from rest_framework import status
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.views import TokenViewBase
 
 from .models import Profile
-from .serializers import (OperatorCreateSerializer,
+from .serializers import (AccessTokenObtainSerializer,
+                          AccessTokenRefreshSerializer, OperatorCreateSerializer,
+                          TokenRevokeSerializer,
                           UpdateAvailableDatasetsSerializer)
+from .tokens import AccessRefreshToken, revoke_access_token
 
 
 class CreateOperatorAPIView(APIView):
@@ -81,6 +88,63 @@ class LogoutAPIView(APIView):
         return Response({'message': 'Successfully logged out'}, status=status.HTTP_200_OK)
 
 
+class TokenLoginAPIView(TokenViewBase):
+    """
+    Login users with JSON web tokens, without a session
+    fields:
+    username,
+    password
+
+    returns access (short-lived, send it in "Authorization: Bearer <access>")
+    and refresh (to get new tokens from TokenRefresh)
+    """
+    serializer_class = AccessTokenObtainSerializer
+
+
+class TokenRefreshAPIView(TokenViewBase):
+    """
+    Get new access and refresh tokens, with the current role and datasets of the user.
+    The refresh token sent can't be used again.
+    fields:
+    refresh
+    """
+    serializer_class = AccessTokenRefreshSerializer
+
+
+class TokenRevokeAPIView(APIView):
+    """
+    Logout users authenticated with a token: the access token of the request
+    and the refresh token sent can't be used anymore
+    fields:
+    refresh (optional)
+    """
+
+    permission_classes = [IsAuthenticated]
+
+
+    def post(self, request):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        refresh = serializer.validated_data.get('refresh')
+        if refresh:
+            try:
+                refresh = AccessRefreshToken(refresh)
+            except TokenError as error:
+                raise InvalidToken(error.args[0])
+
+            if refresh[api_settings.USER_ID_CLAIM] != request.user.pk:
+                return Response({'error': 'The refresh token belongs to another user'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            refresh.blacklist()
+
+        if isinstance(request.auth, AccessToken):
+            revoke_access_token(request.auth)
+
+        return Response({'message': 'Tokens revoked'}, status=status.HTTP_200_OK)
+
+
 class UpdateOperatorAvailableDatasetsAPIView(APIView):
     """
     Edit and Update operators available datasets: needs admin user permissions
@@ -27,4 +27,16 @@ app.conf.beat_schedule = {
         'task': 'datasets.tasks.export_daily_logs',
         'schedule': crontab(hour=0, minute=0),  # Executes every day at 00:00
     },
+    'rollup-daily-activity': {
+        'task': 'datasets.tasks.rollup_daily_activity',
+        'schedule': crontab(hour=0, minute=10),  # Executes every day at 00:10
+    },
+    'archive-old-logs': {
+        'task': 'datasets.tasks.archive_old_logs',
+        'schedule': crontab(hour=1, minute=0),  # Executes every day at 01:00
+    },
+    'replay-activity-log-spool': {
+        'task': 'datasets.tasks.replay_activity_log_spool',
+        'schedule': crontab(minute='*/5'),  # Executes every 5 minutes
+    },
 }
\ No newline at end of file
@@ -0,0 +1,199 @@
+import cProfile
+import logging
+import random
+import time
+import traceback
+from contextvars import ContextVar
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+
+logger = logging.getLogger('config.profiling')
+
+# Profile of the current request, for the code that doesn't get the request (e.g. serializers built without context)
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Timings collected during one request.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.query_count = 0
+        # Time spent in the renderer (e.g. DRF's JSONRenderer encoding the data), after the view
+        self.render_started_at = None
+        self.render_time = 0.0
+        # Time spent in the serializers' to_representation (serializer.data), without their queries
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view_name = None
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.db_time += duration
+            self.query_count += 1
+
+            if duration * 1000 >= settings.REQUEST_PROFILING_SLOW_QUERY_MS:
+                logger.warning(
+                    "Slow query (%.1f ms) from %s: %s",
+                    duration * 1000, get_query_origin(), sql[:1000],
+                )
+
+    def record_serialization(self, to_representation, instance):
+        # Only the outermost serializer is measured, its nested and list items are part of it
+        if self.serializer_depth:
+            return to_representation(instance)
+
+        self.serializer_depth += 1
+        start, db_start = time.perf_counter(), self.db_time
+        try:
+            return to_representation(instance)
+        finally:
+            self.serializer_depth -= 1
+            self.serializer_time += max(time.perf_counter() - start - (self.db_time - db_start), 0)
+
+    def start_render(self, response):
+        self.render_started_at = time.perf_counter()
+
+    def finish_render(self, response):
+        if self.render_started_at is not None:
+            self.render_time = time.perf_counter() - self.render_started_at
+
+    def server_timing(self):
+        app_time = max(self.total - self.db_time - self.serializer_time - self.render_time, 0)
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'serializers;dur={self.serializer_time * 1000:.1f};desc="to_representation"',
+            f'renderer;dur={self.render_time * 1000:.1f};desc="response encoding"',
+            f'app;dur={app_time * 1000:.1f};desc="{self.view_name or "unknown view"}"',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+class ProfiledSerializerMixin:
+    """
+    Add the time of to_representation to the profile of the request, so
+    serialization is reported apart from the rest of the view.
+    """
+
+    def to_representation(self, instance):
+        profile = current_profile.get()
+        if profile is None:
+            return super().to_representation(instance)
+
+        return profile.record_serialization(super().to_representation, instance)
+
+
+def get_query_origin():
+    """
+    Return "file:line in function" of the innermost frame of the project
+    (not Django or a library) that ran the current query.
+    """
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename \
+                and not frame.filename.endswith('middleware.py'):
+            return f"{frame.filename[len(base_dir) + 1:]}:{frame.lineno} in {frame.name}"
+
+    return "unknown"
+
+
+class RequestProfilingMiddleware:
+    """
+    Measure every request: total time, time and number of DB queries, time of the
+    serializers using ProfiledSerializerMixin (their queries are counted as db time)
+    and time spent in the renderer encoding the response (JSON, CSV...). The rest
+    is app time, reported with the name of the view.
+
+    Timings are sent in a Server-Timing header, requests slower than
+    REQUEST_PROFILING_SLOW_REQUEST_MS and queries slower than REQUEST_PROFILING_SLOW_QUERY_MS
+    are logged, and a REQUEST_PROFILING_SAMPLE_RATE fraction of the requests is run
+    under cProfile, their stats written to REQUEST_PROFILING_DIR.
+
+    When REQUEST_PROFILING_ENABLED is False the middleware removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        request.profile = profile
+        token = current_profile.set(profile)
+
+        profiler = None
+        if settings.REQUEST_PROFILING_SAMPLE_RATE and random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record_query))
+
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                current_profile.reset(token)
+
+        # Streaming responses are only measured until their first byte
+        profile.total = time.perf_counter() - profile.started_at
+
+        view_name = profile.view_name = self.get_view_name(request)
+        if settings.REQUEST_PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = profile.server_timing()
+
+        if profile.total * 1000 >= settings.REQUEST_PROFILING_SLOW_REQUEST_MS:
+            logger.warning(
+                "Slow request %s %s (%s) %s: total %.1f ms, db %.1f ms in %d queries, "
+                "serializers %.1f ms, renderer %.1f ms",
+                request.method, request.path, view_name, response.status_code, profile.total * 1000,
+                profile.db_time * 1000, profile.query_count, profile.serializer_time * 1000,
+                profile.render_time * 1000,
+            )
+
+        if profiler is not None:
+            self.save_profile(profiler, view_name, profile)
+
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered, e.g. a DRF Response serialized to JSON
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            profile.start_render(response)
+            response.add_post_render_callback(profile.finish_render)
+
+        return response
+
+    def get_view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+
+        return match.view_name or match._func_path
+
+    def save_profile(self, profiler, view_name, profile):
+        directory = Path(settings.REQUEST_PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        name = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{(view_name or 'unknown').replace(':', '-')}-{profile.total * 1000:.0f}ms.prof"
+        profiler.dump_stats(directory / name)
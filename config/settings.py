@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 import os
 
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     
     'rest_framework',
+    'rest_framework_simplejwt.token_blacklist',
     'django_celery_beat',
     'drf_yasg',
     
@@ -48,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it measures the other middleware too; removes itself when REQUEST_PROFILING_ENABLED is False
+    'config.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,10 +89,78 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Wait for the lock instead of failing when import shards write at the same time
+        'OPTIONS': {'timeout': 30},
     }
 }
 
 
+# Cache
+# Set CACHE_URL (e.g. redis://redis:6379/1) to share the cache between all the web and
+# Celery processes, the local-memory cache is only shared inside one process.
+
+# Rendered responses of the read endpoints (datasets.caching): entries expire after
+# RESPONSE_CACHE_TIMEOUT seconds, the least recently used are evicted first
+# (MAX_ENTRIES of the local-memory cache, maxmemory-policy of Redis in docker-compose.yml)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "True") == "True"
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 5000))
+
+if os.getenv("CACHE_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("CACHE_URL"),
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("CACHE_URL"),
+            'KEY_PREFIX': 'responses',
+            'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'responses',
+            'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
+            'OPTIONS': {'MAX_ENTRIES': RESPONSE_CACHE_MAX_ENTRIES},
+        },
+    }
+
+# Role and accessible datasets of a user, invalidated when they change
+DATASET_ACCESS_CACHE_TIMEOUT = 300
+
+# Active tag ids of a dataset (datasets.validators), invalidated when a tag changes
+ACTIVE_TAGS_CACHE_TIMEOUT = 300
+
+
+# Authentication: JWT access tokens (account.authentication) carry the role and the
+# accessible datasets, so API requests need no session, user or access lookup.
+# Sessions are kept for the admin and the browsable API.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'account.authentication.AccessTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+SIMPLE_JWT = {
+    # Short-lived: the claims of an access token are only re-read when it is refreshed
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv("JWT_ACCESS_TOKEN_MINUTES", 5))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv("JWT_REFRESH_TOKEN_DAYS", 1))),
+    # A refresh token can be used once, then it is blacklisted
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'UPDATE_LAST_LOGIN': False,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -131,6 +203,57 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Pagination of the text list and search endpoints
+TEXT_PAGE_SIZE = 100
+TEXT_MAX_PAGE_SIZE = 1000
+
+
+# Full-text search of texts, one of datasets.search:
+# SQLiteFTS5SearchBackend, PostgresSearchBackend (with PostgreSQL),
+# ElasticsearchSearchBackend or InMemorySearchBackend (tests and offline environments)
+TEXT_SEARCH_BACKEND = os.getenv("TEXT_SEARCH_BACKEND", 'datasets.search.SQLiteFTS5SearchBackend')
+
+ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", 'http://elasticsearch:9200')
+ELASTICSEARCH_TEXT_INDEX = 'texts'
+
+
+# Uploaded CSV files waiting to be imported by the Celery worker
+CSV_IMPORT_ROOT = BASE_DIR / 'imports'
+
+
+# Per-request profiling (config.middleware.RequestProfilingMiddleware)
+REQUEST_PROFILING_ENABLED = os.getenv("REQUEST_PROFILING_ENABLED") == "True"
+# Send the timings of every response in a Server-Timing header
+REQUEST_PROFILING_SERVER_TIMING = True
+# Log the requests and the queries slower than these thresholds
+REQUEST_PROFILING_SLOW_REQUEST_MS = float(os.getenv("REQUEST_PROFILING_SLOW_REQUEST_MS", 500))
+REQUEST_PROFILING_SLOW_QUERY_MS = float(os.getenv("REQUEST_PROFILING_SLOW_QUERY_MS", 100))
+# Fraction of the requests run under cProfile, their stats are written to REQUEST_PROFILING_DIR
+REQUEST_PROFILING_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILING_SAMPLE_RATE", 0))
+REQUEST_PROFILING_DIR = BASE_DIR / 'profiles'
+
+
+# Daily gzip CSV exports of the activity log
+LOG_EXPORT_DIR = BASE_DIR / 'log_exports'
+
+# Log entries older than LOG_RETENTION_DAYS are moved every night to one gzip file per day
+# in LOG_ARCHIVE_DIR, then deleted from the table in batches
+LOG_RETENTION_DAYS = 90
+LOG_ARCHIVE_DIR = BASE_DIR / 'log_archive'
+LOG_ARCHIVE_DELETE_BATCH_SIZE = 5000
+
+# The daily activity rollups of the last days are computed again, for log entries written late
+ACTIVITY_ROLLUP_LOOKBACK_DAYS = 2
+
+
+# Activity log entries are buffered in each process and written in bulk
+# when the buffer holds ACTIVITY_LOG_BUFFER_SIZE entries or every ACTIVITY_LOG_FLUSH_INTERVAL seconds.
+# Entries that can't be written are spooled to files and replayed by a periodic task.
+ACTIVITY_LOG_BUFFER_SIZE = 500
+ACTIVITY_LOG_FLUSH_INTERVAL = 2
+ACTIVITY_LOG_SPOOL_DIR = BASE_DIR / 'activity_spool'
+
+
 # Redis URL for Celery
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
@@ -0,0 +1,208 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Log, Text
+
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogBuffer:
+    """
+    In-process buffer of Log entries.
+
+    Recording an entry only appends it to a list, a background thread writes the
+    entries with one bulk insert when ACTIVITY_LOG_BUFFER_SIZE entries are waiting
+    or every ACTIVITY_LOG_FLUSH_INTERVAL seconds.
+
+    Entries are flushed when the process exits; if the database can't be reached
+    they are written to a spool file in ACTIVITY_LOG_SPOOL_DIR, which is loaded
+    back by the replay_activity_log_spool task.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.entries = []
+        self.thread = None
+        self.pid = None
+
+    @property
+    def size(self):
+        return settings.ACTIVITY_LOG_BUFFER_SIZE
+
+    @property
+    def interval(self):
+        return settings.ACTIVITY_LOG_FLUSH_INTERVAL
+
+    def add(self, entries):
+        with self.lock:
+            self.start()
+            self.entries.extend(entries)
+            full = len(self.entries) >= self.size
+
+        if full:
+            self.wakeup.set()
+
+    def start(self):
+        # Threads don't survive a fork: every worker process starts its own
+        if self.pid == os.getpid():
+            return
+
+        self.pid = os.getpid()
+        self.entries = []
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='activity-log-flusher', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def take(self):
+        with self.lock:
+            entries, self.entries = self.entries, []
+        return entries
+
+    def flush(self):
+        """
+        Write the waiting entries, or spool them to a file if the database fails.
+        Returns the number of entries taken from the buffer.
+        """
+        entries = self.take()
+        if not entries:
+            return 0
+
+        try:
+            write_entries(entries)
+        except Exception:
+            logger.exception("Could not write %d activity log entries, spooling them", len(entries))
+            spool_entries(entries)
+
+        return len(entries)
+
+    def close(self):
+        self.flush()
+        connections.close_all()
+
+
+activity_log = ActivityLogBuffer()
+
+
+def record_activity(user, text_id, action="update", updated_field="tags", action_details="update"):
+    record_activities([
+        {
+            'user_id': user.pk,
+            'text_instance_id': text_id,
+            'action': action,
+            'updated_field': updated_field,
+            'action_details': action_details,
+        }
+    ])
+
+
+def record_activities(entries):
+    """
+    Buffer Log entries given as dicts of Log fields.
+    Entries recorded inside a transaction are only kept if it commits.
+    """
+    now = timezone.now()
+    entries = [dict(entry, datetime=entry.get('datetime') or now) for entry in entries]
+    if entries:
+        transaction.on_commit(lambda: activity_log.add(entries))
+
+
+def write_entries(entries):
+    logs = [Log(**entry) for entry in entries]
+    try:
+        with transaction.atomic():
+            Log.objects.bulk_create(logs, batch_size=1000)
+    except IntegrityError:
+        # A text or a user was deleted before its entries were written, drop them and retry
+        text_ids = set(Text.objects.filter(pk__in={log.text_instance_id for log in logs})
+                       .values_list('id', flat=True))
+        user_ids = set(User.objects.filter(pk__in={log.user_id for log in logs}).values_list('id', flat=True))
+        Log.objects.bulk_create([log for log in logs if log.text_instance_id in text_ids and log.user_id in user_ids],
+                                batch_size=1000)
+
+
+def get_spool_dir():
+    return Path(settings.ACTIVITY_LOG_SPOOL_DIR)
+
+
+def spool_entries(entries):
+    """
+    Write entries to a new spool file. The file is written under a temporary
+    name and renamed, so the replay task never reads a partial file.
+    """
+    spool_dir = get_spool_dir()
+    spool_dir.mkdir(parents=True, exist_ok=True)
+
+    name = f"activity-{int(time.time())}-{os.getpid()}-{uuid.uuid4().hex}.jsonl"
+    temp_path = spool_dir / f".{name}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        for entry in entries:
+            file.write(json.dumps(dict(entry, datetime=entry['datetime'].isoformat())) + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, spool_dir / name)
+
+
+def replay_spool():
+    """
+    Write the entries of every spool file to the database and delete the files.
+    A file that can't be replayed is renamed to .failed and logged, so it doesn't
+    block the next ones. Returns the number of replayed entries.
+    """
+    spool_dir = get_spool_dir()
+    if not spool_dir.is_dir():
+        return 0
+
+    replayed = 0
+    for path in sorted(spool_dir.glob('activity-*.jsonl')):
+        try:
+            with open(path, encoding='utf-8') as file:
+                entries = [json.loads(line) for line in file if line.strip()]
+
+            for entry in entries:
+                entry['datetime'] = parse_datetime(entry['datetime'])
+
+            write_entries(entries)
+        except Exception:
+            logger.exception("Could not replay the activity spool file %s, renamed to .failed", path)
+            path.rename(path.with_name(f"{path.name}.failed"))
+            continue
+
+        path.unlink()
+        replayed += len(entries)
+
+    return replayed
+
+
+@atexit.register
+def flush_on_exit():
+    activity_log.close()
+
+
+@worker_process_shutdown.connect
+def flush_on_worker_shutdown(**kwargs):
+    activity_log.close()
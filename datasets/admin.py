@@ -1,8 +1,30 @@
 from django.contrib import admin
-from .models import Dataset, Tag, Text, Log
+from .models import DailyActivityRollup, Dataset, ImportJob, Tag, TagCount, Text, Log
+
+
+class LogAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'updated_field', 'action_details']
+    # Log.__str__ reads the user, its profile and the text
+    list_select_related = ['user__profile', 'text_instance']
+    raw_id_fields = ['user', 'text_instance']
+
+
+class TextAdmin(admin.ModelAdmin):
+    raw_id_fields = ['dataset']
+
+
+class TagCountAdmin(admin.ModelAdmin):
+    list_select_related = ['tag']
+
+
+class DailyActivityRollupAdmin(admin.ModelAdmin):
+    list_select_related = ['user', 'dataset']
 
 
 admin.site.register(Dataset)
 admin.site.register(Tag)
-admin.site.register(Text)
-admin.site.register(Log)
\ No newline at end of file
+admin.site.register(Text, TextAdmin)
+admin.site.register(Log, LogAdmin)
+admin.site.register(ImportJob)
+admin.site.register(TagCount, TagCountAdmin)
+admin.site.register(DailyActivityRollup, DailyActivityRollupAdmin)
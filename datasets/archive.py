@@ -0,0 +1,149 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .exporters import EXPORT_CHUNK_SIZE, get_day_range
+from .models import ActivityRollupDay, Log
+from .rollups import rollup_day
+
+
+def get_archive_path(day, directory=None):
+    """
+    Archived logs are stored in one gzip JSON lines file per day: <LOG_ARCHIVE_DIR>/<year>/<month>/logs_<day>.jsonl.gz
+    """
+    return Path(directory or settings.LOG_ARCHIVE_DIR) / f"{day:%Y}" / f"{day:%m}" / f"logs_{day.isoformat()}.jsonl.gz"
+
+
+def serialize_log(log):
+    return {
+        'id': log.id,
+        'user_id': log.user_id,
+        'username': log.user.username,
+        'text_instance_id': log.text_instance_id,
+        'dataset_id': log.text_instance.dataset_id,
+        'action': log.action,
+        'updated_field': log.updated_field,
+        'action_details': log.action_details,
+        'datetime': log.datetime.isoformat(),
+    }
+
+
+def read_archive_file(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                entry['datetime'] = parse_datetime(entry['datetime'])
+                yield entry
+
+
+def archive_day(day, directory=None, batch_size=None):
+    """
+    Move the Log entries of a day to its archive file, then delete them from the table.
+
+    The file is written under a temporary name and renamed once complete, entries
+    already archived by a previous run are kept, so the function can be rerun after
+    a failure. Entries are deleted in batches of LOG_ARCHIVE_DELETE_BATCH_SIZE,
+    each in its own short transaction. Returns the number of archived entries.
+    """
+    batch_size = batch_size or settings.LOG_ARCHIVE_DELETE_BATCH_SIZE
+    start, end = get_day_range(day)
+    logs = Log.objects.filter(datetime__gte=start, datetime__lt=end)
+
+    max_id = logs.aggregate(max_id=Max('id'))['max_id']
+    if max_id is None:
+        return 0
+
+    # The daily report reads the rollups, make sure they exist before the logs go away
+    if not ActivityRollupDay.objects.filter(day=day).exists():
+        rollup_day(day)
+
+    # Entries of the day written while archiving have a higher id, they are archived by the next run
+    logs = logs.filter(id__lte=max_id)
+
+    path = get_archive_path(day, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    archived = 0
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            with gzip.GzipFile(fileobj=file, mode='wb', mtime=0) as compressed:
+                archived_ids = set()
+                if path.exists():
+                    for entry in read_archive_file(path):
+                        archived_ids.add(entry['id'])
+                        compressed.write((json.dumps(dict(entry, datetime=entry['datetime'].isoformat()))
+                                          + '\n').encode('utf-8'))
+
+                for log in (logs.select_related('user', 'text_instance')
+                            .only('user_id', 'user__username', 'text_instance_id', 'text_instance__dataset_id',
+                                  'action', 'updated_field', 'action_details', 'datetime')
+                            .order_by('datetime', 'id')
+                            .iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+                    if log.id not in archived_ids:
+                        compressed.write((json.dumps(serialize_log(log)) + '\n').encode('utf-8'))
+                        archived += 1
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    while True:
+        ids = list(logs.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+
+        Log.objects.filter(id__in=ids).delete()
+
+    ActivityRollupDay.objects.filter(day=day).update(archived_at=timezone.now())
+    return archived
+
+
+def get_days_to_archive(today=None):
+    """
+    Days older than LOG_RETENTION_DAYS that still have entries in the Log table.
+    """
+    cutoff = (today or timezone.localdate()) - timedelta(days=settings.LOG_RETENTION_DAYS)
+
+    first_log = Log.objects.aggregate(first=Min('datetime'))['first']
+    if first_log is None:
+        return []
+
+    first_day = timezone.localdate(first_log)
+    return [first_day + timedelta(days=offset) for offset in range((cutoff - first_day).days)]
+
+
+def iter_archived_logs(start_day, end_day, user_id=None, dataset_id=None, action=None, directory=None):
+    """
+    Lazily yield the archived Log entries of the days [start_day, end_day] as dicts,
+    optionally filtered. Files are opened one at a time and read line by line.
+    """
+    day = start_day
+    while day <= end_day:
+        path = get_archive_path(day, directory)
+        if path.exists():
+            for entry in read_archive_file(path):
+                if user_id is not None and entry['user_id'] != user_id:
+                    continue
+                if dataset_id is not None and entry['dataset_id'] != dataset_id:
+                    continue
+                if action is not None and entry['action'] != action:
+                    continue
+
+                yield entry
+
+        day += timedelta(days=1)
@@ -0,0 +1,279 @@
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from account.models import Profile
+from account.tokens import AccessRefreshToken
+
+from .models import Dataset, ImportJob, Log, Tag, Text
+
+
+class BenchmarkFixtures:
+    """
+    Objects the benchmarked requests work on, always chosen the same way
+    (lowest ids) so runs on the same data are comparable.
+    """
+
+    def __init__(self, search_term, bulk_size):
+        # The tag and tagging scenarios need active tags in the dataset of the texts
+        self.dataset = (Dataset.objects
+                        .filter(Exists(Text.objects.filter(dataset=OuterRef('pk'))),
+                                Exists(Tag.objects.filter(dataset=OuterRef('pk'), is_active=True)))
+                        .order_by('id').first())
+        if self.dataset is None:
+            raise ValueError("There is no dataset with texts and active tags, generate data first: "
+                             "python manage.py generate_synthetic_data")
+
+        self.text = Text.objects.filter(dataset=self.dataset).order_by('id').first()
+        self.tag_ids = list(Tag.objects.filter(dataset=self.dataset, is_active=True)
+                            .order_by('id').values_list('id', flat=True)[:3])
+        self.text_ids = list(Text.objects.filter(dataset=self.dataset)
+                             .order_by('id').values_list('id', flat=True)[:bulk_size])
+        self.dataset_ids = list(Dataset.objects.order_by('id').values_list('id', flat=True)[:10])
+        self.search_term = search_term
+
+        self.admin = User.objects.create_superuser('benchmark-admin', 'benchmark@example.com', 'benchmark')
+        self.operator = User.objects.create_user('benchmark-operator', password='benchmark')
+
+    def new_dataset(self):
+        return Dataset.objects.create(name='benchmark-throwaway')
+
+    def new_tag(self):
+        return Tag.objects.create(name='benchmark-throwaway', dataset=self.dataset)
+
+    def new_text(self):
+        return Text.objects.create(dataset=self.dataset, content='benchmark throwaway text')
+
+    def new_import_job(self):
+        return ImportJob.objects.create(user=self.admin, file='benchmark.csv', status='running',
+                                        total_bytes=1000, processed_bytes=500, rows_processed=10,
+                                        started_at=timezone.now())
+
+
+class Scenario:
+    """
+    A request to benchmark. build(fixtures) returns the keyword arguments of the
+    test client call, it runs before the timing and can create throwaway objects.
+    """
+
+    def __init__(self, url_name, method, build, iterations=None, cleanup=None):
+        self.url_name = url_name
+        self.method = method
+        self.build = build
+        self.iterations = iterations
+        self.cleanup = cleanup
+
+
+def delete_uploaded_file(response):
+    # Uploaded files are kept on disk even though the database changes are rolled back
+    ImportJob.objects.get(pk=response.data['job_id']).file.delete(save=False)
+
+
+def archived_logs_range():
+    today = timezone.localdate()
+    return {'start': (today - timedelta(days=settings.LOG_RETENTION_DAYS + 30)).isoformat(),
+            'end': (today - timedelta(days=settings.LOG_RETENTION_DAYS)).isoformat()}
+
+
+SCENARIOS = [
+    # datasets.urls
+    Scenario('create_dataset', 'post', lambda f: {
+        'path': reverse('create_dataset'), 'data': {'name': 'benchmark', 'description': 'benchmark'}}),
+    Scenario('create_tag', 'post', lambda f: {
+        'path': reverse('create_tag', args=[f.dataset.id]), 'data': {'name': 'benchmark', 'description': 'benchmark'}}),
+    Scenario('create_text', 'post', lambda f: {
+        'path': reverse('create_text', args=[f.dataset.id]),
+        'data': {'content': 'benchmark text', 'tags': f.tag_ids}}),
+    Scenario('bulk_create_texts', 'post', lambda f: {
+        'path': reverse('bulk_create_texts', args=[f.dataset.id]),
+        'data': {'texts': [{'content': f'benchmark bulk text {index}', 'tags': f.tag_ids} for index in range(100)]}}),
+    Scenario('list_of_datasets', 'get', lambda f: {'path': reverse('list_of_datasets')}),
+    Scenario('list_of_tags', 'get', lambda f: {'path': reverse('list_of_tags', args=[f.dataset.id])}),
+    Scenario('list_of_texts', 'get', lambda f: {'path': reverse('list_of_texts', args=[f.dataset.id])}),
+    Scenario('details_of_dataset_by_id', 'get', lambda f: {
+        'path': reverse('details_of_dataset_by_id', args=[f.dataset.id])}),
+    Scenario('details_of_tag_by_id', 'get', lambda f: {'path': reverse('details_of_tag_by_id', args=[f.tag_ids[0]])}),
+    Scenario('details_of_text_by_id', 'get', lambda f: {'path': reverse('details_of_text_by_id', args=[f.text.id])}),
+    Scenario('update_dataset_by_id', 'patch', lambda f: {
+        'path': reverse('update_dataset_by_id', args=[f.dataset.id]), 'data': {'description': 'updated'}}),
+    Scenario('update_tag_by_id', 'patch', lambda f: {
+        'path': reverse('update_tag_by_id', args=[f.tag_ids[0]]), 'data': {'description': 'updated'}}),
+    Scenario('update_text_by_id', 'patch', lambda f: {
+        'path': reverse('update_text_by_id', args=[f.text.id]),
+        'data': {'add_tags': f.tag_ids[:1], 'remove_tags': f.tag_ids[1:2]}}),
+    Scenario('bulk_update_texts_tags', 'post', lambda f: {
+        'path': reverse('bulk_update_texts_tags'), 'data': {'text_ids': f.text_ids, 'tags': f.tag_ids[:2]}}),
+    Scenario('bulk_change_texts_tags', 'post', lambda f: {
+        'path': reverse('bulk_change_texts_tags'),
+        'data': {'text_ids': f.text_ids, 'add_tags': f.tag_ids[:1], 'remove_tags': f.tag_ids[1:2]}}),
+    Scenario('delete_dataset', 'delete', lambda f: {'path': reverse('delete_dataset', args=[f.new_dataset().id])}),
+    Scenario('delete_tag', 'delete', lambda f: {'path': reverse('delete_tag', args=[f.new_tag().id])}),
+    Scenario('delete_text', 'delete', lambda f: {'path': reverse('delete_text', args=[f.new_text().id])}),
+    Scenario('dataset_count_text_by_tag', 'get', lambda f: {
+        'path': reverse('dataset_count_text_by_tag', args=[f.dataset.id]), 'data': {'include': 'untagged,operators'}}),
+    Scenario('full_tex_search', 'get', lambda f: {
+        'path': reverse('full_tex_search', args=[f.dataset.id, f.search_term])}),
+    Scenario('export_texts', 'get', lambda f: {
+        'path': reverse('export_texts', args=[f.dataset.id]), 'data': {'compress': 'gzip'}}, iterations=3),
+    Scenario('upload_csv_file', 'post', lambda f: {
+        'path': reverse('upload_csv_file'), 'format': 'multipart',
+        'data': {'file': SimpleUploadedFile('benchmark.csv', b"dataset_name,tags_name,text_content\nbenchmark,a,text\n")}},
+        cleanup=delete_uploaded_file),
+    Scenario('import_job_status', 'get', lambda f: {
+        'path': reverse('import_job_status', args=[f.new_import_job().id])}),
+    Scenario('daily_activity_report', 'get', lambda f: {'path': reverse('daily_activity_report')}),
+    Scenario('archived_logs', 'get', lambda f: {'path': reverse('archived_logs'), 'data': archived_logs_range()}),
+
+    # account.urls
+    Scenario('create-operator', 'post', lambda f: {
+        'path': reverse('create-operator'),
+        'data': {'username': 'benchmark-new-operator', 'password': 'benchmark', 'available_datasets': f.dataset_ids}}),
+    Scenario('login', 'post', lambda f: {
+        'path': reverse('login'), 'data': {'username': 'benchmark-operator', 'password': 'benchmark'}}),
+    Scenario('logout', 'get', lambda f: {'path': reverse('logout')}),
+    Scenario('token-login', 'post', lambda f: {
+        'path': reverse('token-login'), 'data': {'username': 'benchmark-operator', 'password': 'benchmark'}}),
+    Scenario('token-refresh', 'post', lambda f: {
+        'path': reverse('token-refresh'), 'data': {'refresh': str(AccessRefreshToken.for_user(f.operator))}}),
+    Scenario('token-revoke', 'post', lambda f: {
+        'path': reverse('token-revoke'), 'data': {'refresh': str(AccessRefreshToken.for_user(f.admin))}}),
+    Scenario('update-available-datasets', 'put', lambda f: {
+        'path': reverse('update-available-datasets', args=[f.operator.profile.pk]),
+        'data': {'available_datasets': f.dataset_ids}}),
+]
+
+
+def get_url_names(*modules):
+    return [pattern.name for module in modules for pattern in module.urlpatterns if pattern.name]
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def perform(client, scenario, fixtures):
+    """
+    Send the request of a scenario in a savepoint that is rolled back,
+    so every iteration runs against the same data.
+    Returns (response, seconds, number of queries).
+    """
+    with transaction.atomic():
+        kwargs = dict(scenario.build(fixtures))
+        kwargs.setdefault('format', 'json')
+        path = kwargs.pop('path')
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, scenario.method)(path, **kwargs)
+            if response.streaming:
+                for chunk in response.streaming_content:
+                    pass
+            elapsed = time.perf_counter() - start
+
+        if scenario.cleanup is not None and response.status_code < 400:
+            scenario.cleanup(response)
+
+        transaction.set_rollback(True)
+
+    return response, elapsed, len(queries)
+
+
+def run_scenario(client, scenario, fixtures, iterations, warmup):
+    timings = []
+    query_counts = []
+    for index in range(warmup + (scenario.iterations or iterations)):
+        response, elapsed, query_count = perform(client, scenario, fixtures)
+        if index >= warmup:
+            timings.append(elapsed * 1000)
+            query_counts.append(query_count)
+
+    # Memory is measured in a separate request, tracing slows everything down
+    tracemalloc.start()
+    try:
+        perform(client, scenario, fixtures)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'method': scenario.method.upper(),
+        'status': response.status_code,
+        'iterations': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': int(statistics.median(query_counts)),
+        'queries_max': max(query_counts),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def get_git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=settings.BASE_DIR, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, cwd=settings.BASE_DIR, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+    return commit, dirty
+
+
+def get_environment():
+    commit, dirty = get_git_revision()
+    return {
+        'git_commit': commit,
+        'git_dirty': dirty,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'search_backend': settings.TEXT_SEARCH_BACKEND,
+        'machine': platform.machine(),
+        'data': {
+            'datasets': Dataset.objects.count(),
+            'tags': Tag.objects.count(),
+            'texts': Text.objects.count(),
+            'operators': Profile.objects.filter(role='operator').count(),
+            'logs': Log.objects.count(),
+        },
+    }
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Return the regressions of results against a baseline run: a p95 latency more than
+    threshold percent higher, or more queries per request.
+    """
+    regressions = []
+    for url_name, result in results.items():
+        previous = baseline.get(url_name)
+        if previous is None:
+            continue
+
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{url_name}: {previous['queries']} -> {result['queries']} queries")
+
+        if result['p95_ms'] > previous['p95_ms'] * (1 + threshold / 100):
+            regressions.append(f"{url_name}: p95 {previous['p95_ms']} -> {result['p95_ms']} ms")
+
+    return regressions
@@ -0,0 +1,123 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from account.access import get_user_access
+
+from .versions import get_request_version
+
+
+METRICS = ('hits', 'misses')
+
+# Only the JSON responses are the same for all the users of a role, the browsable API
+# pages show the username and carry the CSRF token of the user
+CACHED_RENDERER_FORMATS = {'json'}
+
+
+def get_response_cache():
+    return caches['responses']
+
+
+def get_permission_scope(request):
+    """
+    Part of the cache key depending on the user: their role. Apply cache_response
+    after the permission checks (method_decorator on a DRF view), so an operator
+    only reaches the cache for the datasets they can access.
+    """
+    return get_user_access(request.user).role or 'anonymous'
+
+
+def response_cache_key(request, resource_version):
+    key, version, updated_at = resource_version
+    path_hash = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()
+    return ":".join([
+        request.resolver_match.url_name, f"{key}.{version}", get_permission_scope(request),
+        request.accepted_renderer.format, path_hash,
+    ])
+
+
+def metric_key(url_name, metric):
+    return f"metrics:{url_name}:{metric}"
+
+
+def count(url_name, metric):
+    cache = get_response_cache()
+    key = metric_key(url_name, metric)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counters never expire, so they are not evicted before the responses
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_response_cache_stats(url_names):
+    """
+    Return {url name: {'hits': ..., 'misses': ...}} counted since the last reset.
+    """
+    keys = {metric_key(url_name, metric): (url_name, metric) for url_name in url_names for metric in METRICS}
+    values = get_response_cache().get_many(keys)
+    stats = {url_name: dict.fromkeys(METRICS, 0) for url_name in url_names}
+    for key, value in values.items():
+        url_name, metric = keys[key]
+        stats[url_name][metric] = value
+
+    return stats
+
+
+def reset_response_cache_stats(url_names):
+    get_response_cache().delete_many(
+        [metric_key(url_name, metric) for url_name in url_names for metric in METRICS]
+    )
+
+
+def cache_response(get_key):
+    """
+    Cache the rendered 200 responses of a GET view in the "responses" cache.
+    get_key(request, *args, **kwargs) returns the key of the ResourceVersion the response
+    depends on (see datasets.versions), or None to skip the cache for this request.
+    Only the formats of CACHED_RENDERER_FORMATS are cached.
+
+    The version is part of the cache key: every change bumps it from the model signals,
+    so a stale response is never served again and ages out through the TTL and LRU eviction.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            resource_version = None
+            if settings.RESPONSE_CACHE_ENABLED and request.accepted_renderer.format in CACHED_RENDERER_FORMATS:
+                resource_version = get_request_version(request, get_key, *args, **kwargs)
+
+            if resource_version is None:
+                return view(request, *args, **kwargs)
+
+            cache = get_response_cache()
+            url_name = request.resolver_match.url_name
+            key = response_cache_key(request, resource_version)
+
+            cached = cache.get(key)
+            if cached is not None:
+                count(url_name, 'hits')
+                status_code, content_type, content = cached
+                response = HttpResponse(content, content_type=content_type, status=status_code)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            count(url_name, 'misses')
+            response = view(request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                # Stored once rendered, DRF renders the response after the view returns
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(key, (rendered.status_code, rendered['Content-Type'], rendered.content))
+                )
+                response['X-Cache'] = 'MISS'
+
+            return response
+
+        return wrapper
+
+    return decorator
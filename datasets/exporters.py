@@ -0,0 +1,170 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Log, Text
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_dataset_texts(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield chunks of (text id, content, [tag names]) for all the texts of a dataset.
+
+    Texts are read with a server-side chunked iterator and the tag names
+    are loaded with one query per chunk, so memory doesn't depend on the dataset size.
+    """
+    texts = (Text.objects.filter(dataset=dataset).order_by('id')
+             .values_list('id', 'content').iterator(chunk_size=chunk_size))
+
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= chunk_size:
+            yield attach_tag_names(chunk)
+            chunk = []
+
+    if chunk:
+        yield attach_tag_names(chunk)
+
+
+def attach_tag_names(chunk):
+    tag_names = {}
+    rows = (Text.tags.through.objects.filter(text_id__in=[text_id for text_id, content in chunk])
+            .order_by('tag__name').values_list('text_id', 'tag__name'))
+    for text_id, tag_name in rows:
+        tag_names.setdefault(text_id, []).append(tag_name)
+
+    return [(text_id, content, tag_names.get(text_id, [])) for text_id, content in chunk]
+
+
+def render_ndjson(dataset, chunks):
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps({'id': text_id, 'content': content, 'tags': tags}, ensure_ascii=False) + '\n'
+            for text_id, content, tags in chunk
+        )
+
+
+def render_csv(dataset, chunks):
+    # Same columns as the CSV import, so an export can be imported back
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['id', 'dataset_name', 'tags_name', 'text_content'])
+
+    for chunk in chunks:
+        for text_id, content, tags in chunk:
+            writer.writerow([text_id, dataset.name, ' '.join(tags), content])
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Only the header when the dataset has no texts
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_stream(parts):
+    """
+    Compress a stream of text parts on the fly into a gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip header and trailer
+    for part in parts:
+        data = compressor.compress(part.encode('utf-8'))
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+def export_dataset_texts(dataset, export_format, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Return an iterator over the bytes of the export of a dataset's texts and tags.
+    """
+    render = render_csv if export_format == 'csv' else render_ndjson
+    parts = render(dataset, iter_dataset_texts(dataset, chunk_size))
+
+    if compress:
+        return gzip_stream(parts)
+
+    return (part.encode('utf-8') for part in parts)
+
+
+LOG_EXPORT_COLUMNS = ['User', 'Action', 'Text Instance', 'Updated_Field', 'Action_Details', 'DateTime']
+
+
+def get_day_range(day):
+    """
+    Return the [start, end) datetimes of a day in the current time zone.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def get_log_export_path(day, directory=None):
+    return Path(directory or settings.LOG_EXPORT_DIR) / f"logs_{day.isoformat()}.csv.gz"
+
+
+def export_logs_of_day(day, directory=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write the Log entries of a day to a gzip CSV file and return (path, number of rows).
+
+    Logs are read with a chunked iterator, their user and text joined in the same query.
+    The file is written under a temporary name and renamed once complete, so a rerun
+    replaces it instead of appending, and readers never see a partial file.
+    """
+    start, end = get_day_range(day)
+    logs = (Log.objects.filter(datetime__gte=start, datetime__lt=end)
+            .select_related('user', 'text_instance')
+            .only('action', 'updated_field', 'action_details', 'datetime',
+                  'user__username', 'text_instance__content')
+            .order_by('datetime', 'id')
+            .iterator(chunk_size=chunk_size))
+
+    path = get_log_export_path(day, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    rows = 0
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            # A fixed mtime makes reruns over the same logs produce identical files
+            with gzip.GzipFile(fileobj=file, mode='wb', mtime=0) as compressed:
+                stream = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+                writer = csv.writer(stream)
+                writer.writerow(LOG_EXPORT_COLUMNS)
+
+                for log in logs:
+                    writer.writerow([log.user, log.action, log.text_instance, log.updated_field,
+                                     log.action_details, log.datetime])
+                    rows += 1
+
+                stream.flush()
+                stream.detach()
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return path, rows
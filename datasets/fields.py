@@ -0,0 +1,68 @@
+from django.core.exceptions import ValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    ManyRelatedField that loads all the given primary keys with one query,
+    instead of one query per item.
+    """
+
+    def to_internal_value(self, data):
+        pks = self.to_primary_keys(data)
+        child = self.child_relation
+
+        objects = child.get_queryset().in_bulk(set(pks))
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+
+        return [objects[pk] for pk in pks]
+
+    def to_primary_keys(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pk_field = child.get_queryset().model._meta.pk
+
+        pks = []
+        for item in data:
+            if child.pk_field is not None:
+                item = child.pk_field.to_internal_value(item)
+            try:
+                if isinstance(item, (bool, list, dict)):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, ValidationError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        return pks
+
+
+class PrimaryKeyListField(BulkManyRelatedField):
+    """
+    BulkManyRelatedField whose validated value is the list of primary keys, without
+    any query: their existence is left to the serializer, e.g. with a validator
+    checking them all at once.
+    """
+
+    def to_internal_value(self, data):
+        return self.to_primary_keys(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField which, with many=True, validates the list in one query.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
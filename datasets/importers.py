@@ -0,0 +1,453 @@
+import csv
+import io
+import time
+
+from django.db import connection, transaction
+
+from .exceptions import CSVImportError
+from .models import Dataset, ResourceVersion, Tag, TagCount, Text
+from .search import update_search_index
+from .tagging import count_tag_deltas, delete_text_tags, insert_text_tags
+from .validators import TagValidator
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Only the first errors are kept in memory, the rest are just counted
+MAX_REPORTED_ERRORS = 100
+
+
+def open_csv_stream(file, encoding='utf-8-sig'):
+    """
+    Wrap a binary file object (an upload or a file on disk) in a text stream
+    that is decoded lazily, chunk by chunk, while the csv reader consumes it.
+    """
+    file.seek(0)
+    return io.TextIOWrapper(file, encoding=encoding, newline='')
+
+
+class ByteRangeReader(io.RawIOBase):
+    """
+    Read-only view over the bytes [start, end) of a binary file.
+    """
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.end = end
+        self.file.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self.end - self.file.tell()
+        if remaining <= 0:
+            return 0
+
+        data = self.file.read(min(len(buffer), remaining))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def tell(self):
+        return self.file.tell()
+
+
+def read_csv_header(file, encoding='utf-8-sig'):
+    """
+    Return the column names of a CSV file and the byte offset where the data rows start.
+    """
+    file.seek(0)
+    header_line = file.readline()
+    fieldnames = next(csv.reader([header_line.decode(encoding)]), [])
+    return fieldnames, file.tell()
+
+
+def compute_shard_ranges(file, shards):
+    """
+    Split the data rows of a CSV file into at most `shards` byte ranges.
+
+    Boundaries are moved forward to the next line start, so every range holds
+    whole lines. Rows are expected to fit on one line: a quoted field with an
+    embedded newline must not be imported in sharded mode.
+    """
+    fieldnames, data_start = read_csv_header(file)
+    file.seek(0, io.SEEK_END)
+    size = file.tell()
+
+    shard_size = max((size - data_start) // max(shards, 1), 1)
+
+    ranges = []
+    start = data_start
+    while start < size:
+        end = start + shard_size
+        if end >= size:
+            end = size
+        else:
+            # Align the boundary on the start of the next line
+            file.seek(end)
+            file.readline()
+            end = file.tell()
+
+        ranges.append((start, end))
+        start = end
+
+    return fieldnames, ranges
+
+
+def open_csv_shard(file, start, end, encoding='utf-8'):
+    """
+    Text stream over the lines of a shard computed by compute_shard_ranges.
+    """
+    return io.TextIOWrapper(io.BufferedReader(ByteRangeReader(file, start, end)),
+                            encoding=encoding, newline='')
+
+
+def scan_csv_vocabulary(stream, fieldnames):
+    """
+    Collect {dataset name: set of tag names} from the rows of a CSV stream
+    without writing anything to the database.
+    """
+    vocabulary = {}
+    for row in csv.DictReader(stream, fieldnames=fieldnames):
+        dataset_name = (row.get('dataset_name') or '').strip()
+        if not dataset_name or not row.get('text_content'):
+            continue
+
+        vocabulary.setdefault(dataset_name, set()).update((row.get('tags_name') or '').split())
+
+    return vocabulary
+
+
+class ImportStats:
+    """
+    Counters collected while a CSV import is running.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+class CSVImporter:
+    """
+    Import texts from a CSV file with the columns
+    dataset_name, tags_name (space separated) and text_content.
+
+    Rows are read from a stream and written in fixed-size batches with
+    bulk_create, so memory stays flat no matter how large the file is.
+    Datasets and tags are resolved once per import through in-memory maps.
+
+    If a Text with the same content already exists in the dataset, its tags
+    are replaced by the tags of the row (same behaviour as update_or_create + set).
+    """
+    required_columns = ('dataset_name', 'text_content')
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+        self.batch_size = batch_size
+        self.stats = ImportStats()
+
+        # Optional callable, called with the stats after every written batch
+        self.on_batch = on_batch
+
+        # name -> dataset id
+        self.datasets = {}
+        # (dataset id, tag name) -> tag id
+        self.tags = {}
+        # Rows naming an inactive tag are rejected, like in the API
+        self.tag_validator = TagValidator()
+        # (dataset id, content hash) -> (content, list of tag ids), for the rows of the current batch
+        self.batch = {}
+
+    def run(self, stream, fieldnames=None):
+        """
+        Import every row of the given text stream and return the collected stats.
+        When fieldnames is given the stream has no header line (e.g. a shard).
+        """
+        reader = csv.DictReader(stream, fieldnames=fieldnames)
+
+        missing_columns = [
+            column for column in self.required_columns
+            if column not in (reader.fieldnames or [])
+        ]
+        if missing_columns:
+            raise CSVImportError(f"Missing required columns: {', '.join(missing_columns)}.")
+
+        for row in reader:
+            self.stats.rows += 1
+            self.add_row(row, reader.line_num)
+
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+        self.flush()
+        self.stats.finish()
+        return self.stats
+
+    def add_row(self, row, line):
+        # Extract fields from CSV row
+        dataset_name = (row.get('dataset_name') or '').strip()
+        text_content = row.get('text_content')
+        tags_names = (row.get('tags_name') or '').split()
+
+        if not dataset_name or not text_content:
+            self.stats.add_error(line, "Each row must contain 'dataset_name' and 'text_content'.")
+            return
+
+        dataset_id = self.get_dataset_id(dataset_name)
+
+        tag_ids = []
+        for tag_name in dict.fromkeys(tags_names):  # keep order, drop duplicates
+            tag_ids.append(self.get_tag_id(dataset_id, tag_name))
+
+        invalid = self.tag_validator.find_invalid(dataset_id, tag_ids)
+        errors = self.tag_validator.describe(dataset_id, invalid) if invalid else []
+        if errors:
+            self.stats.add_error(line, " ".join(errors))
+            return
+
+        # A later row with the same content wins, like update_or_create did
+        self.batch[(dataset_id, Text.hash_content(text_content))] = (text_content, tag_ids)
+
+    def get_dataset_id(self, name):
+        if name not in self.datasets:
+            # Names are unique, a concurrent import creating the same dataset gets the same row
+            dataset, created = Dataset.objects.get_or_create(name=name)
+            self.datasets[name] = dataset.id
+
+            # Load all the tags of this dataset at once
+            for tag_id, tag_name in Tag.objects.filter(dataset=dataset).values_list('id', 'name'):
+                self.tags[(dataset.id, tag_name)] = tag_id
+
+        return self.datasets[name]
+
+    def create_vocabulary(self, vocabulary):
+        """
+        Create the datasets and tags of a {dataset name: tag names} mapping
+        that don't exist yet, e.g. before the shards of a file are imported.
+        """
+        for dataset_name, tag_names in vocabulary.items():
+            dataset_id = self.get_dataset_id(dataset_name)
+            for tag_name in sorted(tag_names):
+                self.get_tag_id(dataset_id, tag_name)
+
+    def get_tag_id(self, dataset_id, name):
+        key = (dataset_id, name)
+        if key not in self.tags:
+            tag, created = Tag.objects.get_or_create(name=name, dataset_id=dataset_id)
+            self.tags[key] = tag.id
+            if created:
+                self.tag_validator.add_created_tag(dataset_id, tag.id)
+
+        return self.tags[key]
+
+    def flush(self):
+        """
+        Write the current batch: new texts with bulk_create, existing texts
+        get their tags replaced, and all through-table rows are bulk inserted.
+        """
+        if not self.batch:
+            return
+
+        text_ids, new_keys, existing = write_texts(self.batch, on_duplicate='upsert', batch_size=self.batch_size)
+
+        self.stats.created += len(new_keys)
+        self.stats.updated += len(existing)
+        self.batch = {}
+
+        if self.on_batch is not None:
+            self.on_batch(self.stats)
+
+
+def find_existing_texts(keys):
+    """
+    Return {(dataset id, content hash): text id} for the given keys already in the database,
+    using the unique (dataset, content_hash) index.
+    """
+    hashes_by_dataset = {}
+    for dataset_id, content_hash in keys:
+        hashes_by_dataset.setdefault(dataset_id, []).append(content_hash)
+
+    existing = {}
+    for dataset_id, hashes in hashes_by_dataset.items():
+        texts = (Text.objects.filter(dataset_id=dataset_id, content_hash__in=hashes)
+                 .values_list('id', 'content_hash'))
+        for text_id, content_hash in texts:
+            existing[(dataset_id, content_hash)] = text_id
+
+    return existing
+
+
+def write_texts(batch, on_duplicate='upsert', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write {(dataset id, content hash): (content, [tag ids])} in one transaction:
+    new texts and their text-tag rows with bulk inserts.
+    Texts already in their dataset get their tags replaced with on_duplicate='upsert',
+    and are left unchanged with 'skip'. Tags are expected to be validated.
+
+    Returns ({key: text id}, keys of the created texts, {key: text id} of the existing texts).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = find_existing_texts(batch)
+
+        # Texts inserted meanwhile by a concurrent import are skipped by the unique
+        # (dataset, content_hash) index and handled like the existing ones
+        new_keys = [key for key in batch if key not in existing]
+        created = insert_texts(cursor, [(key, batch[key][0]) for key in new_keys], batch_size)
+        existing.update(find_existing_texts([key for key in new_keys if key not in created]))
+
+        text_ids = dict(existing)
+        text_ids.update(created)
+        datasets_by_text = {text_id: dataset_id for (dataset_id, content_hash), text_id in text_ids.items()}
+
+        tagged_keys = list(batch) if on_duplicate == 'upsert' else list(created)
+
+        # Existing texts get their tags replaced
+        removed = []
+        if existing and on_duplicate == 'upsert':
+            removed = delete_text_tags(cursor, existing.values())
+
+        added = insert_text_tags(cursor, [(text_ids[key], tag_id) for key in tagged_keys for tag_id in batch[key][1]])
+
+        # Raw inserts don't send m2m_changed, update the tag counters from the rows really changed
+        TagCount.objects.apply_deltas(count_tag_deltas(added, removed, datasets_by_text))
+
+        # Nor post_save
+        update_search_index(text_ids=list(created.values()))
+        ResourceVersion.objects.bump_datasets({dataset_id for dataset_id, content_hash in tagged_keys})
+
+    return text_ids, list(created), existing
+
+
+def insert_texts(cursor, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert [((dataset id, content hash), content)] texts with INSERT ... ON CONFLICT DO NOTHING
+    and return {key: text id} of the texts really inserted.
+    """
+    table = connection.ops.quote_name(Text._meta.db_table)
+    # Three parameters per text, below the bound parameters limit of SQLite
+    batch_size = min(batch_size, 300)
+
+    inserted = {}
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        cursor.execute(
+            f"INSERT INTO {table} (dataset_id, content_hash, content) "
+            f"VALUES {', '.join(['(%s, %s, %s)'] * len(chunk))} "
+            f"ON CONFLICT (dataset_id, content_hash) DO NOTHING RETURNING id, dataset_id, content_hash",
+            [value for (dataset_id, content_hash), content in chunk for value in (dataset_id, content_hash, content)],
+        )
+        for text_id, dataset_id, content_hash in cursor.fetchall():
+            inserted[(dataset_id, content_hash)] = text_id
+
+    return inserted
+
+
+def bulk_create_texts(dataset, items, on_duplicate='skip', create_tags=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create many texts of a dataset in one transaction, e.g. from a JSON ingestion pipeline.
+
+    items is a list of (content, [tag ids], [tag names]). Tag names are resolved to the
+    tags of the dataset with one query, the unknown ones are created with create_tags
+    and rejected otherwise, like names with whitespace. All the tags are then validated
+    at once (see TagValidator), and the valid items are written with write_texts.
+    A text already in the dataset is left unchanged with on_duplicate='skip',
+    or gets its tags replaced with 'upsert'. An item with the same content as
+    a previous item is rejected.
+
+    Returns one result per item, in the order of the items.
+    """
+    names = {name for content, tag_ids, tag_names in items for name in tag_names}
+    tags_by_name = {}
+    if names:
+        tags_by_name = dict(Tag.objects.filter(dataset=dataset, name__in=names).values_list('name', 'id'))
+
+    errors = {}
+    for index, (content, tag_ids, tag_names) in enumerate(items):
+        # Tag names are space separated in the CSV import and export
+        spaced = [name for name in tag_names if name.split() != [name]]
+        messages = [f"The tag name {name!r} can't contain whitespace." for name in spaced]
+        if not create_tags:
+            messages += [f"Tag {name} not found." for name in tag_names
+                         if name not in tags_by_name and name not in spaced]
+        if messages:
+            errors[index] = messages
+
+    validator = TagValidator()
+    errors.update(validator.validate(
+        (index, dataset.id, tag_ids + [tags_by_name[name] for name in tag_names if name in tags_by_name])
+        for index, (content, tag_ids, tag_names) in enumerate(items)
+        if index not in errors
+    ))
+
+    keys = {}
+    first_items = {}
+    batch = {}
+    with transaction.atomic():
+        for index, (content, tag_ids, tag_names) in enumerate(items):
+            if index in errors:
+                continue
+
+            # Only the first item with a content is written, the next ones are rejected
+            key = (dataset.id, Text.hash_content(content))
+            if key in first_items:
+                errors[index] = [f"Same content as the item {first_items[key]}."]
+                continue
+
+            for name in tag_names:
+                if name not in tags_by_name:
+                    tags_by_name[name] = Tag.objects.get_or_create(name=name, dataset=dataset)[0].id
+
+            keys[index] = key
+            first_items[key] = index
+            batch[keys[index]] = (
+                content, list(dict.fromkeys(tag_ids + [tags_by_name[name] for name in tag_names]))
+            )
+
+        text_ids, new_keys, existing = write_texts(batch, on_duplicate, batch_size) if batch else ({}, [], {})
+
+    existing_status = 'updated' if on_duplicate == 'upsert' else 'skipped'
+    results = []
+    for index in range(len(items)):
+        if index in errors:
+            results.append({'index': index, 'status': 'error', 'error': errors[index]})
+        else:
+            key = keys[index]
+            results.append({
+                'index': index, 'id': text_ids[key], 'status': existing_status if key in existing else 'created',
+            })
+
+    return results
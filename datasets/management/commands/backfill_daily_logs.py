@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from datasets.exporters import export_logs_of_day
+from datasets.tasks import backfill_daily_logs
+
+
+class Command(BaseCommand):
+    help = "Export the activity logs of every day of [start, end) to gzip CSV files in LOG_EXPORT_DIR."
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=date.fromisoformat, help="First day to export (YYYY-MM-DD).")
+        parser.add_argument('end', type=date.fromisoformat, help="Day after the last day to export (YYYY-MM-DD).")
+        parser.add_argument('--sync', action='store_true',
+                            help="Export the days one by one in this process instead of queueing Celery tasks.")
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if end <= start:
+            raise CommandError("end must be after start.")
+
+        if not options['sync']:
+            backfill_daily_logs.delay(start.isoformat(), end.isoformat())
+            self.stdout.write(self.style.SUCCESS(f"Queued the export of {(end - start).days} days."))
+            return
+
+        day = start
+        while day < end:
+            path, rows = export_logs_of_day(day)
+            self.stdout.write(f"{day}: {rows} logs written to {path}")
+            day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {(end - start).days} days."))
@@ -0,0 +1,145 @@
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from account.models import Profile
+from datasets.models import Dataset, Log, ResourceVersion, Tag, TagCount, Text
+from datasets.rollups import exclude_archived_days, rollup_day
+from datasets.search import update_search_index
+
+
+WORDS = (
+    "data label text model review price quality delivery support service product order "
+    "account payment refund issue great poor fast slow happy angry question answer "
+    "bug feature request update release mobile web server network error success"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic datasets, tags, texts, operators and activity logs with bulk inserts, "
+        "e.g. to run the benchmarks. The same seed always generates the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datasets', type=int, default=5)
+        parser.add_argument('--tags', type=int, default=20, help="Tags per dataset.")
+        parser.add_argument('--texts', type=int, default=100000, help="Texts in total, spread over the datasets.")
+        parser.add_argument('--tags-per-text', type=int, default=2)
+        parser.add_argument('--operators', type=int, default=10)
+        parser.add_argument('--logs', type=int, default=100000)
+        parser.add_argument('--log-days', type=int, default=30, help="Logs are spread over the last days.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic', help="Prefix of the dataset names and usernames.")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+
+        with transaction.atomic():
+            datasets = Dataset.objects.bulk_create([
+                Dataset(name=f"{prefix}-{index}", description="Synthetic dataset")
+                for index in range(options['datasets'])
+            ])
+            tags_by_dataset = {
+                dataset.id: [tag.id for tag in Tag.objects.bulk_create([
+                    Tag(name=f"tag{index}", dataset=dataset) for index in range(options['tags'])
+                ])]
+                for dataset in datasets
+            }
+            operators = self.create_operators(prefix, options['operators'], datasets)
+            # bulk_create doesn't send post_save, bump the versions read by the ETags here
+            ResourceVersion.objects.bump_datasets([dataset.id for dataset in datasets], dataset_list=True)
+
+        self.stdout.write(f"Created {len(datasets)} datasets, {options['tags']} tags each, {len(operators)} operators.")
+
+        text_ids = self.create_texts(datasets, tags_by_dataset, options['texts'], options['tags_per_text'])
+        self.stdout.write(f"Created {len(text_ids)} texts.")
+
+        if operators and text_ids:
+            days = self.create_logs(operators, text_ids, options['logs'], options['log_days'])
+            for day in exclude_archived_days(days):
+                rollup_day(day)
+            self.stdout.write(f"Created {options['logs']} logs over {len(days)} days.")
+
+        self.stdout.write(self.style.SUCCESS("Synthetic data generated."))
+
+    def create_operators(self, prefix, count, datasets):
+        # Hashing is slow on purpose, all the operators share the same password: "operator"
+        password = make_password('operator')
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}-operator-{index}", password=password) for index in range(count)
+        ])
+        # bulk_create doesn't send post_save, create the profiles here
+        profiles = Profile.objects.bulk_create([Profile(user=user, role='operator') for user in users])
+
+        Profile.available_datasets.through.objects.bulk_create([
+            Profile.available_datasets.through(profile_id=profile.id, dataset_id=dataset.id)
+            for profile in profiles
+            for dataset in self.random.sample(datasets, k=max(1, len(datasets) // 2))
+        ])
+        return [user.id for user in users]
+
+    def create_texts(self, datasets, tags_by_dataset, count, tags_per_text):
+        TextTag = Text.tags.through
+        text_ids = []
+
+        for start in range(0, count, self.batch_size):
+            texts = []
+            for index in range(start, min(start + self.batch_size, count)):
+                content = f"{index} " + ' '.join(self.random.choices(WORDS, k=self.random.randint(5, 30)))
+                texts.append(Text(dataset=datasets[index % len(datasets)], content=content,
+                                  content_hash=Text.hash_content(content)))
+
+            with transaction.atomic():
+                Text.objects.bulk_create(texts, batch_size=self.batch_size)
+
+                rows = []
+                tag_count_deltas = Counter()
+                for text in texts:
+                    tag_ids = tags_by_dataset[text.dataset_id]
+                    for tag_id in self.random.sample(tag_ids, k=min(tags_per_text, len(tag_ids))):
+                        rows.append(TextTag(text_id=text.id, tag_id=tag_id))
+                        tag_count_deltas[(text.dataset_id, tag_id)] += 1
+
+                TextTag.objects.bulk_create(rows, batch_size=self.batch_size)
+
+                # Bulk inserts don't send signals, update the counters and the search index here
+                TagCount.objects.apply_deltas(tag_count_deltas)
+                update_search_index(text_ids=[text.id for text in texts])
+                ResourceVersion.objects.bump_datasets({text.dataset_id for text in texts})
+
+            text_ids.extend(text.id for text in texts)
+            self.stdout.write(f"  {len(text_ids)}/{count} texts")
+
+        return text_ids
+
+    def create_logs(self, operators, text_ids, count, log_days):
+        now = timezone.now()
+        days = set()
+
+        for start in range(0, count, self.batch_size):
+            logs = []
+            for index in range(start, min(start + self.batch_size, count)):
+                moment = now - timedelta(seconds=self.random.randint(0, log_days * 24 * 3600))
+                days.add(timezone.localdate(moment))
+                logs.append(Log(
+                    user_id=self.random.choice(operators),
+                    text_instance_id=self.random.choice(text_ids),
+                    action="update",
+                    updated_field="tags",
+                    action_details="Synthetic update",
+                    datetime=moment,
+                ))
+
+            Log.objects.bulk_create(logs, batch_size=self.batch_size)
+
+        return sorted(days)
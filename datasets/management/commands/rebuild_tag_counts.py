@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from datasets.models import TagCount
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-dataset tag counters (TagCount) from the text-tag table, or only verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', type=int, help="Only rebuild the counters of this dataset id.")
+        parser.add_argument('--verify', action='store_true',
+                            help="Only compare the counters with the real counts, fail if they differ.")
+
+    def handle(self, *args, **options):
+        dataset_id = options['dataset']
+
+        text_tag_filters = {'text__dataset_id': dataset_id} if dataset_id else {}
+        counter_filters = {'dataset_id': dataset_id} if dataset_id else {}
+
+        with transaction.atomic():
+            expected = TagCount.objects.count_text_tags(**text_tag_filters)
+            current = {
+                (row_dataset_id, tag_id): count
+                for row_dataset_id, tag_id, count in (TagCount.objects.filter(**counter_filters)
+                                                      .values_list('dataset_id', 'tag_id', 'count'))
+            }
+
+            mismatches = {
+                key: (current.get(key, 0), expected.get(key, 0))
+                for key in expected.keys() | current.keys()
+                if current.get(key, 0) != expected.get(key, 0)
+            }
+
+            for (row_dataset_id, tag_id), (found, real) in sorted(mismatches.items()):
+                self.stdout.write(f"dataset {row_dataset_id} tag {tag_id}: counter {found}, real {real}")
+
+            if options['verify']:
+                if mismatches:
+                    raise CommandError(f"{len(mismatches)} tag counters are out of sync.")
+
+                self.stdout.write(self.style.SUCCESS(f"{len(expected)} tag counters are in sync."))
+                return
+
+            TagCount.objects.filter(**counter_filters).delete()
+            TagCount.objects.bulk_create(
+                [TagCount(dataset_id=row_dataset_id, tag_id=tag_id, count=count)
+                 for (row_dataset_id, tag_id), count in expected.items()],
+                batch_size=1000,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(expected)} tag counters ({len(mismatches)} were out of sync)."
+        ))
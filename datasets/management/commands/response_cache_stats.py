@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+import datasets.urls
+from datasets.benchmarks import get_url_names
+from datasets.caching import get_response_cache_stats, reset_response_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the hits and misses of the response cache per URL. "
+        "The counters are shared between processes only with the Redis cache (CACHE_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after showing them.")
+
+    def handle(self, *args, **options):
+        url_names = get_url_names(datasets.urls)
+        stats = get_response_cache_stats(url_names)
+
+        for url_name, counts in stats.items():
+            total = counts['hits'] + counts['misses']
+            if not total:
+                continue
+
+            self.stdout.write(
+                f"{url_name:<28} {counts['hits']:>9} hits {counts['misses']:>9} misses "
+                f"{counts['hits'] / total:>7.1%} hit ratio"
+            )
+
+        if options['reset']:
+            reset_response_cache_stats(url_names)
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+import account.urls
+import datasets.urls
+from account.access import invalidate_user_access
+from datasets.benchmarks import (SCENARIOS, BenchmarkFixtures, compare_results,
+                                 get_environment, get_url_names, run_scenario)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every URL of datasets.urls and account.urls against the current data "
+        "(see generate_synthetic_data): p50/p95 latency, queries per request and peak memory, saved as JSON. "
+        "Every request is rolled back, the data is left unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="Measured requests per URL.")
+        parser.add_argument('--warmup', type=int, default=2, help="Requests per URL sent before measuring.")
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME', help="Only benchmark these URL names.")
+        parser.add_argument('--search-term', default='refund')
+        parser.add_argument('--bulk-size', type=int, default=100, help="Texts per bulk tagging request.")
+        parser.add_argument('--output', help="JSON file to write, by default benchmarks/<time>-<commit>.json.")
+        parser.add_argument('--compare', help="JSON file of a previous run, fail if a URL got slower or runs more queries.")
+        parser.add_argument('--threshold', type=float, default=20,
+                            help="Allowed p95 latency increase in percent when comparing (default 20).")
+
+    def handle(self, *args, **options):
+        url_names = get_url_names(datasets.urls, account.urls)
+        scenarios = [scenario for scenario in SCENARIOS
+                     if not options['only'] or scenario.url_name in options['only']]
+
+        not_benchmarked = sorted(set(url_names) - {scenario.url_name for scenario in SCENARIOS})
+        for url_name in not_benchmarked:
+            self.stderr.write(self.style.WARNING(f"No benchmark scenario for the URL {url_name}"))
+
+        environment = get_environment()
+        results = {}
+
+        # Everything, fixtures included, is rolled back at the end. The response cache is disabled
+        # like in the query budget tests, the views themselves are measured, not cache hits
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                                                     RESPONSE_CACHE_ENABLED=False):
+            try:
+                fixtures = BenchmarkFixtures(options['search_term'], options['bulk_size'])
+            except ValueError as error:
+                raise CommandError(str(error))
+
+            client = APIClient()
+            client.force_authenticate(fixtures.admin)
+
+            try:
+                for scenario in scenarios:
+                    result = run_scenario(client, scenario, fixtures, options['iterations'], options['warmup'])
+                    results[scenario.url_name] = result
+                    self.stdout.write(
+                        f"{scenario.url_name:<28} {result['status']} p50 {result['p50_ms']:>9.2f} ms  "
+                        f"p95 {result['p95_ms']:>9.2f} ms  {result['queries']:>3} queries  "
+                        f"{result['peak_memory_kb']:>9.1f} KB"
+                    )
+            finally:
+                transaction.set_rollback(True)
+                # The ids of the rolled back users will be reused, don't keep their access cached
+                invalidate_user_access(fixtures.admin.id, fixtures.operator.id)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'environment': environment,
+            'options': {key: options[key] for key in ('iterations', 'warmup', 'search_term', 'bulk_size')},
+            'not_benchmarked': not_benchmarked,
+            'results': results,
+        }
+
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / (
+            f"{timezone.now():%Y%m%d-%H%M%S}-{(environment['git_commit'] or 'unknown')[:10]}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+            if baseline['environment']['data'] != environment['data']:
+                self.stderr.write(self.style.WARNING("The baseline was run on different data, results may differ."))
+
+            regressions = compare_results(results, baseline['results'], options['threshold'])
+            if regressions:
+                raise CommandError("Regressions:\n" + "\n".join(regressions))
+
+            self.stdout.write(self.style.SUCCESS(f"No regression compared to {options['compare']}."))
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-17 17:59
+
+import datasets.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('datasets', '0006_rename_updated_filed_log_updated_field_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(storage=datasets.models.get_import_storage, upload_to='%Y/%m/%d/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total_bytes', models.PositiveBigIntegerField(default=0)),
+                ('processed_bytes', models.PositiveBigIntegerField(default=0)),
+                ('rows_processed', models.PositiveBigIntegerField(default=0)),
+                ('texts_created', models.PositiveBigIntegerField(default=0)),
+                ('texts_updated', models.PositiveBigIntegerField(default=0)),
+                ('error_count', models.PositiveBigIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('rows_per_second', models.FloatField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
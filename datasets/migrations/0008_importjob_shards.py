@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0007_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='shards',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
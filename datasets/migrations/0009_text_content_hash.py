@@ -0,0 +1,71 @@
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_content_hash(apps, schema_editor):
+    """
+    Fill the hash of the existing texts in batches, then merge the texts
+    with the same content in a dataset so the unique index can be created.
+    """
+    Text = apps.get_model('datasets', 'Text')
+    Log = apps.get_model('datasets', 'Log')
+    TextTag = Text.tags.through
+
+    last_id = 0
+    while True:
+        texts = list(Text.objects.filter(id__gt=last_id).order_by('id').only('id', 'content')[:BATCH_SIZE])
+        if not texts:
+            break
+
+        for text in texts:
+            text.content_hash = hashlib.sha256(text.content.encode('utf-8')).hexdigest()
+
+        Text.objects.bulk_update(texts, ['content_hash'])
+        last_id = texts[-1].id
+
+    duplicates = (Text.objects.values('dataset_id', 'content_hash')
+                  .annotate(count=Count('id'), keep_id=Min('id'))
+                  .filter(count__gt=1))
+
+    for group in duplicates.iterator():
+        duplicate_ids = list(
+            Text.objects.filter(dataset_id=group['dataset_id'], content_hash=group['content_hash'])
+            .exclude(id=group['keep_id']).values_list('id', flat=True)
+        )
+
+        # The kept text gets the tags of all its duplicates
+        tag_ids = set(TextTag.objects.filter(text_id__in=duplicate_ids).values_list('tag_id', flat=True))
+        TextTag.objects.bulk_create(
+            [TextTag(text_id=group['keep_id'], tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True,
+        )
+
+        # Keep one log entry if the kept text has none (Log.text_instance is one-to-one)
+        if not Log.objects.filter(text_instance_id=group['keep_id']).exists():
+            log = Log.objects.filter(text_instance_id__in=duplicate_ids).order_by('-datetime').first()
+            if log is not None:
+                log.text_instance_id = group['keep_id']
+                log.save(update_fields=['text_instance'])
+
+        Text.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0008_importjob_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0009_text_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='text',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='text',
+            constraint=models.UniqueConstraint(fields=('dataset', 'content_hash'), name='unique_text_content_per_dataset'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0010_text_unique_text_content_per_dataset'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='text',
+            index=models.Index(fields=['dataset', 'id'], name='text_dataset_id_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.16 on 2026-10-17 18:06
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def populate_tag_counts(apps, schema_editor):
+    Text = apps.get_model('datasets', 'Text')
+    TagCount = apps.get_model('datasets', 'TagCount')
+
+    counts = (Text.tags.through.objects.values_list('text__dataset_id', 'tag_id')
+              .annotate(count=Count('text_id')).order_by())
+    TagCount.objects.bulk_create(
+        (TagCount(dataset_id=dataset_id, tag_id=tag_id, count=count) for dataset_id, tag_id, count in counts),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0011_text_dataset_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.BigIntegerField(default=0)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='datasets.dataset')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='datasets.tag')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tagcount',
+            constraint=models.UniqueConstraint(fields=('dataset', 'tag'), name='unique_tag_count_per_dataset'),
+        ),
+        migrations.RunPython(populate_tag_counts, migrations.RunPython.noop),
+    ]
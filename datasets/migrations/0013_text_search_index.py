@@ -0,0 +1,60 @@
+from django.db import migrations
+
+
+# Note: on SQLite, a migration that rebuilds the datasets_text table drops these
+# triggers, run get_search_backend().rebuild() after recreating them.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE datasets_text_fts USING fts5("
+    "content, content='datasets_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+
+    "CREATE TRIGGER datasets_text_fts_insert AFTER INSERT ON datasets_text BEGIN "
+    "INSERT INTO datasets_text_fts(rowid, content) VALUES (new.id, new.content); END",
+
+    "CREATE TRIGGER datasets_text_fts_delete AFTER DELETE ON datasets_text BEGIN "
+    "INSERT INTO datasets_text_fts(datasets_text_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+
+    "CREATE TRIGGER datasets_text_fts_update AFTER UPDATE OF content ON datasets_text BEGIN "
+    "INSERT INTO datasets_text_fts(datasets_text_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO datasets_text_fts(rowid, content) VALUES (new.id, new.content); END",
+
+    "INSERT INTO datasets_text_fts(datasets_text_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS datasets_text_fts_update",
+    "DROP TRIGGER IF EXISTS datasets_text_fts_delete",
+    "DROP TRIGGER IF EXISTS datasets_text_fts_insert",
+    "DROP TABLE IF EXISTS datasets_text_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX text_content_search_idx ON datasets_text "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(content, '')))",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS text_content_search_idx",
+]
+
+
+def run_statements(statements_by_vendor):
+
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0012_tagcount'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_statements({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-17 18:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0013_text_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='datetime',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='log',
+            name='text_instance',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='datasets.text'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['datetime'], name='log_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['user', 'datetime'], name='log_user_datetime_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+
+def get_free_name(model, name, suffix, **filters):
+    """
+    Append suffix to name until no row of model (filtered by filters) has it,
+    within the 255 characters of the name fields.
+    """
+    candidate = name
+    while model.objects.filter(name=candidate, **filters).exists():
+        candidate = f"{candidate[:255 - len(suffix)]}{suffix}"
+
+    return candidate
+
+
+def rename_duplicates(apps, schema_editor):
+    """
+    Rename the datasets with the same name, and the tags with the same name in a dataset,
+    so the unique constraints can be created: the oldest keeps its name, the others get
+    their id appended, e.g. "reviews (12)" for a dataset and "positive_34" for a tag
+    (tag names can't contain whitespace). Nothing is merged, the texts, tags and access
+    of the datasets are left as they are.
+    """
+    Dataset = apps.get_model('datasets', 'Dataset')
+    Tag = apps.get_model('datasets', 'Tag')
+    ResourceVersion = apps.get_model('datasets', 'ResourceVersion')
+
+    renamed = set()
+    duplicates = (Dataset.objects.values('name')
+                  .annotate(count=Count('id'), keep_id=Min('id'))
+                  .filter(count__gt=1).order_by())
+    for group in list(duplicates):
+        for dataset in Dataset.objects.filter(name=group['name']).exclude(id=group['keep_id']).order_by('id'):
+            dataset.name = get_free_name(Dataset, dataset.name, f" ({dataset.id})")
+            dataset.save(update_fields=['name'])
+            renamed.add(dataset.id)
+
+    duplicates = (Tag.objects.values('dataset_id', 'name')
+                  .annotate(count=Count('id'), keep_id=Min('id'))
+                  .filter(count__gt=1).order_by())
+    for group in list(duplicates):
+        tags = Tag.objects.filter(dataset_id=group['dataset_id'], name=group['name']).exclude(id=group['keep_id'])
+        for tag in tags.order_by('id'):
+            tag.name = get_free_name(Tag, tag.name, f"_{tag.id}", dataset_id=tag.dataset_id)
+            tag.save(update_fields=['name'])
+            renamed.add(tag.dataset_id)
+
+    if renamed:
+        ResourceVersion.objects.filter(
+            key__in=['datasets'] + [f"dataset:{dataset_id}" for dataset_id in renamed]
+        ).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('datasets', '0016_resourceversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dataset',
+            constraint=models.UniqueConstraint(fields=('name',), name='unique_dataset_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('dataset', 'name'), name='unique_tag_name_per_dataset'),
+        ),
+    ]
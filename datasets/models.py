@@ -1,6 +1,13 @@
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
 from django.db import models
-from datetime import datetime
+from django.db.models import Count, F, Q
+from django.utils import timezone
 
 
 class Dataset(models.Model):
@@ -8,6 +15,12 @@ class Dataset(models.Model):
     description = models.TextField(blank=True)
     creation_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # Concurrent imports naming the same dataset get the same row
+            models.UniqueConstraint(fields=['name'], name='unique_dataset_name'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -18,28 +31,283 @@ class Tag(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'name'], name='unique_tag_name_per_dataset'),
+        ]
+
     def __str__(self):
         return self.name
     
     
 class Text(models.Model):
     content = models.TextField()
+    # sha256 of the content, indexed with the dataset to find duplicates without comparing contents
+    content_hash = models.CharField(max_length=64, editable=False)
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
     tags = models.ManyToManyField(Tag, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'content_hash'], name='unique_text_content_per_dataset'),
+        ]
+        indexes = [
+            # Keyset pagination of the texts of a dataset
+            models.Index(fields=['dataset', 'id'], name='text_dataset_id_idx'),
+        ]
+
     def __str__(self):
         return f"Text: {self.content[:50]}..."
 
+    @staticmethod
+    def hash_content(content):
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        # Remember the dataset to move the tag counts if it is changed
+        instance._loaded_dataset_id = instance.__dict__.get('dataset_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the hash in sync with the content
+        self.content_hash = self.hash_content(self.content)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'content_hash'}
+
+        super().save(*args, **kwargs)
+
+
+class TagCountManager(models.Manager):
+
+    def count_text_tags(self, **filters):
+        """
+        Count the text-tag rows matching the filters as {(dataset id, tag id): number},
+        the dataset being the dataset of the text.
+        """
+        rows = (Text.tags.through.objects.filter(**filters)
+                .values_list('text__dataset_id', 'tag_id')
+                .annotate(count=Count('text_id')).order_by())
+        return {(dataset_id, tag_id): count for dataset_id, tag_id, count in rows}
+
+    def apply_deltas(self, deltas):
+        """
+        Add {(dataset id, tag id): number} to the counters, creating the missing ones.
+        Counters are incremented in the database so concurrent updates don't get lost.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        self.bulk_create(
+            [TagCount(dataset_id=dataset_id, tag_id=tag_id) for dataset_id, tag_id in deltas],
+            ignore_conflicts=True,
+        )
+
+        # One UPDATE per distinct delta (usually +1 or -1) instead of one per counter
+        keys_by_delta = {}
+        for (dataset_id, tag_id), delta in deltas.items():
+            keys_by_delta.setdefault(delta, {}).setdefault(dataset_id, []).append(tag_id)
+
+        for delta, tag_ids_by_dataset in keys_by_delta.items():
+            condition = Q()
+            for dataset_id, tag_ids in tag_ids_by_dataset.items():
+                condition |= Q(dataset_id=dataset_id, tag_id__in=tag_ids)
+
+            self.filter(condition).update(count=F('count') + delta)
+
+
+class TagCount(models.Model):
+    """
+    Number of texts of a dataset labeled with a tag, kept up to date by the
+    datasets.signals receivers and the bulk write paths.
+    Rebuild or verify with: python manage.py rebuild_tag_counts
+    """
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    count = models.BigIntegerField(default=0)
+
+    objects = TagCountManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'tag'], name='unique_tag_count_per_dataset'),
+        ]
+
+    def __str__(self):
+        return f"{self.tag}: {self.count}"
+
+
+class ResourceVersionManager(models.Manager):
+
+    def bump(self, keys):
+        """
+        Increment the versions of the keys, creating the missing ones.
+        Call it in the transaction of the change, so the new version
+        is visible exactly when the change is.
+        """
+        keys = sorted(set(keys))
+        if not keys:
+            return
+
+        updated = self.filter(key__in=keys).update(version=F('version') + 1, updated_at=timezone.now())
+        if updated < len(keys):
+            # First change of some keys: existing ones are incremented twice, which is harmless
+            self.bulk_create([ResourceVersion(key=key) for key in keys], ignore_conflicts=True)
+            self.filter(key__in=keys).update(version=F('version') + 1, updated_at=timezone.now())
+
+    def bump_datasets(self, dataset_ids, dataset_list=False):
+        keys = [ResourceVersion.dataset_key(dataset_id) for dataset_id in dataset_ids]
+        if dataset_list:
+            keys.append(ResourceVersion.DATASET_LIST_KEY)
+
+        self.bump(keys)
+
+    def get_version(self, key):
+        """
+        Return (version, updated at) of a key, (0, None) if it never changed.
+        """
+        return self.filter(key=key).values_list('version', 'updated_at').first() or (0, None)
+
+
+class ResourceVersion(models.Model):
+    """
+    Monotonic version of a resource: "dataset:<id>" is incremented on every change of
+    the dataset, its tags or its texts, "datasets" on every change of the list of datasets.
+    Drives the ETag and Last-Modified headers of the read endpoints, see datasets.versions.
+    """
+    DATASET_LIST_KEY = 'datasets'
+
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = ResourceVersionManager()
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+    @staticmethod
+    def dataset_key(dataset_id):
+        return f"dataset:{dataset_id}"
+
 
 class Log(models.Model):
+    """
+    Append-only activity log, one row per action on a text.
+    Rows are written in bulk by datasets.activity, never updated.
+    """
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    text_instance = models.OneToOneField(Text, on_delete=models.CASCADE)
+    text_instance = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='logs')
     action = models.TextField(max_length=20, blank=False, null=False, default="update")
     updated_field = models.TextField(max_length=10, blank=False, null=False, default="tags")
     action_details = models.TextField(max_length=300, blank=False, null=False, default="update")
-    datetime = models.DateTimeField(default=datetime.now, blank=False, null=False)
+    datetime = models.DateTimeField(default=timezone.now, blank=False, null=False)
+
+    class Meta:
+        indexes = [
+            # Daily exports and reports read time ranges, per user or for everyone
+            models.Index(fields=['datetime'], name='log_datetime_idx'),
+            models.Index(fields=['user', 'datetime'], name='log_user_datetime_idx'),
+        ]
 
 
     def __str__(self):
         return f"{self.user} - {self.user.profile.role} {self.action} on {self.text_instance} at {self.datetime}"
+
+
+class DailyActivityRollup(models.Model):
+    """
+    Number of Log entries per day, user, dataset and action,
+    computed once a day by the rollup_daily_activity task.
+    """
+    day = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE)
+    action = models.TextField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'dataset', 'action'], name='unique_daily_activity_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['dataset', 'day'], name='rollup_dataset_day_idx'),
+            models.Index(fields=['user', 'day'], name='rollup_user_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.user} {self.action} on {self.dataset}: {self.count}"
+
+
+class ActivityRollupDay(models.Model):
+    """
+    Days whose DailyActivityRollup rows have been computed,
+    used to catch up on the days missed by the rollup task.
+    Once the Log entries of a day are archived its rollup can't be computed again.
+    """
+    day = models.DateField(unique=True)
+    rolled_up_at = models.DateTimeField(auto_now=True)
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.day} rolled up at {self.rolled_up_at}"
+
+
+class ImportStorage(FileSystemStorage):
+    """
+    Storage of the uploaded CSV files in CSV_IMPORT_ROOT, read on every access
+    so the setting can be overridden (e.g. by the tests).
+    """
+
+    @property
+    def base_location(self):
+        return settings.CSV_IMPORT_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def get_import_storage():
+    # Uploaded CSV files are kept outside MEDIA_ROOT, which is publicly served by nginx
+    return ImportStorage()
+
+
+class ImportJob(models.Model):
+    """
+    Background import of an uploaded CSV file, processed by a Celery worker.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    file = models.FileField(upload_to='%Y/%m/%d/', storage=get_import_storage)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    shards = models.PositiveSmallIntegerField(default=1)
+    total_bytes = models.PositiveBigIntegerField(default=0)
+    processed_bytes = models.PositiveBigIntegerField(default=0)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    texts_created = models.PositiveBigIntegerField(default=0)
+    texts_updated = models.PositiveBigIntegerField(default=0)
+    error_count = models.PositiveBigIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    rows_per_second = models.FloatField(default=0)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.id} ({self.status})"
@@ -0,0 +1,88 @@
+import json
+from base64 import b64decode, b64encode
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TextCursorPagination(CursorPagination):
+    """
+    Keyset pagination of texts on Text.id.
+
+    The next/previous links carry an opaque cursor instead of an offset,
+    so reading a deep page costs the same as reading the first one.
+
+    query params:
+    cursor (from the next/previous links),
+    page_size (default=TEXT_PAGE_SIZE, at most TEXT_MAX_PAGE_SIZE)
+    """
+    ordering = 'id'
+    page_size = settings.TEXT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.TEXT_MAX_PAGE_SIZE
+
+
+class SearchCursorPagination:
+    """
+    Keyset pagination of ranked search hits on (score, text id).
+
+    The cursor of the next link holds the score and id of the last hit
+    of the page, so deep pages cost the same as the first one.
+
+    query params:
+    cursor (from the next link),
+    page_size (default=TEXT_PAGE_SIZE, at most TEXT_MAX_PAGE_SIZE)
+    """
+    cursor_query_param = 'cursor'
+    page_size = settings.TEXT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.TEXT_MAX_PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_hits(self, search, request):
+        """
+        Call search(limit, after) for one page of (text id, score) hits.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        hits = search(limit=page_size + 1, after=self.decode_cursor(request))
+        self.has_next = len(hits) > page_size
+        self.hits = hits[:page_size]
+        return self.hits
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            score, text_id = json.loads(b64decode(encoded.encode('ascii')).decode('ascii'))
+            return float(score), int(text_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, hit):
+        text_id, score = hit
+        return b64encode(json.dumps([score, text_id]).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.hits[-1]))
+
+    def get_paginated_response(self, data, **extra):
+        return Response({'next': self.get_next_link(), 'results': data, **extra})
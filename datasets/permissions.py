@@ -1,32 +1,29 @@
-from django.shortcuts import get_object_or_404
 from rest_framework.permissions import BasePermission
 
-from datasets.models import Text
-
-from .models import Dataset
+from account.access import get_user_access
 
 
 class IsAdminOrHasDatasetAccess(BasePermission):
     """
     Custom permission: grants access if the user is an admin or if they are an operator
     with access to the dataset in the URL parameter.
+    The role and the accessible datasets come from the cached UserAccess of the user.
     """
 
     def has_permission(self, request, view):
-        user = request.user
+        access = get_user_access(request.user)
 
         # Allow access if the user is an admin
-        if user.is_superuser or (hasattr(user, 'profile') and user.profile.role == 'admin'):
+        if access.is_admin:
             return True
 
         # Check if the user is an operator and has access to the specific dataset
-        if hasattr(user, 'profile') and user.profile.role == 'operator':
+        if access.is_operator:
             # Extract the dataset ID from the URL path
             dataset_id = view.kwargs.get('pk') or view.kwargs.get('dataset_id')
             
             if dataset_id is not None:
-                dataset = get_object_or_404(Dataset, pk=dataset_id)
-                return dataset in user.profile.available_datasets.all()
+                return access.can_access(dataset_id)
 
         # Deny access if none of the above conditions are met
         return False
@@ -36,23 +33,18 @@ class IsAdminOrCanEditLimitedFields(BasePermission):
     """
     Custom permission: grants full access if the user is an admin.
     Operators can only edit certain fields if they have access to the dataset.
+    The dataset of the Text object is checked once the view has loaded it.
     """
 
     def has_permission(self, request, view):
-        user = request.user
-        # Allow access if the user is an admin
-        if user.is_superuser or (hasattr(user, 'profile') and user.profile.role == 'admin'):
-            return True
+        access = get_user_access(request.user)
 
-        # For operators, check if they have access to the dataset of the Text object
-        if hasattr(user, 'profile') and user.profile.role == 'operator':
-            # Extract the text ID from the URL path
-            text_id = view.kwargs.get('pk')
-            text = get_object_or_404(Text, pk=text_id)
+        # Allow access if the user is an admin or an operator,
+        # the dataset access of operators is checked on the object
+        return access.is_admin or access.is_operator
 
-            # Check if the operator has access to the dataset
-            return text.dataset in user.profile.available_datasets.all()
-
-        # Deny access if none of the above conditions are met
-        return False
+    def has_object_permission(self, request, view, obj):
+        access = get_user_access(request.user)
 
+        # Check if the operator has access to the dataset of the Text object
+        return access.can_access(obj.dataset_id)
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .exporters import get_day_range
+from .models import ActivityRollupDay, DailyActivityRollup, Log
+
+
+def rollup_day(day):
+    """
+    Compute the DailyActivityRollup rows of a day from its Log entries,
+    replacing the rows computed before. Returns the number of rows.
+
+    Raises ValueError for archived days, their Log entries are gone.
+    """
+    if ActivityRollupDay.objects.filter(day=day, archived_at__isnull=False).exists():
+        raise ValueError(f"The logs of {day} are archived, its rollup can't be computed again.")
+
+    start, end = get_day_range(day)
+    counts = (Log.objects.filter(datetime__gte=start, datetime__lt=end)
+              .values_list('user_id', 'text_instance__dataset_id', 'action')
+              .annotate(count=Count('id'))
+              .order_by())
+
+    with transaction.atomic():
+        DailyActivityRollup.objects.filter(day=day).delete()
+        DailyActivityRollup.objects.bulk_create(
+            [
+                DailyActivityRollup(day=day, user_id=user_id, dataset_id=dataset_id, action=action, count=count)
+                for user_id, dataset_id, action, count in counts
+            ],
+            batch_size=1000,
+        )
+        ActivityRollupDay.objects.update_or_create(day=day)
+
+    return len(counts)
+
+
+def get_days_to_rollup(today=None):
+    """
+    Days to compute: every day after the last rolled up one until yesterday,
+    and the last ACTIVITY_ROLLUP_LOOKBACK_DAYS days again, since log entries
+    can be written late (buffered or spooled entries). Archived days are skipped.
+    """
+    yesterday = (today or timezone.localdate()) - timedelta(days=1)
+
+    last_day = ActivityRollupDay.objects.aggregate(last_day=Max('day'))['last_day']
+    if last_day is None:
+        first_log = Log.objects.aggregate(first=Min('datetime'))['first']
+        if first_log is None:
+            return []
+
+        first_day = timezone.localdate(first_log)
+    else:
+        first_day = min(last_day + timedelta(days=1),
+                        yesterday - timedelta(days=settings.ACTIVITY_ROLLUP_LOOKBACK_DAYS - 1))
+
+    days = [first_day + timedelta(days=offset) for offset in range((yesterday - first_day).days + 1)]
+    return exclude_archived_days(days)
+
+
+def exclude_archived_days(days):
+    archived = set(ActivityRollupDay.objects.filter(day__in=days, archived_at__isnull=False)
+                   .values_list('day', flat=True))
+    return [day for day in days if day not in archived]
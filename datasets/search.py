@@ -0,0 +1,352 @@
+import math
+import re
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+from .models import Text
+
+
+def get_search_backend():
+    """
+    Return the text search backend configured by TEXT_SEARCH_BACKEND.
+    """
+    return _load_search_backend(settings.TEXT_SEARCH_BACKEND)
+
+
+@lru_cache(maxsize=None)
+def _load_search_backend(path):
+    return import_string(path)()
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def update_search_index(text_ids=(), removed_text_ids=()):
+    """
+    Send created/updated and deleted texts to the search index once the
+    current transaction is committed. Remote backends are updated by the
+    Celery workers, in-process backends right away.
+    """
+    backend = get_search_backend()
+    text_ids, removed_text_ids = list(text_ids), list(removed_text_ids)
+
+    if backend.synced_by_database or not (text_ids or removed_text_ids):
+        return
+
+    if backend.asynchronous:
+        from .tasks import index_texts, remove_texts_from_index
+
+        if text_ids:
+            transaction.on_commit(lambda: index_texts.delay(text_ids))
+        if removed_text_ids:
+            transaction.on_commit(lambda: remove_texts_from_index.delay(removed_text_ids))
+        return
+
+    if text_ids:
+        transaction.on_commit(lambda: backend.index_texts(text_ids))
+    if removed_text_ids:
+        transaction.on_commit(lambda: backend.remove_texts(removed_text_ids))
+
+
+class BaseSearchBackend:
+    """
+    Full-text search over the texts of a dataset.
+
+    search() returns a list of (text id, score) hits sorted by decreasing score,
+    then increasing id. `after` is the (score, text id) of the last hit of the
+    previous page, so pages are read with a keyset instead of an offset.
+    """
+
+    # The database keeps the index in sync, index_texts/remove_texts are not needed
+    synced_by_database = False
+
+    # index_texts/remove_texts are run by the Celery workers
+    asynchronous = False
+
+    def search(self, dataset_id, query, limit, after=None):
+        raise NotImplementedError
+
+    def index_texts(self, text_ids):
+        """
+        Add or update texts in the index. Backends stored in the database
+        are kept in sync by the database itself and don't need it.
+        """
+
+    def remove_texts(self, text_ids):
+        """
+        Remove texts from the index.
+        """
+
+    def rebuild(self):
+        """
+        Rebuild the whole index from the Text table.
+        """
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 index stored in the datasets_text_fts table (migration 0013),
+    an external content table kept in sync with datasets_text by triggers,
+    so creates, updates, deletes and bulk imports are indexed right away.
+    Hits are ranked with bm25.
+    """
+    synced_by_database = True
+    table = 'datasets_text_fts'
+
+    def build_match(self, query):
+        # Quote every token so user input can't use the FTS5 query syntax,
+        # the last token also matches as a prefix
+        tokens = [f'"{token}"' for token in tokenize(query)]
+        if tokens:
+            tokens[-1] += '*'
+
+        return ' '.join(tokens)
+
+    def search(self, dataset_id, query, limit, after=None):
+        match = self.build_match(query)
+        if not match:
+            return []
+
+        score = f"-bm25({self.table})"
+        sql = (
+            f"SELECT text.id, {score} AS score "
+            f"FROM {self.table} JOIN datasets_text AS text ON text.id = {self.table}.rowid "
+            f"WHERE {self.table} MATCH %s AND text.dataset_id = %s"
+        )
+        params = [match, dataset_id]
+
+        if after is not None:
+            sql += f" AND ({score} < %s OR ({score} = %s AND text.id > %s))"
+            params += [after[0], after[0], after[1]]
+
+        sql += " ORDER BY score DESC, text.id LIMIT %s"
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL full-text search on to_tsvector('simple', content), served by the
+    GIN expression index of migration 0013. Hits are ranked with ts_rank.
+    """
+    synced_by_database = True
+    config = 'simple'
+
+    def search(self, dataset_id, query, limit, after=None):
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVector)
+        from django.db.models import Q
+
+        if not tokenize(query):
+            return []
+
+        vector = SearchVector('content', config=self.config)
+        search_query = SearchQuery(query, config=self.config)
+
+        texts = (Text.objects.filter(dataset_id=dataset_id)
+                 .annotate(document=vector, score=SearchRank(vector, search_query))
+                 .filter(document=search_query))
+
+        if after is not None:
+            texts = texts.filter(Q(score__lt=after[0]) | Q(score=after[0], id__gt=after[1]))
+
+        return list(texts.order_by('-score', 'id').values_list('id', 'score')[:limit])
+
+
+class ElasticsearchSearchBackend(BaseSearchBackend):
+    """
+    Texts indexed in Elasticsearch (ELASTICSEARCH_URL, index ELASTICSEARCH_TEXT_INDEX),
+    which moves the search load off the database. The index is updated by the
+    Celery tasks of datasets.tasks, rebuild it with rebuild_search_index.
+    """
+    asynchronous = True
+    chunk_size = 1000
+
+    def __init__(self):
+        from elasticsearch import Elasticsearch
+
+        self.client = Elasticsearch(settings.ELASTICSEARCH_URL)
+        self.index = settings.ELASTICSEARCH_TEXT_INDEX
+
+    def search(self, dataset_id, query, limit, after=None):
+        if not tokenize(query):
+            return []
+
+        response = self.client.search(
+            index=self.index,
+            query={
+                'bool': {
+                    'must': {'match': {'content': {'query': query, 'operator': 'and'}}},
+                    'filter': {'term': {'dataset_id': dataset_id}},
+                }
+            },
+            sort=[{'_score': 'desc'}, {'text_id': 'asc'}],
+            search_after=list(after) if after is not None else None,
+            size=limit,
+            source=False,
+            track_total_hits=False,
+        )
+        return [(hit['sort'][1], hit['sort'][0]) for hit in response['hits']['hits']]
+
+    def index_texts(self, text_ids):
+        from elasticsearch.helpers import bulk
+
+        text_ids = set(text_ids)
+        texts = Text.objects.filter(pk__in=text_ids).values_list('id', 'dataset_id', 'content')
+
+        actions = [
+            {'_index': self.index, '_id': text_id,
+             '_source': {'text_id': text_id, 'dataset_id': dataset_id, 'content': content}}
+            for text_id, dataset_id, content in texts.iterator(chunk_size=self.chunk_size)
+        ]
+        # Texts deleted in the meantime are removed from the index
+        indexed = {action['_id'] for action in actions}
+        actions += [{'_op_type': 'delete', '_index': self.index, '_id': text_id}
+                    for text_id in text_ids - indexed]
+
+        bulk(self.client, actions, raise_on_error=False)
+
+    def remove_texts(self, text_ids):
+        from elasticsearch.helpers import bulk
+
+        actions = [{'_op_type': 'delete', '_index': self.index, '_id': text_id} for text_id in text_ids]
+        bulk(self.client, actions, raise_on_error=False)
+
+    def rebuild(self):
+        from elasticsearch.helpers import bulk
+
+        self.client.indices.delete(index=self.index, ignore_unavailable=True)
+        self.client.indices.create(index=self.index, mappings={
+            'properties': {
+                'text_id': {'type': 'long'},
+                'dataset_id': {'type': 'long'},
+                'content': {'type': 'text'},
+            }
+        })
+
+        texts = Text.objects.order_by('id').values_list('id', 'dataset_id', 'content')
+        actions = (
+            {'_index': self.index, '_id': text_id,
+             '_source': {'text_id': text_id, 'dataset_id': dataset_id, 'content': content}}
+            for text_id, dataset_id, content in texts.iterator(chunk_size=self.chunk_size)
+        )
+        bulk(self.client, actions, chunk_size=self.chunk_size)
+        self.client.indices.refresh(index=self.index)
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Pure-Python inverted index kept in the memory of the process, loaded from the
+    Text table on first use. For tests and offline environments: every process
+    has its own index, updated by the signals of the same process.
+    Hits are ranked with tf-idf.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        # token -> {text id: number of occurrences}
+        self.postings = {}
+        # text id -> (dataset id, set of tokens)
+        self.documents = {}
+
+    def load(self):
+        with self.lock:
+            if not self.loaded:
+                self.rebuild()
+
+    def rebuild(self):
+        with self.lock:
+            self.postings = {}
+            self.documents = {}
+            texts = Text.objects.values_list('id', 'dataset_id', 'content')
+            for text_id, dataset_id, content in texts.iterator(chunk_size=2000):
+                self.add_document(text_id, dataset_id, content)
+
+            self.loaded = True
+
+    def add_document(self, text_id, dataset_id, content):
+        tokens = tokenize(content)
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            postings[text_id] = postings.get(text_id, 0) + 1
+
+        self.documents[text_id] = (dataset_id, set(tokens))
+
+    def remove_document(self, text_id):
+        dataset_id, tokens = self.documents.pop(text_id, (None, ()))
+        for token in tokens:
+            postings = self.postings.get(token, {})
+            postings.pop(text_id, None)
+            if not postings:
+                self.postings.pop(token, None)
+
+    def index_texts(self, text_ids):
+        with self.lock:
+            # Not loaded yet: the texts will be read with all the others
+            if not self.loaded:
+                return
+
+            text_ids = set(text_ids)
+            for text_id in text_ids:
+                self.remove_document(text_id)
+
+            for text_id, dataset_id, content in (Text.objects.filter(pk__in=text_ids)
+                                                 .values_list('id', 'dataset_id', 'content')):
+                self.add_document(text_id, dataset_id, content)
+
+    def remove_texts(self, text_ids):
+        with self.lock:
+            for text_id in text_ids:
+                self.remove_document(text_id)
+
+    def search(self, dataset_id, query, limit, after=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        self.load()
+
+        with self.lock:
+            total = len(self.documents) or 1
+
+            # Every token must match, the last one also as a prefix
+            scores = None
+            for position, token in enumerate(tokens):
+                if position == len(tokens) - 1:
+                    terms = [term for term in self.postings if term.startswith(token)]
+                else:
+                    terms = [token] if token in self.postings else []
+
+                token_scores = {}
+                for term in terms:
+                    postings = self.postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for text_id, occurrences in postings.items():
+                        if self.documents[text_id][0] == dataset_id:
+                            token_scores[text_id] = token_scores.get(text_id, 0.0) + occurrences * idf
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {text_id: score + token_scores[text_id]
+                              for text_id, score in scores.items() if text_id in token_scores}
+
+        hits = sorted(((text_id, score) for text_id, score in scores.items()), key=lambda hit: (-hit[1], hit[0]))
+        if after is not None:
+            hits = [(text_id, score) for text_id, score in hits
+                    if score < after[0] or (score == after[0] and text_id > after[1])]
+
+        return hits[:limit]
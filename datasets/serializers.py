@@ -1,45 +1,230 @@
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import serializers
 
-from .exceptions import InactiveTagException
-from .models import Dataset, Tag, Text
+from config.middleware import ProfiledSerializerMixin
+from .fields import PrimaryKeyListField
+from .models import Dataset, ImportJob, Tag, Text
+from .validators import TagValidator
 
 
-class DatasetSerializer(serializers.ModelSerializer):
+class DatasetSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Dataset
         fields = ['id', 'name', 'description', 'creation_date']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name', 'dataset', 'description', 'is_active']
         read_only_fields = ['dataset']
 
+    def validate(self, attrs):
+        # The dataset comes from the instance on update, from the view context on create
+        dataset = self.instance.dataset if self.instance else self.context.get('dataset')
+        name = attrs.get('name')
+
+        if dataset is not None and name is not None:
+            duplicates = Tag.objects.filter(dataset=dataset, name=name)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+
+            if duplicates.exists():
+                raise serializers.ValidationError({'name': "A tag with the same name already exists in this dataset."})
+
+        return attrs
+
+
+class TextSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    # Tag ids, all checked at once by validate_tags
+    tags = PrimaryKeyListField(
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all()), required=False
+    )
 
-class TextSerializer(serializers.ModelSerializer):
     class Meta:
         model = Text
         fields = ['id', 'content', 'dataset', 'tags']
         read_only_fields = ['dataset']
+
+    def get_dataset(self):
+        # The dataset comes from the instance on update, from the view context on create
+        return self.instance.dataset if self.instance else self.context.get('dataset')
         
-    def validate_tags(self, tags):
-        # Iterate over each tag ID to check if the tag is active
-        for tag in tags:
-            if not tag.is_active:
-                raise InactiveTagException(tag)
-            
-        return tags
+    def validate(self, attrs):
+        dataset = attrs.get('dataset') or self.get_dataset()
+        content = attrs.get('content')
+
+        if dataset is not None and content is not None:
+            duplicates = Text.objects.filter(dataset=dataset, content_hash=Text.hash_content(content))
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+
+            if duplicates.exists():
+                raise serializers.ValidationError(
+                    {'content': "A text with the same content already exists in this dataset."}
+                )
+
+        return attrs
+
+    def validate_tags(self, tag_ids):
+        dataset = self.get_dataset()
+        if dataset is None:
+            raise serializers.ValidationError("The dataset of the text is unknown.")
+
+        # Unknown, inactive and other datasets' tags are all rejected together
+        validator = TagValidator()
+        invalid = validator.find_invalid(dataset.pk, tag_ids)
+
+        # Tags the text already has are kept as they are, even if they were deactivated since
+        if invalid and self.instance is not None:
+            current_tag_ids = set(self.instance.tags.values_list('id', flat=True))
+            invalid = [tag_id for tag_id in invalid if tag_id not in current_tag_ids]
+
+        errors = validator.describe(dataset.pk, invalid) if invalid else []
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return list(dict.fromkeys(tag_ids))
+
+
+class BulkTagItemSerializer(serializers.Serializer):
+    text_id = serializers.IntegerField()
+    tags = serializers.ListField(child=serializers.IntegerField(), allow_empty=True)
+
+
+class BulkTagUpdateSerializer(serializers.Serializer):
+    """
+    Either a list of items {text_id, tags},
+    or text_ids and the tags to set on all of them.
+    """
+    max_items = 10000
+
+    items = BulkTagItemSerializer(many=True, required=False)
+    text_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        if 'items' in attrs:
+            if 'text_ids' in attrs or 'tags' in attrs:
+                raise serializers.ValidationError("Send either 'items' or 'text_ids' and 'tags', not both.")
+
+            items = [(item['text_id'], item['tags']) for item in attrs['items']]
+
+        elif 'text_ids' in attrs and 'tags' in attrs:
+            items = [(text_id, attrs['tags']) for text_id in attrs['text_ids']]
+
+        else:
+            raise serializers.ValidationError("Send either 'items' or 'text_ids' and 'tags'.")
+
+        if not items:
+            raise serializers.ValidationError("There are no texts to update.")
+
+        if len(items) > self.max_items:
+            raise serializers.ValidationError(f"At most {self.max_items} texts can be updated at once.")
+
+        return {'items': items}
+
+
+class TagChangeSerializer(serializers.Serializer):
+    """
+    Tags to add to and remove from a text, the other tags of the text are kept.
+    """
+    add_tags = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    remove_tags = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, attrs):
+        if not attrs['add_tags'] and not attrs['remove_tags']:
+            raise serializers.ValidationError("Send 'add_tags' or 'remove_tags'.")
+
+        return attrs
+
+
+class BulkTagChangeSerializer(TagChangeSerializer):
+    """
+    Tags to add to and remove from all the given texts.
+    """
+    max_items = BulkTagUpdateSerializer.max_items
+
+    text_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_text_ids(self, text_ids):
+        if len(text_ids) > self.max_items:
+            raise serializers.ValidationError(f"At most {self.max_items} texts can be updated at once.")
+
+        return text_ids
+
+
+class BulkTextItemSerializer(serializers.Serializer):
+    content = serializers.CharField()
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    tag_names = serializers.ListField(child=serializers.CharField(max_length=255), required=False, default=list)
+
+
+class BulkTextCreateSerializer(serializers.Serializer):
+    """
+    Texts to create in a dataset, with tag ids and/or tag names,
+    and what to do with the texts already in the dataset.
+    """
+    max_items = BulkTagUpdateSerializer.max_items
+
+    texts = BulkTextItemSerializer(many=True, allow_empty=False)
+    on_duplicate = serializers.ChoiceField(choices=['skip', 'upsert'], default='skip')
+    create_tags = serializers.BooleanField(default=False)
+
+    def validate_texts(self, texts):
+        if len(texts) > self.max_items:
+            raise serializers.ValidationError(f"At most {self.max_items} texts can be created at once.")
+
+        return [(text['content'], text['tags'], list(dict.fromkeys(text['tag_names']))) for text in texts]
 
 
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
 
+    # Split the file into byte-range shards imported in parallel by the Celery workers
+    shards = serializers.IntegerField(min_value=1, max_value=64, default=1)
+
 
     def validate_file(self, value):
         # Ensure the file has a .csv extension
         if not value.name.endswith('.csv'):
             raise serializers.ValidationError("Uploaded file must be a CSV.")
         
-        return value
\ No newline at end of file
+        return value
+
+
+class ImportJobSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    eta_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'status', 'message', 'shards', 'total_bytes', 'processed_bytes',
+            'rows_processed', 'texts_created', 'texts_updated', 'rows_per_second',
+            'error_count', 'errors', 'eta_seconds', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def to_representation(self, job):
+        data = super().to_representation(job)
+
+        # Sharded imports report their throughput only at the end, compute it live
+        if job.status == 'running' and job.started_at is not None:
+            elapsed = (timezone.now() - job.started_at).total_seconds()
+            data['rows_per_second'] = job.rows_processed / elapsed if elapsed > 0 else 0.0
+
+        return data
+
+    def get_eta_seconds(self, job):
+        # Estimate the remaining time from the bytes read so far
+        if job.status != 'running' or not job.processed_bytes or job.started_at is None:
+            return None
+
+        elapsed = (timezone.now() - job.started_at).total_seconds()
+        bytes_per_second = job.processed_bytes / elapsed if elapsed > 0 else 0
+        if not bytes_per_second:
+            return None
+
+        remaining_bytes = max(job.total_bytes - job.processed_bytes, 0)
+        return round(remaining_bytes / bytes_per_second, 1)
@@ -0,0 +1,157 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .models import Dataset, ResourceVersion, Tag, TagCount, Text
+from .search import update_search_index
+from .validators import invalidate_active_tags
+
+
+@receiver(m2m_changed, sender=Text.tags.through)
+def update_tag_counts_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep TagCount in sync when tags are added to or removed from texts,
+    from the text side (text.tags) or from the tag side (tag.text_set).
+    """
+
+    if action in ('pre_remove', 'pre_clear'):
+        # Count the rows that really exist before they are deleted
+        filters = {'tag_id': instance.pk} if reverse else {'text_id': instance.pk}
+        if pk_set:
+            filters['text_id__in' if reverse else 'tag_id__in'] = pk_set
+
+        instance._tag_count_deltas = {
+            key: -count for key, count in TagCount.objects.count_text_tags(**filters).items()
+        }
+
+    elif action in ('post_remove', 'post_clear'):
+        TagCount.objects.apply_deltas(instance.__dict__.pop('_tag_count_deltas', {}))
+
+    elif action == 'post_add' and pk_set:
+        # pk_set only holds the rows that were actually inserted
+        if reverse:
+            deltas = TagCount.objects.count_text_tags(tag_id=instance.pk, text_id__in=pk_set)
+        else:
+            deltas = {(instance.dataset_id, tag_id): 1 for tag_id in pk_set}
+
+        TagCount.objects.apply_deltas(deltas)
+
+
+def is_dataset_delete(origin):
+    return isinstance(origin, Dataset) or isinstance(origin, QuerySet) and origin.model is Dataset
+
+
+@receiver(pre_delete, sender=Text)
+def update_tag_counts_on_text_delete(sender, instance, origin=None, **kwargs):
+    # The counters of a deleted dataset are deleted with it
+    if is_dataset_delete(origin):
+        return
+
+    if isinstance(origin, QuerySet) and origin.model is Text:
+        # Texts.objects.filter(...).delete(): all the texts are counted at once, before any is deleted
+        if getattr(origin, '_tag_counts_updated', False):
+            return
+
+        origin._tag_counts_updated = True
+        counts = TagCount.objects.count_text_tags(text_id__in=origin.values('pk'))
+    else:
+        counts = TagCount.objects.count_text_tags(text_id=instance.pk)
+
+    TagCount.objects.apply_deltas({key: -count for key, count in counts.items()})
+
+
+@receiver(pre_save, sender=Text)
+def move_tag_counts_on_dataset_change(sender, instance, raw, **kwargs):
+    old_dataset_id = getattr(instance, '_loaded_dataset_id', None)
+    if raw or old_dataset_id is None or old_dataset_id == instance.dataset_id:
+        return
+
+    deltas = Counter()
+    for (dataset_id, tag_id), count in TagCount.objects.count_text_tags(text_id=instance.pk).items():
+        deltas[(old_dataset_id, tag_id)] -= count
+        deltas[(instance.dataset_id, tag_id)] += count
+
+    TagCount.objects.apply_deltas(deltas)
+    instance._loaded_dataset_id = instance.dataset_id
+    instance._moved_from_dataset_id = old_dataset_id
+
+
+@receiver(post_save, sender=Text)
+def index_text_on_save(sender, instance, raw, **kwargs):
+    if not raw:
+        update_search_index(text_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Text)
+def remove_text_from_index_on_delete(sender, instance, **kwargs):
+    update_search_index(removed_text_ids=[instance.pk])
+
+
+@receiver(pre_save, sender=Tag)
+def remember_tag_dataset(sender, instance, raw, **kwargs):
+    # A tag moved to another dataset changes both of them
+    instance._moved_from_dataset_id = None
+    if raw or instance._state.adding:
+        return
+
+    old_dataset_id = Tag.objects.filter(pk=instance.pk).values_list('dataset_id', flat=True).first()
+    if old_dataset_id is not None and old_dataset_id != instance.dataset_id:
+        instance._moved_from_dataset_id = old_dataset_id
+
+
+def get_tag_dataset_ids(instance):
+    dataset_ids = {instance.dataset_id}
+    moved_from = getattr(instance, '_moved_from_dataset_id', None)
+    if moved_from is not None:
+        dataset_ids.add(moved_from)
+
+    return dataset_ids
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_active_tags_on_tag_change(sender, instance, **kwargs):
+    dataset_ids = get_tag_dataset_ids(instance)
+    transaction.on_commit(lambda: invalidate_active_tags(*dataset_ids))
+
+
+# Versions of the datasets, bumped after the change so a read never gets
+# the old data with the new version (see datasets.versions)
+
+@receiver(post_save, sender=Dataset)
+@receiver(post_delete, sender=Dataset)
+def bump_version_on_dataset_change(sender, instance, **kwargs):
+    ResourceVersion.objects.bump_datasets([instance.pk], dataset_list=True)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_version_on_tag_change(sender, instance, origin=None, **kwargs):
+    # Deleted with its dataset, which is bumped once instead of once per tag
+    if not is_dataset_delete(origin):
+        ResourceVersion.objects.bump_datasets(get_tag_dataset_ids(instance))
+
+
+@receiver(post_save, sender=Text)
+@receiver(post_delete, sender=Text)
+def bump_version_on_text_change(sender, instance, origin=None, **kwargs):
+    if is_dataset_delete(origin):
+        return
+
+    dataset_ids = {instance.dataset_id}
+    moved_from = instance.__dict__.pop('_moved_from_dataset_id', None)
+    if moved_from is not None:
+        dataset_ids.add(moved_from)
+
+    ResourceVersion.objects.bump_datasets(dataset_ids)
+
+
+@receiver(m2m_changed, sender=Text.tags.through)
+def bump_version_on_tags_change(sender, instance, action, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove') and pk_set or action == 'post_clear':
+        # A text and its tags always belong to the same dataset
+        ResourceVersion.objects.bump_datasets([instance.dataset_id])
@@ -0,0 +1,232 @@
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .activity import record_activities
+from .models import ResourceVersion, TagCount, Text
+from .validators import TagValidator
+
+
+# Rows per statement, far below the bound parameters limit of SQLite
+CHUNK_SIZE = 500
+
+
+def bulk_set_tags(items, user, access):
+    """
+    Replace the tags of many texts at once.
+
+    items is a list of (text id, [tag ids]). Texts, dataset access and tags are
+    checked for the whole batch at once (see validate_items), then the text-tag rows,
+    the tag counters and the log entries are written in bulk inside one transaction.
+
+    Returns one result per text id, in the order of the items.
+    """
+    # A text given twice gets the tags of its last item
+    tags_by_text = dict((text_id, list(dict.fromkeys(tag_ids))) for text_id, tag_ids in items)
+
+    datasets_by_text = load_text_datasets(tags_by_text)
+    errors = validate_items(tags_by_text.items(), datasets_by_text, access)
+
+    results = {}
+    valid = {}
+    for text_id, text_tag_ids in tags_by_text.items():
+        if text_id in errors:
+            results[text_id] = {'text_id': text_id, 'status': 'error', 'error': errors[text_id]}
+        else:
+            valid[text_id] = text_tag_ids
+            results[text_id] = {'text_id': text_id, 'status': 'updated'}
+
+    if valid:
+        write_tags(valid, datasets_by_text, user)
+
+    return [results[text_id] for text_id in tags_by_text]
+
+
+def bulk_change_tags(text_ids, add_tag_ids, remove_tag_ids, user, access):
+    """
+    Add and remove tags on many texts without replacing their other tags.
+
+    Only the tags being added are validated, the current tags of the texts are
+    never read: rows are inserted with INSERT ... ON CONFLICT DO NOTHING and
+    deleted with DELETE, both returning the rows they actually changed, so
+    concurrent requests can't overwrite each other and the tag counters stay exact.
+
+    Returns one result per text id with the tags really added and removed.
+    """
+    text_ids = list(dict.fromkeys(text_ids))
+    add_tag_ids = list(dict.fromkeys(add_tag_ids))
+    # A tag both added and removed is removed
+    remove_tag_ids = list(dict.fromkeys(remove_tag_ids))
+    add_tag_ids = [tag_id for tag_id in add_tag_ids if tag_id not in remove_tag_ids]
+
+    datasets_by_text = load_text_datasets(text_ids)
+    errors = validate_items(((text_id, add_tag_ids) for text_id in text_ids), datasets_by_text, access)
+
+    results = {}
+    valid = []
+    for text_id in text_ids:
+        if text_id in errors:
+            results[text_id] = {'text_id': text_id, 'status': 'error', 'error': errors[text_id]}
+        else:
+            valid.append(text_id)
+            results[text_id] = {'text_id': text_id, 'status': 'updated', 'added': [], 'removed': []}
+
+    if valid:
+        added, removed = write_tag_changes(valid, add_tag_ids, remove_tag_ids, datasets_by_text, user)
+        for text_id, tag_id in added:
+            results[text_id]['added'].append(tag_id)
+        for text_id, tag_id in removed:
+            results[text_id]['removed'].append(tag_id)
+
+    return [results[text_id] for text_id in text_ids]
+
+
+def load_text_datasets(text_ids):
+    """
+    Return {text id: dataset id} for the texts that exist.
+    """
+    return dict(Text.objects.filter(pk__in=text_ids).values_list('id', 'dataset_id'))
+
+
+def validate_items(items, datasets_by_text, access):
+    """
+    Check the (text id, [tag ids]) items and return {text id: error message} of the
+    rejected ones: unknown texts, texts of datasets the user can't access, and tags
+    which are not active tags of the dataset of the text, all tags in one pass.
+    """
+    errors = {}
+    tag_items = []
+    for text_id, tag_ids in items:
+        dataset_id = datasets_by_text.get(text_id)
+        if dataset_id is None:
+            errors[text_id] = "Text not found."
+        elif not access.can_access(dataset_id):
+            errors[text_id] = "You don't have access to the dataset of this text."
+        elif tag_ids:
+            tag_items.append((text_id, dataset_id, tag_ids))
+
+    for text_id, messages in TagValidator().validate(tag_items).items():
+        errors[text_id] = " ".join(messages)
+
+    return errors
+
+
+def write_tags(tags_by_text, datasets_by_text, user):
+    text_ids = list(tags_by_text)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Concurrent requests on the same texts wait for each other, the last one wins
+        locked = Text.objects.select_for_update().filter(pk__in=text_ids).order_by('pk')
+        list(locked.values_list('pk', flat=True))
+
+        removed = delete_text_tags(cursor, text_ids)
+        added = insert_text_tags(
+            cursor, [(text_id, tag_id) for text_id, tag_ids in tags_by_text.items() for tag_id in tag_ids]
+        )
+
+        # Raw writes don't send m2m_changed, update the tag counters from the rows really changed
+        TagCount.objects.apply_deltas(count_tag_deltas(added, removed, datasets_by_text))
+        ResourceVersion.objects.bump_datasets({datasets_by_text[text_id] for text_id in tags_by_text})
+
+        record_activities(
+            {
+                'user_id': user.pk,
+                'text_instance_id': text_id,
+                'action': "update",
+                'updated_field': "tags",
+                'action_details': f"Updated 'tags' field to {{'tags': {tag_ids}}}",
+            }
+            for text_id, tag_ids in tags_by_text.items()
+        )
+
+
+def write_tag_changes(text_ids, add_tag_ids, remove_tag_ids, datasets_by_text, user):
+    with transaction.atomic(), connection.cursor() as cursor:
+        added = []
+        if add_tag_ids:
+            added = insert_text_tags(cursor, [(text_id, tag_id) for text_id in text_ids for tag_id in add_tag_ids])
+
+        removed = []
+        if remove_tag_ids:
+            removed = delete_text_tags(cursor, text_ids, remove_tag_ids)
+
+        # Raw writes don't send m2m_changed, update the tag counters here
+        TagCount.objects.apply_deltas(count_tag_deltas(added, removed, datasets_by_text))
+        ResourceVersion.objects.bump_datasets({datasets_by_text[text_id] for text_id, tag_id in added + removed})
+
+        changes = {}
+        for text_id, tag_id in added:
+            changes.setdefault(text_id, ([], []))[0].append(tag_id)
+        for text_id, tag_id in removed:
+            changes.setdefault(text_id, ([], []))[1].append(tag_id)
+
+        record_activities(
+            {
+                'user_id': user.pk,
+                'text_instance_id': text_id,
+                'action': "update",
+                'updated_field': "tags",
+                'action_details': f"Changed 'tags' field: {{'add_tags': {added_ids}, 'remove_tags': {removed_ids}}}",
+            }
+            for text_id, (added_ids, removed_ids) in changes.items()
+        )
+
+    return added, removed
+
+
+def text_tag_table():
+    return connection.ops.quote_name(Text.tags.through._meta.db_table)
+
+
+def insert_text_tags(cursor, pairs):
+    """
+    Insert (text id, tag id) rows with INSERT ... ON CONFLICT DO NOTHING and return
+    the rows really inserted, not the ones already there (e.g. from a concurrent request).
+    """
+    table = text_tag_table()
+    inserted = []
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        chunk = pairs[start:start + CHUNK_SIZE]
+        cursor.execute(
+            f"INSERT INTO {table} (text_id, tag_id) VALUES {', '.join(['(%s, %s)'] * len(chunk))} "
+            f"ON CONFLICT (text_id, tag_id) DO NOTHING RETURNING text_id, tag_id",
+            [value for pair in chunk for value in pair],
+        )
+        inserted.extend(cursor.fetchall())
+
+    return inserted
+
+
+def delete_text_tags(cursor, text_ids, tag_ids=None):
+    """
+    Delete the given tags of texts, or all their tags without tag_ids,
+    and return the (text id, tag id) rows really deleted.
+    """
+    table = text_tag_table()
+    text_ids = list(text_ids)
+    deleted = []
+    for start in range(0, len(text_ids), CHUNK_SIZE):
+        chunk = text_ids[start:start + CHUNK_SIZE]
+        sql = f"DELETE FROM {table} WHERE text_id IN ({', '.join(['%s'] * len(chunk))})"
+        params = list(chunk)
+        if tag_ids is not None:
+            sql += f" AND tag_id IN ({', '.join(['%s'] * len(tag_ids))})"
+            params += list(tag_ids)
+
+        cursor.execute(f"{sql} RETURNING text_id, tag_id", params)
+        deleted.extend(cursor.fetchall())
+
+    return deleted
+
+
+def count_tag_deltas(added, removed, datasets_by_text):
+    """
+    Return the TagCount deltas {(dataset id, tag id): number} of added and removed (text id, tag id) rows.
+    """
+    deltas = Counter()
+    for text_id, tag_id in added:
+        deltas[(datasets_by_text[text_id], tag_id)] += 1
+    for text_id, tag_id in removed:
+        deltas[(datasets_by_text[text_id], tag_id)] -= 1
+
+    return deltas
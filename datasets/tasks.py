@@ -1,30 +1,298 @@
-import csv
-from datetime import timedelta
+from datetime import date, timedelta
 
-from celery import shared_task
+from celery import chord, group, shared_task
+from django.db.models import F
 from django.utils import timezone
 
-from .models import Log
+from .activity import replay_spool
+from .archive import archive_day, get_days_to_archive
+from .exporters import export_logs_of_day
+from .importers import (MAX_REPORTED_ERRORS, CSVImporter, compute_shard_ranges,
+                        open_csv_shard, open_csv_stream, scan_csv_vocabulary)
+from .models import ImportJob
+from .rollups import exclude_archived_days, get_days_to_rollup, rollup_day
+from .search import get_search_backend
 
 
 @shared_task
-def export_daily_logs():
+def export_daily_logs(day=None):
     """
-    Export all Log entries from the previous day to a CSV file.
+    Export the Log entries of a day (ISO date, the previous day by default)
+    to a gzip CSV file in LOG_EXPORT_DIR. Rerunning the task replaces the file.
     """
+    day = date.fromisoformat(day) if day else timezone.localdate() - timedelta(days=1)
+    path, rows = export_logs_of_day(day)
+    return {'day': day.isoformat(), 'path': str(path), 'rows': rows}
 
-    # Define the date range for the previous day
-    end_date = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    start_date = end_date - timedelta(days=1)
 
-    # Filter logs from the previous day
-    logs = Log.objects.filter(datetime__range=(start_date, end_date))
-    
-    # Define file name with the previous day's date
-    filename = f"logs_{start_date.date()}.csv"
-    with open(filename, 'a+', newline='') as csvfile:
-        log_writer = csv.writer(csvfile)
-        log_writer.writerow(['User', 'Action', 'Text Instance', 'Updated_Field', 'Action_Details', 'DateTime'])
+@shared_task
+def backfill_daily_logs(start_day, end_day):
+    """
+    Export every day of [start_day, end_day) (ISO dates), one export_daily_logs
+    task per day so the workers process them in parallel.
+    """
+    start_day, end_day = date.fromisoformat(start_day), date.fromisoformat(end_day)
+    days = [(start_day + timedelta(days=offset)).isoformat() for offset in range((end_day - start_day).days)]
+
+    group(export_daily_logs.s(day) for day in days).apply_async()
+    return days
+
+
+@shared_task
+def rollup_daily_activity(start_day=None, end_day=None):
+    """
+    Compute the daily activity rollups of [start_day, end_day) (ISO dates),
+    by default of the days missed since the last run until yesterday.
+    Archived days are skipped, their rollups are kept as they are.
+    """
+    if start_day and end_day:
+        start_day, end_day = date.fromisoformat(start_day), date.fromisoformat(end_day)
+        days = exclude_archived_days([start_day + timedelta(days=offset)
+                                      for offset in range((end_day - start_day).days)])
+    else:
+        days = get_days_to_rollup()
+
+    for day in days:
+        rollup_day(day)
+
+    return [day.isoformat() for day in days]
+
+
+@shared_task
+def archive_old_logs():
+    """
+    Move the Log entries older than LOG_RETENTION_DAYS to per-day archive files.
+    """
+    days = get_days_to_archive()
+    archived = {day.isoformat(): archive_day(day) for day in days}
+    return {day: count for day, count in archived.items() if count}
+
+
+@shared_task
+def replay_activity_log_spool():
+    """
+    Write the activity log entries spooled while the database couldn't be reached.
+    """
+    return replay_spool()
+
+
+@shared_task
+def import_csv_file(job_id):
+    """
+    Import the CSV file of an ImportJob and keep its progress up to date.
+
+    Every batch is committed on its own, so the status endpoint can follow the
+    progress; a failed job keeps the rows written before the error.
+    """
+
+    job = ImportJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    with job.file.open('rb') as file:
+
+        def report_progress(stats):
+            ImportJob.objects.filter(pk=job.pk).update(
+                processed_bytes=file.tell(),
+                rows_processed=stats.rows,
+                texts_created=stats.created,
+                texts_updated=stats.updated,
+                error_count=stats.error_count,
+                errors=stats.errors,
+                rows_per_second=stats.rows_per_second,
+            )
+
+        importer = CSVImporter(on_batch=report_progress)
+
+        try:
+            stats = importer.run(open_csv_stream(file))
+        except Exception as e:
+            job.refresh_from_db()
+            job.status = 'failed'
+            job.message = f"An error occurred while processing the file: {str(e)}"
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'message', 'finished_at'])
+            return
+
+    job.status = 'completed'
+    job.message = "File processed successfully"
+    job.processed_bytes = job.total_bytes
+    job.rows_processed = stats.rows
+    job.texts_created = stats.created
+    job.texts_updated = stats.updated
+    job.error_count = stats.error_count
+    job.errors = stats.errors
+    job.rows_per_second = stats.rows_per_second
+    job.finished_at = timezone.now()
+    job.save()
+
+    # The uploaded file is not needed anymore
+    job.file.delete(save=False)
+
+
+@shared_task
+def import_csv_file_sharded(job_id):
+    """
+    Import the CSV file of an ImportJob split in byte-range shards, in three steps:
+
+    1. every shard is scanned in parallel for its dataset and tag names,
+    2. a single task merges them and creates the missing datasets and tags,
+       so concurrent shards never create the same Tag twice,
+    3. every shard imports its texts in parallel, then the totals are reported.
+    """
+
+    job = ImportJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    with job.file.open('rb') as file:
+        fieldnames, ranges = compute_shard_ranges(file, job.shards)
+
+    missing_columns = [column for column in CSVImporter.required_columns if column not in fieldnames]
+    if missing_columns or not ranges:
+        job.status = 'failed'
+        job.message = (f"Missing required columns: {', '.join(missing_columns)}."
+                       if missing_columns else "The file has no rows to import.")
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'message', 'finished_at'])
+        return
+
+    callback = create_csv_import_vocabulary.s(job_id, ranges, fieldnames)
+    chord(
+        scan_csv_shard.s(job_id, start, end, fieldnames) for start, end in ranges
+    )(callback.on_error(mark_import_job_failed.s(job_id)))
+
+
+@shared_task
+def scan_csv_shard(job_id, start, end, fieldnames):
+    """
+    Return {dataset name: [tag names]} found in one shard of an import file.
+    """
+
+    job = ImportJob.objects.get(pk=job_id)
+    with job.file.open('rb') as file:
+        vocabulary = scan_csv_vocabulary(open_csv_shard(file, start, end), fieldnames)
+
+    return {dataset_name: sorted(tag_names) for dataset_name, tag_names in vocabulary.items()}
+
+
+@shared_task
+def create_csv_import_vocabulary(vocabularies, job_id, ranges, fieldnames):
+    """
+    Merge the names found by the shards, create the missing datasets and tags,
+    then start the import of every shard.
+    """
+
+    merged = {}
+    for vocabulary in vocabularies:
+        for dataset_name, tag_names in vocabulary.items():
+            merged.setdefault(dataset_name, set()).update(tag_names)
+
+    CSVImporter().create_vocabulary(merged)
+
+    callback = finish_csv_import_sharded.s(job_id)
+    chord(
+        import_csv_shard.s(job_id, index, start, end, fieldnames)
+        for index, (start, end) in enumerate(ranges)
+    )(callback.on_error(mark_import_job_failed.s(job_id)))
+
+
+@shared_task
+def import_csv_shard(job_id, index, start, end, fieldnames):
+    """
+    Import the rows of one shard of an import file and return its stats.
+    """
+
+    job = ImportJob.objects.get(pk=job_id)
+    reported = {'bytes': start, 'rows': 0, 'created': 0, 'updated': 0, 'errors': 0}
+
+    with job.file.open('rb') as file:
+
+        def report_progress(stats):
+            # Shards run concurrently, so the job counters are incremented in the database
+            position = file.tell()
+            ImportJob.objects.filter(pk=job.pk).update(
+                processed_bytes=F('processed_bytes') + (position - reported['bytes']),
+                rows_processed=F('rows_processed') + (stats.rows - reported['rows']),
+                texts_created=F('texts_created') + (stats.created - reported['created']),
+                texts_updated=F('texts_updated') + (stats.updated - reported['updated']),
+                error_count=F('error_count') + (stats.error_count - reported['errors']),
+            )
+            reported.update(bytes=position, rows=stats.rows, created=stats.created,
+                            updated=stats.updated, errors=stats.error_count)
+
+        importer = CSVImporter(on_batch=report_progress)
+        stats = importer.run(open_csv_shard(file, start, end), fieldnames=fieldnames)
+
+    result = stats.as_dict()
+    for error in result['errors']:
+        error['shard'] = index
+
+    return result
+
+
+@shared_task
+def finish_csv_import_sharded(results, job_id):
+    """
+    Report the totals of all the shards of an import job.
+    """
+
+    job = ImportJob.objects.get(pk=job_id)
+    job.status = 'completed'
+    job.message = "File processed successfully"
+    job.processed_bytes = job.total_bytes
+    job.rows_processed = sum(result['rows'] for result in results)
+    job.texts_created = sum(result['created'] for result in results)
+    job.texts_updated = sum(result['updated'] for result in results)
+    job.error_count = sum(result['error_count'] for result in results)
+    job.errors = [error for result in results for error in result['errors']][:MAX_REPORTED_ERRORS]
+    job.finished_at = timezone.now()
+
+    elapsed = (job.finished_at - job.started_at).total_seconds()
+    job.rows_per_second = job.rows_processed / elapsed if elapsed > 0 else 0.0
+    job.save()
+
+    # The uploaded file is not needed anymore
+    job.file.delete(save=False)
+
+
+@shared_task
+def mark_import_job_failed(request, exc, traceback, job_id):
+    """
+    Error callback of the sharded import steps.
+    """
+
+    ImportJob.objects.filter(pk=job_id).update(
+        status='failed',
+        message=f"An error occurred while processing the file: {str(exc)}",
+        finished_at=timezone.now(),
+    )
+
+
+@shared_task
+def index_texts(text_ids):
+    """
+    Add or update texts in the search index.
+    """
+
+    get_search_backend().index_texts(text_ids)
+
+
+@shared_task
+def remove_texts_from_index(text_ids):
+    """
+    Remove deleted texts from the search index.
+    """
+
+    get_search_backend().remove_texts(text_ids)
+
+
+@shared_task
+def rebuild_search_index():
+    """
+    Rebuild the whole search index from the Text table.
+    """
 
-        for log in logs:
-            log_writer.writerow([log.user, log.action, log.text_instance, log.updated_field, log.action_details, log.datetime])
+    get_search_backend().rebuild()
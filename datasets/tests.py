@@ -1,3 +1,1712 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from account.models import Profile
+
+from .activity import (ActivityLogBuffer, activity_log, get_spool_dir, record_activity, replay_spool,
+                       write_entries)
+from .archive import archive_day, get_archive_path, get_days_to_archive, read_archive_file
+from .benchmarks import BenchmarkFixtures
+from .caching import get_response_cache, get_response_cache_stats
+from .exceptions import CSVImportError
+from .exporters import (LOG_EXPORT_COLUMNS, export_logs_of_day, get_day_range, get_log_export_path,
+                        iter_dataset_texts)
+from .importers import (CSVImporter, compute_shard_ranges, insert_texts, open_csv_shard, open_csv_stream,
+                        scan_csv_vocabulary, write_texts)
+from .models import (ActivityRollupDay, DailyActivityRollup, Dataset, ImportJob, Log,
+                     ResourceVersion, Tag, TagCount, Text)
+from .pagination import TextCursorPagination
+from .rollups import get_days_to_rollup, rollup_day
+from .search import ElasticsearchSearchBackend, get_search_backend
+from .tasks import archive_old_logs, export_daily_logs, import_csv_file, rollup_daily_activity
+from .validators import invalidate_active_tags
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class DatasetTestCase(TestCase):
+    """
+    Base class of the API tests: an admin client, a dataset with three tags, and
+    factories for operators, tags and texts. The response cache is disabled, the
+    views themselves are tested.
+    """
+
+    def setUp(self):
+        # The access of users is cached by user id, ids are reused between tests
+        cache.clear()
+
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        self.dataset = Dataset.objects.create(name='dataset')
+        self.tags = [Tag.objects.create(name=f'tag{index}', dataset=self.dataset) for index in range(3)]
+
+    def create_operator(self, datasets):
+        operator = User.objects.create_user('operator', password='operator')
+        profile, created = Profile.objects.get_or_create(user=operator)
+        profile.available_datasets.set(datasets)
+        return operator
+
+    def create_tags(self, count):
+        start = Tag.objects.count()
+        tags = Tag.objects.bulk_create([Tag(name=f'extra{start + index}', dataset=self.dataset) for index in range(count)])
+        # bulk_create doesn't send post_save
+        invalidate_active_tags(self.dataset.id)
+        return tags
+
+    def create_datasets(self, count):
+        start = Dataset.objects.count()
+        return Dataset.objects.bulk_create([Dataset(name=f'd{start + index}') for index in range(count)])
+
+    def create_texts(self, count, tagged=True):
+        start = Text.objects.count()
+        texts = [Text.objects.create(dataset=self.dataset, content=f'text {start + index}') for index in range(count)]
+        if tagged:
+            for text in texts:
+                text.tags.set(self.tags)
+        return texts
+
+
+class QueryBudgetTestCase(DatasetTestCase):
+    """
+    Base class of the query budget tests: the number of queries of an endpoint
+    must not grow with the number of objects it reads or writes.
+    """
+
+    def count_queries(self, request):
+        # A first request fills the caches (user access), only the second one is counted
+        request()
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+        return len(queries)
+
+    def assertQueryBudget(self, request, populate, sizes=(1, 20)):
+        """
+        Call populate(count) to add objects, then request(), for every size,
+        and fail if the number of queries is not the same for all of them.
+        """
+        counts = []
+        created = 0
+        for size in sizes:
+            populate(size - created)
+            created = size
+            counts.append(self.count_queries(request))
+
+        self.assertEqual(
+            len(set(counts)), 1,
+            f"The number of queries grows with the number of objects: "
+            f"{dict(zip(sizes, counts))}"
+        )
+
+
+class DatasetQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_list_datasets(self):
+        self.assertQueryBudget(
+            lambda: self.client.get('/api/GetListOfDatasets/'),
+            self.create_datasets,
+        )
+
+    def test_list_tags(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(f'/api/GetListOfTagsOfDatasetByDatasetID/{self.dataset.id}/'),
+            self.create_tags,
+        )
+
+
+class TextQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_list_texts(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/'),
+            self.create_texts,
+        )
+
+    def test_list_texts_as_operator(self):
+        self.client.force_authenticate(self.create_operator([self.dataset]))
+        self.assertQueryBudget(
+            lambda: self.client.get(f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/'),
+            self.create_texts,
+        )
+
+    def test_search_texts(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(f'/api/FullTextSearchWithinTextsInDatasetByDatasetID/{self.dataset.id}/text/'),
+            self.create_texts,
+        )
+
+    def test_export_texts(self):
+        for export_format in ('ndjson', 'csv'):
+            with self.subTest(export_format=export_format):
+                self.assertQueryBudget(
+                    lambda: self.client.get(f'/api/ExportTextsOfDatasetByDatasetID/{self.dataset.id}/',
+                                            {'export_format': export_format}),
+                    self.create_texts,
+                )
+
+    def test_count_texts_by_tag(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(f'/api/CountNumberOfTextLabeldByTagUsingDatasetID/{self.dataset.id}/',
+                                    {'include': 'untagged,operators'}),
+            self.create_texts,
+        )
+
+    def test_create_text_with_tags(self):
+        self.assertQueryBudget(
+            lambda: self.client.post(f'/api/CreateTextForDatasetByDatasetID/{self.dataset.id}/',
+                                     {'content': f'new {Text.objects.count()}',
+                                      'tags': [tag.id for tag in Tag.objects.filter(dataset=self.dataset)]},
+                                     format='json'),
+            self.create_tags,
+        )
+
+    def test_bulk_create_texts(self):
+        texts = []
+
+        def add_texts(count):
+            texts.extend([self.tags[0].id] for index in range(count))
+
+        def request():
+            # New contents on every request, all the texts are created
+            start = Text.objects.count()
+            return self.client.post(f'/api/BulkCreateTextsForDatasetByDatasetID/{self.dataset.id}/',
+                                    {'texts': [{'content': f'bulk {start + index}', 'tags': tags,
+                                                'tag_names': [self.tags[1].name]}
+                                               for index, tags in enumerate(texts)]},
+                                    format='json')
+
+        self.assertQueryBudget(request, add_texts)
+
+    def test_update_text_tags(self):
+        text = self.create_texts(1, tagged=False)[0]
+        self.assertQueryBudget(
+            lambda: self.client.patch(f'/api/UpdateTextByID/{text.id}/',
+                                      {'tags': [tag.id for tag in Tag.objects.filter(dataset=self.dataset)]},
+                                      format='json'),
+            self.create_tags,
+        )
+
+    def test_bulk_update_texts_tags(self):
+        self.assertQueryBudget(
+            lambda: self.client.post('/api/BulkUpdateTextsTags/',
+                                     {'text_ids': list(Text.objects.values_list('id', flat=True)),
+                                      'tags': [self.tags[0].id]},
+                                     format='json'),
+            self.create_texts,
+        )
+
+    def test_bulk_change_texts_tags(self):
+        self.assertQueryBudget(
+            lambda: self.client.post('/api/BulkChangeTextsTags/',
+                                     {'text_ids': list(Text.objects.values_list('id', flat=True)),
+                                      'add_tags': [self.tags[0].id], 'remove_tags': [self.tags[1].id]},
+                                     format='json'),
+            self.create_texts,
+        )
+
+
+class ActivityQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_daily_activity_report(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+
+        def populate(count):
+            start = DailyActivityRollup.objects.count()
+            DailyActivityRollup.objects.bulk_create([
+                DailyActivityRollup(day=yesterday - timedelta(days=start + index), user=self.admin,
+                                    dataset=self.dataset, action='update', count=1)
+                for index in range(count)
+            ])
+
+        self.assertQueryBudget(lambda: self.client.get('/api/GetDailyActivityReport/'), populate)
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+        Profile.objects.get_or_create(user=self.admin)
+
+    def test_log_changelist(self):
+        def populate(count):
+            Log.objects.bulk_create([Log(user=self.admin, text_instance=text) for text in self.create_texts(count)])
+
+        self.assertQueryBudget(lambda: self.client.get('/admin/datasets/log/'), populate)
+
+    def test_tag_count_changelist(self):
+        def populate(count):
+            self.create_texts(count)
+            TagCount.objects.bulk_create(
+                [TagCount(dataset=self.dataset, tag=tag) for tag in
+                 Tag.objects.bulk_create([Tag(name=f'counted{Tag.objects.count()}-{index}', dataset=self.dataset)
+                                          for index in range(count)])]
+            )
+
+        self.assertQueryBudget(lambda: self.client.get('/admin/datasets/tagcount/'), populate)
+
+
+class ConditionalGetTests(DatasetTestCase):
+
+    def get(self, path, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def assertNotModified(self, path):
+        etag = self.get(path)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(path, etag)
+
+        self.assertEqual(response.status_code, 304)
+        # Only the version is read, not the tags, texts or datasets
+        tables = {'datasets_dataset', 'datasets_tag', 'datasets_text'}
+        self.assertFalse([query['sql'] for query in queries if any(f'"{table}"' in query['sql'] for table in tables)])
+        return etag
+
+    def assertModified(self, path, etag):
+        response = self.get(path, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_tags(self):
+        path = f'/api/GetListOfTagsOfDatasetByDatasetID/{self.dataset.id}/'
+        etag = self.assertNotModified(path)
+
+        Tag.objects.create(name='new', dataset=self.dataset)
+        self.assertModified(path, etag)
+
+    def test_list_texts_as_operator(self):
+        self.client.force_authenticate(self.create_operator([self.dataset]))
+        path = f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/'
+        self.create_texts(2)
+        etag = self.assertNotModified(path)
+
+        text = Text.objects.first()
+        self.client.post('/api/BulkChangeTextsTags/', {'text_ids': [text.id], 'remove_tags': [self.tags[0].id]},
+                         format='json')
+        self.assertModified(path, etag)
+
+    def test_list_datasets(self):
+        path = '/api/GetListOfDatasets/'
+        etag = self.assertNotModified(path)
+
+        # Changes inside a dataset don't change the list
+        self.create_texts(1)
+        self.assertEqual(self.get(path, etag).status_code, 304)
+
+        Dataset.objects.create(name='other')
+        self.assertModified(path, etag)
+
+    def test_text_details(self):
+        text = self.create_texts(1, tagged=False)[0]
+        path = f'/api/GetDetailOfTextByID/{text.id}/'
+        etag = self.get(path)['ETag']
+        self.assertEqual(self.get(path, etag).status_code, 304)
+
+        text.tags.add(self.tags[0])
+        self.assertModified(path, etag)
+
+    def test_tag_moved_to_another_dataset(self):
+        other = Dataset.objects.create(name='other')
+        paths = [f'/api/GetListOfTagsOfDatasetByDatasetID/{dataset.id}/' for dataset in (self.dataset, other)]
+        etags = [self.get(path)['ETag'] for path in paths]
+
+        tag = Tag.objects.get(pk=self.tags[0].pk)
+        tag.dataset = other
+        tag.save()
+
+        for path, etag in zip(paths, etags):
+            self.assertModified(path, etag)
+
+    def test_no_etag_on_errors(self):
+        response = self.get('/api/GetListOfTagsOfDatasetByDatasetID/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_deleted_dataset(self):
+        other = Dataset.objects.create(name='other')
+        path = f'/api/GetListOfTagsOfDatasetByDatasetID/{other.id}/'
+        key = ResourceVersion.dataset_key(other.id)
+        Tag.objects.create(name='tag', dataset=other)
+        version = ResourceVersion.objects.get_version(key)[0]
+
+        other.delete()
+        self.assertEqual(self.get(path).status_code, 404)
+        # Versions are kept and only grow, a new dataset reusing the id can't match an old ETag
+        self.assertGreater(ResourceVersion.objects.get_version(key)[0], version)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_response_cache().clear()
+        self.path = f'/api/GetListOfTagsOfDatasetByDatasetID/{self.dataset.id}/'
+
+    def test_hit_after_miss(self):
+        response = self.client.get(self.path)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(self.path)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        # Only the version of the dataset is read
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(get_response_cache_stats(['list_of_tags'])['list_of_tags'], {'hits': 1, 'misses': 1})
+
+    def test_invalidated_by_changes(self):
+        self.client.get(self.path)
+        Tag.objects.create(name='new', dataset=self.dataset)
+
+        response = self.client.get(self.path)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('new', [tag['name'] for tag in response.json()])
+
+    def test_permissions_checked_before_the_cache(self):
+        self.client.get(self.path)
+
+        other = Dataset.objects.create(name='other')
+        self.client.force_authenticate(self.create_operator([other]))
+        self.assertEqual(self.client.get(self.path).status_code, 403)
+
+    def test_browsable_api_not_shared(self):
+        path = f'/api/GetDetailOfDatasetByID/{self.dataset.id}/'
+        other_admin = User.objects.create_superuser('other_admin', 'other@example.com', 'admin')
+
+        for user in (self.admin, other_admin):
+            self.client.force_authenticate(user)
+            response = self.client.get(path, HTTP_ACCEPT='text/html')
+            self.assertFalse(response.has_header('X-Cache'))
+            self.assertIn(user.username, response.content.decode('utf-8'))
+
+        self.assertEqual(self.client.get(path)['X-Cache'], 'MISS')
+
+    def test_log_breakdown_not_cached(self):
+        path = f'/api/CountNumberOfTextLabeldByTagUsingDatasetID/{self.dataset.id}/'
+        self.assertEqual(self.client.get(path, {'include': 'untagged'})['X-Cache'], 'MISS')
+        self.assertFalse(self.client.get(path, {'include': 'operators'}).has_header('X-Cache'))
+
+
+class TagValidationTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_tag = Tag.objects.create(name='other', dataset=Dataset.objects.create(name='other'))
+        self.inactive_tag = Tag.objects.create(name='inactive', dataset=self.dataset, is_active=False)
+        self.path = f'/api/CreateTextForDatasetByDatasetID/{self.dataset.id}/'
+
+    def test_all_invalid_tags_rejected_at_once(self):
+        response = self.client.post(self.path, {'content': 'text', 'tags': [
+            self.tags[0].id, 999999, self.inactive_tag.id, self.other_tag.id,
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['tags'], [
+            "Tag 999999 not found.",
+            "The inactive tag is not active.",
+            "The other tag doesn't belong to the dataset of this text.",
+        ])
+        self.assertFalse(Text.objects.exists())
+
+    def test_active_tags_read_from_the_cache(self):
+        self.client.post(self.path, {'content': 'first', 'tags': [self.tags[0].id]}, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.path, {'content': 'second', 'tags': [tag.id for tag in self.tags]},
+                                        format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse([query['sql'] for query in queries if 'FROM "datasets_tag" WHERE' in query['sql']])
+
+    def test_deactivated_tag_rejected(self):
+        self.client.post(self.path, {'content': 'first', 'tags': [self.tags[0].id]}, format='json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(pk=self.tags[0].pk).update(is_active=False)
+            self.tags[0].refresh_from_db()
+            self.tags[0].save()
+
+        response = self.client.post(self.path, {'content': 'second', 'tags': [self.tags[0].id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_kept_inactive_tag_on_update(self):
+        text = self.create_texts(1, tagged=False)[0]
+        text.tags.add(self.inactive_tag)
+
+        response = self.client.patch(f'/api/UpdateTextByID/{text.id}/',
+                                     {'tags': [self.inactive_tag.id, self.tags[0].id]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(sorted(response.data['tags']), sorted([self.inactive_tag.id, self.tags[0].id]))
+
+    def test_bulk_rejects_other_dataset_tags(self):
+        text = self.create_texts(1, tagged=False)[0]
+        response = self.client.post('/api/BulkUpdateTextsTags/',
+                                    {'text_ids': [text.id], 'tags': [self.other_tag.id]}, format='json')
+
+        self.assertEqual(response.data['results'][0]['error'],
+                         "The other tag doesn't belong to the dataset of this text.")
+
+
+class BulkTextCreateTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = f'/api/BulkCreateTextsForDatasetByDatasetID/{self.dataset.id}/'
+
+    def post(self, data):
+        response = self.client.post(self.path, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_ids_in_order_with_tag_names(self):
+        data = self.post({'texts': [
+            {'content': 'first', 'tags': [self.tags[0].id]},
+            {'content': 'second', 'tag_names': [self.tags[1].name, self.tags[2].name]},
+        ]})
+
+        self.assertEqual(data['created'], 2)
+        first, second = (Text.objects.get(pk=result['id']) for result in data['results'])
+        self.assertEqual(first.content, 'first')
+        self.assertEqual(set(first.tags.all()), {self.tags[0]})
+        self.assertEqual(set(second.tags.all()), {self.tags[1], self.tags[2]})
+        self.assertEqual(TagCount.objects.get(dataset=self.dataset, tag=self.tags[1]).count, 1)
+
+    def test_skip_or_upsert_duplicates(self):
+        text = self.create_texts(1)[0]
+        texts = [{'content': text.content, 'tags': [self.tags[0].id]}, {'content': 'new'}]
+
+        data = self.post({'texts': texts})
+        self.assertEqual([result['status'] for result in data['results']], ['skipped', 'created'])
+        self.assertEqual(data['results'][0]['id'], text.id)
+        self.assertEqual(set(text.tags.all()), set(self.tags))
+
+        data = self.post({'texts': texts, 'on_duplicate': 'upsert'})
+        self.assertEqual([result['status'] for result in data['results']], ['updated', 'updated'])
+        self.assertEqual(set(text.tags.all()), {self.tags[0]})
+        self.assertEqual(Text.objects.count(), 2)
+
+    def test_invalid_items_rejected(self):
+        inactive_tag = Tag.objects.create(name='inactive', dataset=self.dataset, is_active=False)
+        data = self.post({'texts': [
+            {'content': 'inactive', 'tags': [inactive_tag.id]},
+            {'content': 'unknown', 'tag_names': ['unknown']},
+            {'content': 'valid'},
+        ]})
+
+        self.assertEqual([result['status'] for result in data['results']], ['error', 'error', 'created'])
+        self.assertEqual(data['results'][1]['error'], ["Tag unknown not found."])
+        self.assertEqual(list(Text.objects.values_list('content', flat=True)), ['valid'])
+
+    def test_tag_names_with_whitespace_rejected(self):
+        data = self.post({'texts': [{'content': 'text', 'tag_names': ['a b']}], 'create_tags': True})
+
+        self.assertEqual(data['results'][0]['status'], 'error')
+        self.assertEqual(data['results'][0]['error'], ["The tag name 'a b' can't contain whitespace."])
+        self.assertFalse(Tag.objects.filter(name__in=['a b', 'a', 'b']).exists())
+
+    def test_same_content_twice_rejected(self):
+        data = self.post({'texts': [
+            {'content': 'same', 'tags': [self.tags[0].id]},
+            {'content': 'same', 'tag_names': ['new']},
+        ], 'create_tags': True})
+
+        self.assertEqual((data['created'], data['errors']), (1, 1))
+        self.assertEqual(data['results'][1], {'index': 1, 'status': 'error', 'error': ["Same content as the item 0."]})
+        text = Text.objects.get()
+        self.assertEqual((data['results'][0]['id'], list(text.tags.all())), (text.id, [self.tags[0]]))
+        self.assertFalse(Tag.objects.filter(name='new').exists())
+
+    def test_create_unknown_tags(self):
+        data = self.post({'texts': [{'content': 'text', 'tag_names': ['new']}], 'create_tags': True})
+
+        tag = Tag.objects.get(dataset=self.dataset, name='new')
+        self.assertEqual(list(Text.objects.get(pk=data['results'][0]['id']).tags.all()), [tag])
+
+
+class TagCountTests(DatasetTestCase):
+
+    def counts(self, dataset=None):
+        return dict(TagCount.objects.filter(dataset=dataset or self.dataset).values_list('tag_id', 'count'))
+
+    def assertCountsInSync(self):
+        call_command('rebuild_tag_counts', '--verify', stdout=StringIO())
+
+    def test_tags_added_and_removed(self):
+        text, other = self.create_texts(2, tagged=False)
+        text.tags.add(*self.tags)
+        other.tags.add(self.tags[0])
+        self.tags[1].text_set.add(other)
+        self.assertEqual(self.counts(), {self.tags[0].id: 2, self.tags[1].id: 2, self.tags[2].id: 1})
+
+        text.tags.remove(self.tags[0])
+        self.tags[1].text_set.clear()
+        other.tags.clear()
+        self.assertEqual(self.counts(), {self.tags[0].id: 0, self.tags[1].id: 0, self.tags[2].id: 1})
+        self.assertCountsInSync()
+
+    def test_text_moved_to_another_dataset(self):
+        other = Dataset.objects.create(name='other')
+        text = Text.objects.get(pk=self.create_texts(1)[0].pk)
+        text.dataset = other
+        text.save()
+
+        self.assertEqual(set(self.counts().values()), {0})
+        self.assertEqual(set(self.counts(other).values()), {1})
+        self.assertCountsInSync()
+
+    def test_texts_deleted(self):
+        texts = self.create_texts(3)
+        texts[0].delete()
+        Text.objects.filter(pk__in=[text.pk for text in texts[1:]]).delete()
+
+        self.assertEqual(set(self.counts().values()), {0})
+        self.assertCountsInSync()
+
+    def test_dataset_delete_queries_dont_grow_with_texts(self):
+        counts = []
+        for size in (1, 20):
+            dataset = Dataset.objects.create(name=f'deleted {size}')
+            tags = Tag.objects.bulk_create([Tag(name=f'tag{index}', dataset=dataset) for index in range(3)])
+            for index in range(size):
+                Text.objects.create(dataset=dataset, content=f'{size} {index}').tags.set(tags)
+
+            with CaptureQueriesContext(connection) as queries:
+                dataset.delete()
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertCountsInSync()
+
+    def test_verify_and_rebuild(self):
+        self.create_texts(2)
+        TagCount.objects.filter(tag=self.tags[0]).update(count=5)
+
+        with self.assertRaisesMessage(CommandError, "1 tag counters are out of sync."):
+            self.assertCountsInSync()
+
+        call_command('rebuild_tag_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), {tag.id: 2 for tag in self.tags})
+        self.assertCountsInSync()
+
+    def test_bulk_tagging_counts_only_changed_rows(self):
+        texts = self.create_texts(2, tagged=False)
+        texts[0].tags.add(self.tags[0])
+
+        self.client.post('/api/BulkUpdateTextsTags/', {'items': [
+            {'text_id': texts[0].id, 'tags': [self.tags[0].id, self.tags[1].id]},
+            {'text_id': texts[1].id, 'tags': [self.tags[1].id]},
+        ]}, format='json')
+        self.client.post('/api/BulkChangeTextsTags/', {'text_ids': [text.id for text in texts],
+                                                       'add_tags': [self.tags[1].id, self.tags[2].id],
+                                                       'remove_tags': [self.tags[0].id]}, format='json')
+
+        self.assertEqual(self.counts(), {self.tags[0].id: 0, self.tags[1].id: 2, self.tags[2].id: 2})
+        self.assertCountsInSync()
+
+
+class UniqueNameTests(DatasetTestCase):
+
+    def test_duplicate_tag_name_rejected(self):
+        response = self.client.post(f'/api/CreateTagForDatasetByDatasetID/{self.dataset.id}/',
+                                    {'name': self.tags[0].name}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+
+        response = self.client.patch(f'/api/UpdateTagByID/{self.tags[1].id}/', {'name': self.tags[0].name},
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+
+        # The same name in another dataset is fine
+        other = Dataset.objects.create(name='other')
+        response = self.client.post(f'/api/CreateTagForDatasetByDatasetID/{other.id}/',
+                                    {'name': self.tags[0].name}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_duplicate_dataset_name_rejected(self):
+        response = self.client.post('/api/CreateDataset/', {'name': self.dataset.name}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_reuses_datasets_and_tags(self):
+        importer = CSVImporter()
+        self.assertEqual(importer.get_dataset_id(self.dataset.name), self.dataset.id)
+        self.assertEqual(importer.get_tag_id(self.dataset.id, self.tags[0].name), self.tags[0].id)
+        # Two imports creating the same tag get the same row
+        self.assertEqual(CSVImporter().get_tag_id(self.dataset.id, 'new'),
+                         CSVImporter().get_tag_id(self.dataset.id, 'new'))
+        self.assertEqual(Tag.objects.filter(dataset=self.dataset, name='new').count(), 1)
+
+    def test_only_inserted_texts_are_counted(self):
+        text = self.create_texts(1)[0]
+        key = (self.dataset.id, text.content_hash)
+        new_key = (self.dataset.id, Text.hash_content('new'))
+
+        with connection.cursor() as cursor:
+            inserted = insert_texts(cursor, [(key, text.content), (new_key, 'new')])
+
+        # The existing text is skipped by the unique index, e.g. inserted by a concurrent import
+        self.assertEqual(list(inserted), [new_key])
+        self.assertEqual(Text.objects.get(pk=inserted[new_key]).content, 'new')
+
+    def test_write_texts_counts_only_changed_tags(self):
+        text = self.create_texts(1)[0]
+        batch = {
+            (self.dataset.id, text.content_hash): (text.content, [self.tags[0].id]),
+            (self.dataset.id, Text.hash_content('new')): ('new', [self.tags[0].id, self.tags[1].id]),
+        }
+
+        text_ids, created, existing = write_texts(batch, on_duplicate='skip')
+        self.assertEqual(created, [(self.dataset.id, Text.hash_content('new'))])
+        self.assertEqual(dict(TagCount.objects.values_list('tag_id', 'count')),
+                         {self.tags[0].id: 2, self.tags[1].id: 2, self.tags[2].id: 1})
+
+        write_texts(batch, on_duplicate='upsert')
+        self.assertEqual(dict(TagCount.objects.values_list('tag_id', 'count')),
+                         {self.tags[0].id: 2, self.tags[1].id: 1, self.tags[2].id: 0})
+        call_command('rebuild_tag_counts', '--verify', stdout=StringIO())
+
+
+class BenchmarkFixturesTests(DatasetTestCase):
+
+    def test_dataset_with_texts_and_active_tags(self):
+        untagged = Dataset.objects.create(name='untagged')
+        Text.objects.create(dataset=untagged, content='first text')
+        Tag.objects.filter(dataset=self.dataset).update(is_active=False)
+
+        with self.assertRaisesMessage(ValueError, "There is no dataset with texts and active tags"):
+            BenchmarkFixtures('text', 10)
+
+        Tag.objects.filter(pk=self.tags[0].pk).update(is_active=True)
+        self.create_texts(1)
+        fixtures = BenchmarkFixtures('text', 10)
+        self.assertEqual(fixtures.dataset, self.dataset)
+        self.assertEqual(fixtures.tag_ids, [self.tags[0].id])
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SERVER_TIMING=True,
+                   REQUEST_PROFILING_SAMPLE_RATE=0)
+class RequestProfilingTests(DatasetTestCase):
+
+    def test_server_timing_phases(self):
+        # The middleware is loaded by the handler of the client, create it with the settings overridden
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(f'/api/GetListOfTagsOfDatasetByDatasetID/{self.dataset.id}/')
+
+        phases = [timing.split(';')[0] for timing in response['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['db', 'serializers', 'renderer', 'app', 'total'])
+        self.assertIn('desc="list_of_tags"', response['Server-Timing'])
+
+    def test_serializers_timed_apart(self):
+        to_representation = serializers.Serializer.to_representation
+
+        def slow_to_representation(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with mock.patch.object(serializers.Serializer, 'to_representation', slow_to_representation):
+            response = client.get(f'/api/GetListOfTagsOfDatasetByDatasetID/{self.dataset.id}/')
+
+        # One measure per tag of the list, the slow app time is not counted twice
+        timings = {timing.split(';')[0]: float(timing.split('dur=')[1].split(';')[0])
+                   for timing in response['Server-Timing'].split(', ')}
+        self.assertGreaterEqual(timings['serializers'], 50 * len(self.tags))
+        self.assertLess(timings['app'], 50)
+        self.assertLessEqual(timings['serializers'], timings['total'])
+
+
+class LogArchiveTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(LOG_ARCHIVE_DIR=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.day = timezone.localdate() - timedelta(days=100)
+        text = self.create_texts(1)[0]
+        start, end = get_day_range(self.day)
+        self.logs = Log.objects.bulk_create([
+            Log(user=self.admin, text_instance=text, action=action, datetime=start + timedelta(hours=index))
+            for index, action in enumerate(['update', 'update', 'create'])
+        ])
+
+    def test_archive_day(self):
+        self.assertEqual(archive_day(self.day, batch_size=2), 3)
+
+        self.assertFalse(Log.objects.exists())
+        self.assertEqual([entry['id'] for entry in read_archive_file(get_archive_path(self.day))],
+                         [log.id for log in self.logs])
+        self.assertIsNotNone(ActivityRollupDay.objects.get(day=self.day).archived_at)
+        self.assertEqual(DailyActivityRollup.objects.get(day=self.day, action='update').count, 2)
+
+        # Rerunning keeps the archived entries
+        self.assertEqual(archive_day(self.day), 0)
+        self.assertEqual(len(list(read_archive_file(get_archive_path(self.day)))), 3)
+
+    @override_settings(LOG_RETENTION_DAYS=90)
+    def test_only_old_days_archived(self):
+        recent = Log.objects.create(user=self.admin, text_instance=self.logs[0].text_instance)
+        self.assertEqual(get_days_to_archive()[0], self.day)
+        self.assertEqual(get_days_to_archive()[-1], timezone.localdate() - timedelta(days=91))
+
+        self.assertEqual(archive_old_logs(), {self.day.isoformat(): 3})
+        self.assertEqual(list(Log.objects.all()), [recent])
+        self.assertEqual(archive_old_logs(), {})
+
+    def test_archived_days_keep_their_rollups(self):
+        archive_day(self.day)
+
+        with self.assertRaises(ValueError):
+            rollup_day(self.day)
+
+        next_day = self.day + timedelta(days=1)
+        self.assertEqual(rollup_daily_activity(self.day.isoformat(), (next_day + timedelta(days=1)).isoformat()),
+                         [next_day.isoformat()])
+        self.assertNotIn(self.day, get_days_to_rollup(self.day + timedelta(days=2)))
+        self.assertEqual(DailyActivityRollup.objects.filter(day=self.day).count(), 2)
+
+    def test_get_archived_logs(self):
+        archive_day(self.day)
+
+        response = self.client.get('/api/GetArchivedLogs/', {
+            'start': self.day.isoformat(), 'end': (self.day + timedelta(days=30)).isoformat(), 'action': 'update',
+        })
+        self.assertEqual(response.status_code, 200)
+        entries = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([entry['id'] for entry in entries], [log.id for log in self.logs[:2]])
+
+    def test_get_archived_logs_range(self):
+        for start, end in [(self.day, self.day + timedelta(days=31)), (self.day, self.day - timedelta(days=1))]:
+            response = self.client.get('/api/GetArchivedLogs/', {'start': start.isoformat(), 'end': end.isoformat()})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.data)
+
+
+class CSVImportTests(DatasetTestCase):
+
+    def run_import(self, rows, **kwargs):
+        data = 'dataset_name,tags_name,text_content\n' + ''.join(f'{row}\n' for row in rows)
+        return CSVImporter(**kwargs).run(open_csv_stream(BytesIO(data.encode('utf-8'))))
+
+    def test_rows_written_in_batches(self):
+        batches = []
+        stats = self.run_import(
+            [f'dataset,tag0 tag1,text {index}' for index in range(4)] + ['new,new0,other'],
+            batch_size=2, on_batch=lambda stats: batches.append(stats.created),
+        )
+
+        self.assertEqual((stats.rows, stats.created, stats.updated, stats.error_count), (5, 5, 0, 0))
+        self.assertEqual(batches, [2, 4, 5])
+        self.assertEqual(Text.objects.filter(dataset=self.dataset).count(), 4)
+        self.assertEqual(set(Text.objects.get(content='text 0').tags.all()), set(self.tags[:2]))
+        self.assertEqual(list(Text.objects.get(content='other').tags.values_list('name', flat=True)), ['new0'])
+
+    def test_existing_texts_get_the_tags_of_the_row(self):
+        text = self.create_texts(1)[0]
+
+        # The last row with the same content wins
+        stats = self.run_import([f'dataset,tag0,{text.content}', f'dataset,tag2,{text.content}'])
+
+        self.assertEqual((stats.rows, stats.created, stats.updated), (2, 0, 1))
+        self.assertEqual(list(text.tags.all()), [self.tags[2]])
+
+    def test_invalid_rows_reported(self):
+        Tag.objects.create(name='inactive', dataset=self.dataset, is_active=False)
+
+        stats = self.run_import(['dataset,tag0,', ',tag0,no dataset', 'dataset,inactive,text', 'dataset,tag0,valid'])
+
+        self.assertEqual((stats.rows, stats.created, stats.error_count), (4, 1, 3))
+        self.assertEqual([error['line'] for error in stats.errors], [2, 3, 4])
+        self.assertEqual(list(Text.objects.values_list('content', flat=True)), ['valid'])
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(CSVImportError, "Missing required columns: text_content."):
+            CSVImporter().run(open_csv_stream(BytesIO(b'dataset_name,tags_name\ndataset,tag0\n')))
+
+
+class ImportJobTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CSV_IMPORT_ROOT=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = Path(directory.name)
+
+    def upload(self, content, name='texts.csv'):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/UploadCSVFile/', {'file': SimpleUploadedFile(name, content)})
+
+        if response.status_code == 202:
+            # The task is sent to the workers once the job is committed
+            self.assertEqual(len(callbacks), 1)
+
+        return response
+
+    def test_import_job_progress(self):
+        response = self.upload(b'dataset_name,tags_name,text_content\ndataset,tag0,first\ndataset,,\n')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(response.data['status_url']).data['status'], 'pending')
+
+        import_csv_file(str(response.data['job_id']))
+
+        data = self.client.get(response.data['status_url']).data
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual((data['rows_processed'], data['texts_created'], data['error_count']), (2, 1, 1))
+        self.assertEqual(data['processed_bytes'], data['total_bytes'])
+        job = ImportJob.objects.get(pk=response.data['job_id'])
+        self.assertTrue(job.file.path.startswith(str(self.directory)))
+        self.assertFalse(job.file.storage.exists(job.file.name))
+
+    def test_failed_import_job(self):
+        response = self.upload(b'dataset_name,tags_name\ndataset,tag0\n')
+        import_csv_file(str(response.data['job_id']))
+
+        data = self.client.get(response.data['status_url']).data
+        self.assertEqual(data['status'], 'failed')
+        self.assertIn("Missing required columns: text_content.", data['message'])
+        self.assertIsNotNone(data['finished_at'])
+
+    def test_only_csv_files(self):
+        response = self.upload(b'dataset_name,text_content\n', name='texts.txt')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+
+class ShardedCSVImportTests(DatasetTestCase):
+    rows = [f'dataset,tag{index % 3} new{index % 2},text {index}' for index in range(10)]
+
+    def csv_file(self, trailing_newline=True):
+        data = 'dataset_name,tags_name,text_content\n' + '\n'.join(self.rows) + ('\n' if trailing_newline else '')
+        return BytesIO(data.encode('utf-8'))
+
+    def read_shards(self, file, fieldnames, ranges):
+        return [[row['text_content'] for row in csv.DictReader(open_csv_shard(file, start, end),
+                                                                fieldnames=fieldnames)]
+                for start, end in ranges]
+
+    def test_shards_hold_whole_lines(self):
+        for trailing_newline in (True, False):
+            file = self.csv_file(trailing_newline)
+            for shards in (1, 3, 4, 50):
+                fieldnames, ranges = compute_shard_ranges(file, shards)
+
+                self.assertEqual(fieldnames, ['dataset_name', 'tags_name', 'text_content'])
+                self.assertLessEqual(len(ranges), min(shards, len(self.rows)))
+                self.assertEqual(ranges[-1][1], len(file.getvalue()))
+                # Ranges are contiguous and every one starts on a line start
+                for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+                    self.assertEqual(end, next_start)
+                    self.assertEqual(file.getvalue()[next_start - 1:next_start], b'\n')
+
+                shard_rows = self.read_shards(file, fieldnames, ranges)
+                self.assertEqual(sum(shard_rows, []), [f'text {index}' for index in range(10)])
+
+    def test_header_only(self):
+        fieldnames, ranges = compute_shard_ranges(BytesIO(b'dataset_name,tags_name,text_content\n'), 4)
+        self.assertEqual(ranges, [])
+
+    def test_import_shards(self):
+        file = self.csv_file()
+        fieldnames, ranges = compute_shard_ranges(file, 3)
+
+        vocabulary = {}
+        for start, end in ranges:
+            for dataset_name, tag_names in scan_csv_vocabulary(open_csv_shard(file, start, end), fieldnames).items():
+                vocabulary.setdefault(dataset_name, set()).update(tag_names)
+        self.assertEqual(vocabulary, {'dataset': {'tag0', 'tag1', 'tag2', 'new0', 'new1'}})
+
+        CSVImporter().create_vocabulary(vocabulary)
+        tag_count = Tag.objects.count()
+
+        created = sum(CSVImporter().run(open_csv_shard(file, start, end), fieldnames=fieldnames).created
+                      for start, end in ranges)
+        self.assertEqual(created, 10)
+        # The shards only read the tags created by the vocabulary step
+        self.assertEqual(Tag.objects.count(), tag_count)
+        text = Text.objects.get(content='text 4')
+        self.assertEqual(set(text.tags.values_list('name', flat=True)), {'new0', 'tag1'})
+
+
+class ContentHashTests(DatasetTestCase):
+
+    def test_hash_follows_the_content(self):
+        text = self.create_texts(1)[0]
+        self.assertEqual(text.content_hash, Text.hash_content(text.content))
+
+        text.content = 'changed'
+        text.save(update_fields=['content'])
+        self.assertEqual(Text.objects.get(pk=text.pk).content_hash, Text.hash_content('changed'))
+
+    def test_unique_content_per_dataset(self):
+        text = self.create_texts(1)[0]
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Text.objects.create(dataset=self.dataset, content=text.content)
+
+        other = Dataset.objects.create(name='other')
+        self.assertEqual(Text.objects.create(dataset=other, content=text.content).content_hash, text.content_hash)
+
+    def test_duplicate_content_rejected(self):
+        text, other = self.create_texts(2)
+
+        response = self.client.post(f'/api/CreateTextForDatasetByDatasetID/{self.dataset.id}/',
+                                    {'content': text.content, 'tags': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['content'], ["A text with the same content already exists in this dataset."])
+
+        response = self.client.patch(f'/api/UpdateTextByID/{other.id}/', {'content': text.content}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.patch(f'/api/UpdateTextByID/{text.id}/', {'content': text.content}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """
+    Base class of the data migration tests: migrate(targets) returns the historical
+    apps of the targets, the database is migrated back to the latest state afterwards.
+    """
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+
+class ContentHashMigrationTests(MigrationTestCase):
+    migrate_from = [('datasets', '0008_importjob_shards')]
+    migrate_to = [('datasets', '0010_text_unique_text_content_per_dataset')]
+
+    def test_duplicates_merged(self):
+        apps = self.migrate(self.migrate_from)
+        user = apps.get_model('auth', 'User').objects.create(username='operator')
+        Dataset = apps.get_model('datasets', 'Dataset')
+        Tag = apps.get_model('datasets', 'Tag')
+        Text = apps.get_model('datasets', 'Text')
+        Log = apps.get_model('datasets', 'Log')
+
+        dataset, other = Dataset.objects.create(name='dataset'), Dataset.objects.create(name='other')
+        tags = [Tag.objects.create(name=f'tag{index}', dataset=dataset) for index in range(2)]
+        texts = [Text.objects.create(dataset=dataset, content='same') for index in range(3)]
+        texts[1].tags.add(tags[0])
+        texts[2].tags.add(tags[1])
+        Log.objects.create(user=user, text_instance=texts[2], datetime=timezone.now())
+        kept_elsewhere = Text.objects.create(dataset=other, content='same')
+
+        apps = self.migrate(self.migrate_to)
+        Text = apps.get_model('datasets', 'Text')
+
+        self.assertEqual(list(Text.objects.order_by('id').values_list('id', flat=True)),
+                         [texts[0].id, kept_elsewhere.id])
+        kept = Text.objects.get(pk=texts[0].pk)
+        self.assertEqual(kept.content_hash, hashlib.sha256(b'same').hexdigest())
+        self.assertEqual(set(kept.tags.values_list('name', flat=True)), {'tag0', 'tag1'})
+        self.assertEqual(apps.get_model('datasets', 'Log').objects.get().text_instance_id, kept.id)
+
+
+class TextPaginationTests(DatasetTestCase):
+
+    def test_pages_follow_the_cursor(self):
+        texts = self.create_texts(7)
+        Text.objects.create(dataset=Dataset.objects.create(name='other'), content='other dataset')
+
+        ids = []
+        url = f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/?page_size=3'
+        while url:
+            data = self.client.get(url).data
+            self.assertLessEqual(len(data['results']), 3)
+            ids += [text['id'] for text in data['results']]
+            url = data['next']
+
+        self.assertEqual(ids, [text.id for text in texts])
+
+    def test_previous_page(self):
+        texts = self.create_texts(4)
+        first = self.client.get(f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/?page_size=2').data
+        self.assertIsNone(first['previous'])
+
+        second = self.client.get(first['next']).data
+        self.assertEqual([text['id'] for text in second['results']], [text.id for text in texts[2:]])
+        self.assertEqual(self.client.get(second['previous']).data['results'], first['results'])
+
+    def test_page_size(self):
+        self.create_texts(3, tagged=False)
+        path = f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/'
+
+        self.assertEqual(len(self.client.get(path).data['results']), 3)
+        with mock.patch.object(TextCursorPagination, 'max_page_size', 2):
+            self.assertEqual(len(self.client.get(path, {'page_size': 10}).data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/api/GetListOfTextsOfDatasetByDatasetID/{self.dataset.id}/', {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportTests(DatasetTestCase):
+
+    def export(self, **params):
+        response = self.client.get(f'/api/ExportTextsOfDatasetByDatasetID/{self.dataset.id}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson(self):
+        texts = self.create_texts(3)
+        texts[1].tags.clear()
+
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in content.decode('utf-8').splitlines()], [
+            {'id': text.id, 'content': text.content, 'tags': [] if text == texts[1] else ['tag0', 'tag1', 'tag2']}
+            for text in texts
+        ])
+
+    def test_csv_can_be_imported_back(self):
+        texts = self.create_texts(2)
+        texts[0].tags.remove(self.tags[0])
+
+        response, content = self.export(export_format='csv', compress='gzip')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn(f'dataset_{self.dataset.id}.csv.gz', response['Content-Disposition'])
+
+        Text.objects.all().delete()
+        stats = CSVImporter().run(open_csv_stream(BytesIO(gzip.decompress(content))))
+        self.assertEqual(stats.created, 2)
+        self.assertEqual(set(Text.objects.get(content=texts[0].content).tags.all()), set(self.tags[1:]))
+
+    def test_empty_dataset(self):
+        response, content = self.export(export_format='csv')
+        self.assertEqual(content, b'id,dataset_name,tags_name,text_content\r\n')
+
+    def test_texts_read_in_chunks(self):
+        texts = self.create_texts(5)
+        chunks = list(iter_dataset_texts(self.dataset, chunk_size=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0][0], (texts[0].id, texts[0].content, ['tag0', 'tag1', 'tag2']))
+
+    def test_unknown_format(self):
+        response = self.client.get(f'/api/ExportTextsOfDatasetByDatasetID/{self.dataset.id}/', {'export_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TagCountViewTests(DatasetTestCase):
+
+    def get(self, pk=None, **params):
+        return self.client.get(f'/api/CountNumberOfTextLabeldByTagUsingDatasetID/{pk or self.dataset.id}/', params)
+
+    def test_texts_per_active_tag(self):
+        texts = self.create_texts(3, tagged=False)
+        texts[0].tags.set(self.tags)
+        texts[1].tags.set(self.tags[:2])
+        Tag.objects.create(name='a unused', dataset=self.dataset)
+        Tag.objects.filter(pk=self.tags[2].pk).update(is_active=False)
+
+        response = self.get()
+        self.assertEqual(response.data, {'tag0': 2, 'tag1': 2})
+        self.assertEqual(list(response.data), ['tag0', 'tag1'])
+
+    def test_breakdowns(self):
+        texts = self.create_texts(3, tagged=False)
+        texts[0].tags.set(self.tags[:1])
+        texts[1].tags.set(self.tags[2:])
+        Tag.objects.filter(pk=self.tags[2].pk).update(is_active=False)
+        operator = self.create_operator([self.dataset])
+        Log.objects.bulk_create([Log(user=user, text_instance=texts[0]) for user in (self.admin, operator, operator)])
+
+        self.assertEqual(self.get(include='untagged,operators').data, {
+            'tags': {'tag0': 1}, 'untagged': 2, 'operators': {'admin': 1, 'operator': 2},
+        })
+        self.assertEqual(set(self.get(include='untagged').data), {'tags', 'untagged'})
+
+    def test_errors(self):
+        self.assertEqual(self.get(include='unknown').status_code, 400)
+        self.assertEqual(self.get(pk=Dataset.objects.count() + 100).status_code, 404)
+
+
+class FTS5SearchTests(DatasetTestCase):
+
+    def search(self, query, **params):
+        response = self.client.get(f'/api/FullTextSearchWithinTextsInDatasetByDatasetID/{self.dataset.id}/{query}/',
+                                   params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def create_text(self, content, dataset=None):
+        return Text.objects.create(dataset=dataset or self.dataset, content=content)
+
+    def test_ranked_matches(self):
+        once = self.create_text('the apple and the pear')
+        twice = self.create_text('apple apple')
+        self.create_text('a pear')
+        self.create_text('apple pie', dataset=Dataset.objects.create(name='other'))
+
+        data = self.search('apple')
+        self.assertEqual([text['id'] for text in data['results']], [twice.id, once.id])
+        self.assertIn('took_ms', data)
+
+        # Every token must match, the last one also as a prefix
+        self.assertEqual([text['id'] for text in self.search('APPLE pe')['results']], [once.id])
+
+    def test_index_follows_the_texts(self):
+        text = self.create_text('apple')
+        text.content = 'pear'
+        text.save()
+        self.assertEqual(self.search('apple')['results'], [])
+        self.assertEqual(len(self.search('pear')['results']), 1)
+
+        text.delete()
+        self.assertEqual(self.search('pear')['results'], [])
+
+    def test_query_syntax_is_ignored(self):
+        text = self.create_text('apple OR pear')
+        self.assertEqual([hit['id'] for hit in self.search('"apple" OR (pear')['results']], [text.id])
+        self.assertEqual(self.search('*')['results'], [])
+
+    def test_pages(self):
+        texts = [self.create_text(f'apple {index}') for index in range(5)]
+
+        ids = []
+        data = self.search('apple', page_size=2)
+        while True:
+            ids += [text['id'] for text in data['results']]
+            if not data['next']:
+                break
+            data = self.client.get(data['next']).data
+
+        self.assertEqual(sorted(ids), [text.id for text in texts])
+        self.assertEqual(len(ids), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/api/FullTextSearchWithinTextsInDatasetByDatasetID/{self.dataset.id}/apple/',
+                                   {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TEXT_SEARCH_BACKEND='datasets.search.InMemorySearchBackend')
+class InMemorySearchTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The backend is shared by the whole process, start from the texts of this test
+        self.backend = get_search_backend()
+        self.backend.rebuild()
+
+    def create_text(self, content, dataset=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Text.objects.create(dataset=dataset or self.dataset, content=content)
+
+    def test_index_follows_the_texts(self):
+        text = self.create_text('apple')
+        self.create_text('apple', dataset=Dataset.objects.create(name='other'))
+        self.assertEqual(self.backend.search(self.dataset.id, 'apple', 10), [(text.id, mock.ANY)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            text.content = 'pear'
+            text.save()
+        self.assertEqual(self.backend.search(self.dataset.id, 'apple', 10), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            text.delete()
+        self.assertEqual(self.backend.search(self.dataset.id, 'pear', 10), [])
+
+    def test_ranked_pages(self):
+        texts = [self.create_text(content) for content in ['apple pie', 'apple apple', 'apple tart', 'pear']]
+
+        hits = self.backend.search(self.dataset.id, 'apple', 2)
+        self.assertEqual([text_id for text_id, score in hits], [texts[1].id, texts[0].id])
+        self.assertEqual(self.backend.search(self.dataset.id, 'apple', 2, after=(hits[-1][1], hits[-1][0])),
+                         [(texts[2].id, hits[-1][1])])
+        self.assertEqual([text_id for text_id, score in self.backend.search(self.dataset.id, 'apple t', 10)],
+                         [texts[2].id])
+
+        response = self.client.get(f'/api/FullTextSearchWithinTextsInDatasetByDatasetID/{self.dataset.id}/pear/')
+        self.assertEqual([text['id'] for text in response.data['results']], [texts[3].id])
+
+
+class ElasticsearchSearchTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The client doesn't connect until a request is sent, the requests are checked on a mock
+        self.backend = ElasticsearchSearchBackend()
+        self.backend.client = mock.Mock()
+
+    def test_search(self):
+        self.backend.client.search.return_value = {'hits': {'hits': [{'sort': [2.5, 7]}, {'sort': [1.0, 3]}]}}
+
+        self.assertEqual(self.backend.search(self.dataset.id, 'apple', 2, after=(3.0, 1)), [(7, 2.5), (3, 1.0)])
+        request = self.backend.client.search.call_args.kwargs
+        self.assertEqual(request['query']['bool']['filter'], {'term': {'dataset_id': self.dataset.id}})
+        self.assertEqual(request['search_after'], [3.0, 1])
+        self.assertEqual(request['size'], 2)
+
+        self.assertEqual(self.backend.search(self.dataset.id, '?!', 2), [])
+        self.assertEqual(self.backend.client.search.call_count, 1)
+
+    def test_index_texts(self):
+        text = self.create_texts(1)[0]
+
+        with mock.patch('elasticsearch.helpers.bulk') as bulk:
+            self.backend.index_texts([text.id, text.id + 1])
+
+        actions = bulk.call_args.args[1]
+        self.assertEqual(actions, [
+            {'_index': 'texts', '_id': text.id,
+             '_source': {'text_id': text.id, 'dataset_id': self.dataset.id, 'content': text.content}},
+            # Deleted in the meantime
+            {'_op_type': 'delete', '_index': 'texts', '_id': text.id + 1},
+        ])
+
+    @override_settings(TEXT_SEARCH_BACKEND='datasets.search.ElasticsearchSearchBackend')
+    def test_index_updated_by_the_workers(self):
+        with mock.patch('datasets.tasks.index_texts.delay') as index_texts, \
+                mock.patch('datasets.tasks.remove_texts_from_index.delay') as remove_texts:
+            with self.captureOnCommitCallbacks(execute=True):
+                text = Text.objects.create(dataset=self.dataset, content='apple')
+            index_texts.assert_called_once_with([text.id])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                text_id = text.id
+                text.delete()
+            remove_texts.assert_called_once_with([text_id])
+
+
+class BulkSetTagsTests(DatasetTestCase):
+
+    def post(self, data, client=None):
+        response = (client or self.client).post('/api/BulkUpdateTextsTags/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def tag_ids(self, text):
+        return set(text.tags.values_list('id', flat=True))
+
+    def test_tags_replaced(self):
+        texts = self.create_texts(3)
+
+        data = self.post({'items': [
+            {'text_id': texts[0].id, 'tags': [self.tags[0].id]},
+            {'text_id': texts[1].id, 'tags': []},
+            {'text_id': texts[0].id, 'tags': [self.tags[1].id, self.tags[1].id]},
+        ]})
+
+        # A text given twice gets the tags of its last item
+        self.assertEqual(data, {'updated': 2, 'errors': 0, 'results': [
+            {'text_id': texts[0].id, 'status': 'updated'}, {'text_id': texts[1].id, 'status': 'updated'},
+        ]})
+        self.assertEqual(self.tag_ids(texts[0]), {self.tags[1].id})
+        self.assertEqual(self.tag_ids(texts[1]), set())
+        self.assertEqual(self.tag_ids(texts[2]), {tag.id for tag in self.tags})
+
+        data = self.post({'text_ids': [texts[1].id, texts[2].id], 'tags': [self.tags[2].id]})
+        self.assertEqual(data['updated'], 2)
+        self.assertEqual(self.tag_ids(texts[2]), {self.tags[2].id})
+
+    def test_invalid_items_rejected(self):
+        texts = self.create_texts(3, tagged=False)
+        other = Dataset.objects.create(name='other')
+        other_tag = Tag.objects.create(name='other', dataset=other)
+        other_text = Text.objects.create(dataset=other, content='other')
+        Tag.objects.filter(pk=self.tags[2].pk).update(is_active=False)
+        invalidate_active_tags(self.dataset.id)
+
+        client = APIClient()
+        client.force_authenticate(self.create_operator([self.dataset]))
+        data = self.post({'items': [
+            {'text_id': texts[0].id, 'tags': [self.tags[0].id]},
+            {'text_id': texts[1].id, 'tags': [other_tag.id]},
+            {'text_id': texts[2].id, 'tags': [self.tags[2].id]},
+            {'text_id': other_text.id, 'tags': [other_tag.id]},
+            {'text_id': other_text.id + 100, 'tags': []},
+        ]}, client=client)
+
+        self.assertEqual((data['updated'], data['errors']), (1, 4))
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['updated', 'error', 'error', 'error', 'error'])
+        self.assertEqual(data['results'][3]['error'], "You don't have access to the dataset of this text.")
+        self.assertEqual(data['results'][4]['error'], "Text not found.")
+        self.assertEqual(self.tag_ids(texts[0]), {self.tags[0].id})
+        self.assertEqual(self.tag_ids(texts[1]), set())
+
+    def test_invalid_requests(self):
+        for data in [{}, {'items': []}, {'items': [{'text_id': 1, 'tags': []}], 'text_ids': [1], 'tags': []},
+                     {'text_ids': [1]}]:
+            response = self.client.post('/api/BulkUpdateTextsTags/', data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+
+    def test_one_log_entry_per_text(self):
+        texts = self.create_texts(2)
+
+        with mock.patch('datasets.tagging.record_activities') as record_activities:
+            self.post({'text_ids': [text.id for text in texts], 'tags': [self.tags[0].id]})
+
+        entries = list(record_activities.call_args.args[0])
+        self.assertEqual([(entry['user_id'], entry['text_instance_id']) for entry in entries],
+                         [(self.admin.id, text.id) for text in texts])
+
+
+class TagChangeTests(DatasetTestCase):
+
+    def test_change_tags_of_a_text(self):
+        text = self.create_texts(1, tagged=False)[0]
+        text.tags.set(self.tags[:2])
+
+        response = self.client.patch(f'/api/UpdateTextByID/{text.id}/',
+                                     {'add_tags': [self.tags[2].id], 'remove_tags': [self.tags[0].id]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(set(response.data['tags']), {self.tags[1].id, self.tags[2].id})
+
+    def test_invalid_changes(self):
+        text = self.create_texts(1)[0]
+        inactive = Tag.objects.create(name='inactive', dataset=self.dataset, is_active=False)
+        path = f'/api/UpdateTextByID/{text.id}/'
+
+        for data in [{'add_tags': [], 'remove_tags': []}, {'add_tags': [inactive.id]},
+                     {'add_tags': [self.tags[0].id], 'content': 'changed'}]:
+            response = self.client.patch(path, data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+
+        self.assertEqual(set(text.tags.all()), set(self.tags))
+
+    def test_only_real_changes_reported(self):
+        texts = self.create_texts(2, tagged=False)
+        texts[0].tags.set(self.tags[:2])
+
+        response = self.client.post('/api/BulkChangeTextsTags/', {
+            'text_ids': [text.id for text in texts],
+            'add_tags': [self.tags[1].id, self.tags[2].id],
+            # A tag both added and removed is removed
+            'remove_tags': [self.tags[0].id, self.tags[2].id],
+        }, format='json')
+
+        self.assertEqual(response.data['results'], [
+            {'text_id': texts[0].id, 'status': 'updated', 'added': [], 'removed': [self.tags[0].id]},
+            {'text_id': texts[1].id, 'status': 'updated', 'added': [self.tags[1].id], 'removed': []},
+        ])
+        self.assertEqual(list(texts[0].tags.all()), [self.tags[1]])
+        self.assertEqual(list(texts[1].tags.all()), [self.tags[1]])
+
+
+class ActivityLogTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(ACTIVITY_LOG_SPOOL_DIR=Path(directory.name),
+                                              ACTIVITY_LOG_BUFFER_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.text = self.create_texts(1)[0]
+        # Without the background thread, the buffer is flushed by the tests
+        self.buffer = ActivityLogBuffer()
+        self.buffer.pid = os.getpid()
+
+    def entry(self, text_id=None, action='update'):
+        return {'user_id': self.admin.id, 'text_instance_id': text_id or self.text.id, 'action': action,
+                'updated_field': 'tags', 'action_details': 'update', 'datetime': timezone.now()}
+
+    def test_entries_recorded_on_commit(self):
+        with mock.patch.object(activity_log, 'add') as add:
+            with self.captureOnCommitCallbacks(execute=True):
+                record_activity(self.admin, self.text.id, action='create')
+                self.assertFalse(add.called)
+
+        entry, = add.call_args.args[0]
+        self.assertEqual((entry['user_id'], entry['text_instance_id'], entry['action']),
+                         (self.admin.id, self.text.id, 'create'))
+        self.assertIsNotNone(entry['datetime'])
+
+    def test_buffer_written_in_bulk(self):
+        self.buffer.add([self.entry()])
+        self.assertFalse(self.buffer.wakeup.is_set())
+        self.buffer.add([self.entry(action='create')])
+        # Full, the thread is woken up
+        self.assertTrue(self.buffer.wakeup.is_set())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+
+        # Every action on a text is kept
+        self.assertEqual(list(Log.objects.filter(text_instance=self.text).values_list('action', flat=True)
+                              .order_by('id')), ['update', 'create'])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_spooled_when_the_database_fails(self):
+        self.buffer.add([self.entry(), self.entry(action='create')])
+
+        with mock.patch('datasets.activity.write_entries', side_effect=DatabaseError), \
+                self.assertLogs('datasets.activity', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 2)
+
+        self.assertFalse(Log.objects.exists())
+        self.assertEqual(len(list(get_spool_dir().glob('activity-*.jsonl'))), 1)
+
+        self.assertEqual(replay_spool(), 2)
+        self.assertEqual(Log.objects.count(), 2)
+        self.assertEqual(list(get_spool_dir().iterdir()), [])
+        self.assertEqual(replay_spool(), 0)
+
+    def test_failing_spool_file_quarantined(self):
+        self.buffer.add([self.entry()])
+        with mock.patch('datasets.activity.write_entries', side_effect=DatabaseError), \
+                self.assertLogs('datasets.activity', 'ERROR'):
+            self.buffer.flush()
+        path, = get_spool_dir().glob('activity-*.jsonl')
+        broken = path.with_name(f"activity-0-{path.name[len('activity-'):]}")
+        broken.write_text('not json\n', encoding='utf-8')
+
+        with self.assertLogs('datasets.activity', 'ERROR'):
+            self.assertEqual(replay_spool(), 1)
+
+        self.assertEqual(Log.objects.count(), 1)
+        self.assertEqual(list(get_spool_dir().iterdir()), [broken.with_name(f"{broken.name}.failed")])
+        self.assertEqual(replay_spool(), 0)
+
+
+class ActivityLogWriteTests(TransactionTestCase):
+    # Foreign keys are checked when the transaction commits, not inside the transaction of a TestCase
+
+    def test_entries_of_deleted_texts_dropped(self):
+        user = User.objects.create_user('operator')
+        dataset = Dataset.objects.create(name='dataset')
+        text, deleted = (Text.objects.create(dataset=dataset, content=content) for content in ('kept', 'deleted'))
+        deleted_id = deleted.id
+        deleted.delete()
+
+        write_entries([{'user_id': user.id, 'text_instance_id': text_id, 'datetime': timezone.now()}
+                       for text_id in (text.id, deleted_id)])
+        self.assertEqual(list(Log.objects.values_list('text_instance_id', flat=True)), [text.id])
+
+    def test_entries_of_deleted_users_dropped(self):
+        user, deleted = (User.objects.create_user(username) for username in ('kept', 'deleted'))
+        deleted_id = deleted.id
+        deleted.delete()
+        text = Text.objects.create(dataset=Dataset.objects.create(name='dataset'), content='text')
+
+        write_entries([{'user_id': user_id, 'text_instance_id': text.id, 'datetime': timezone.now()}
+                       for user_id in (user.id, deleted_id)])
+        self.assertEqual(list(Log.objects.values_list('user_id', flat=True)), [user.id])
+
+
+class DailyLogExportTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(LOG_EXPORT_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.day = timezone.localdate() - timedelta(days=1)
+        text = self.create_texts(1)[0]
+        start, end = get_day_range(self.day)
+        Log.objects.bulk_create([
+            Log(user=self.admin, text_instance=text, action='late', datetime=start + timedelta(hours=2)),
+            Log(user=self.admin, text_instance=text, action='early', datetime=start + timedelta(hours=1)),
+            Log(user=self.admin, text_instance=text, action='next day', datetime=end),
+        ])
+
+    def read_export(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+            return list(csv.reader(file))
+
+    def test_export_of_a_day(self):
+        result = export_daily_logs(self.day.isoformat())
+
+        self.assertEqual(result['rows'], 2)
+        rows = self.read_export(result['path'])
+        self.assertEqual(rows[0], LOG_EXPORT_COLUMNS)
+        self.assertEqual([row[1] for row in rows[1:]], ['early', 'late'])
+        self.assertEqual(rows[1][0], 'admin')
+
+    def test_rerun_replaces_the_file(self):
+        path = Path(export_daily_logs(self.day.isoformat())['path'])
+        content = path.read_bytes()
+
+        self.assertEqual(export_daily_logs(self.day.isoformat())['rows'], 2)
+        self.assertEqual(path.read_bytes(), content)
+        self.assertEqual(list(self.directory.iterdir()), [path])
+
+    def test_failed_export_keeps_the_previous_file(self):
+        path, rows = export_logs_of_day(self.day)
+        content = path.read_bytes()
+
+        with mock.patch('datasets.exporters.csv.writer', side_effect=OSError("Disk full")), \
+                self.assertRaises(OSError):
+            export_logs_of_day(self.day)
+
+        self.assertEqual(path.read_bytes(), content)
+        self.assertEqual(list(self.directory.iterdir()), [path])
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command('backfill_daily_logs', self.day.isoformat(), (self.day + timedelta(days=2)).isoformat(),
+                     '--sync', stdout=out)
+
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()),
+                         [f'logs_{self.day + timedelta(days=offset)}.csv.gz' for offset in range(2)])
+        self.assertEqual(len(self.read_export(get_log_export_path(self.day + timedelta(days=1)))), 2)
+
+        with self.assertRaisesMessage(CommandError, "end must be after start."):
+            call_command('backfill_daily_logs', self.day.isoformat(), self.day.isoformat(), '--sync')
+
+
+class ActivityRollupTests(DatasetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.operator = self.create_operator([self.dataset])
+        self.other = Dataset.objects.create(name='other')
+        self.texts = [self.create_texts(1)[0], Text.objects.create(dataset=self.other, content='other')]
+        self.today = timezone.localdate()
+
+    def create_logs(self, day, *entries):
+        start, end = get_day_range(day)
+        Log.objects.bulk_create([Log(user=user, text_instance=text, action=action, datetime=start)
+                                 for user, text, action in entries])
+
+    def test_rollup_of_a_day(self):
+        day = self.today - timedelta(days=1)
+        self.create_logs(day, (self.admin, self.texts[0], 'update'), (self.admin, self.texts[0], 'update'),
+                         (self.admin, self.texts[1], 'update'), (self.operator, self.texts[0], 'create'))
+        self.create_logs(self.today, (self.admin, self.texts[0], 'update'))
+
+        self.assertEqual(rollup_day(day), 3)
+        rollups = DailyActivityRollup.objects.filter(day=day).values_list('user_id', 'dataset_id', 'action', 'count')
+        self.assertEqual(set(rollups), {(self.admin.id, self.dataset.id, 'update', 2),
+                                        (self.admin.id, self.other.id, 'update', 1),
+                                        (self.operator.id, self.dataset.id, 'create', 1)})
+
+        # Rerunning replaces the rows, e.g. with the entries written late
+        self.create_logs(day, (self.operator, self.texts[0], 'create'))
+        self.assertEqual(rollup_day(day), 3)
+        self.assertEqual(DailyActivityRollup.objects.get(day=day, user=self.operator).count, 2)
+
+    @override_settings(ACTIVITY_ROLLUP_LOOKBACK_DAYS=2)
+    def test_days_to_rollup(self):
+        self.assertEqual(get_days_to_rollup(self.today), [])
+
+        self.create_logs(self.today - timedelta(days=4), (self.admin, self.texts[0], 'update'))
+        self.assertEqual(get_days_to_rollup(self.today),
+                         [self.today - timedelta(days=offset) for offset in range(4, 0, -1)])
+
+        for day in get_days_to_rollup(self.today):
+            rollup_day(day)
+        # Only the lookback days are computed again, and the days missed since the last run
+        self.assertEqual(get_days_to_rollup(self.today),
+                         [self.today - timedelta(days=offset) for offset in range(2, 0, -1)])
+        self.assertEqual(get_days_to_rollup(self.today + timedelta(days=3)),
+                         [self.today + timedelta(days=offset) for offset in range(3)])
+
+    def test_report(self):
+        yesterday = self.today - timedelta(days=1)
+        DailyActivityRollup.objects.bulk_create([
+            DailyActivityRollup(day=yesterday, user=self.admin, dataset=self.dataset, action='update', count=3),
+            DailyActivityRollup(day=yesterday, user=self.operator, dataset=self.dataset, action='update', count=2),
+            DailyActivityRollup(day=yesterday - timedelta(days=1), user=self.admin, dataset=self.other,
+                                action='create', count=1),
+            DailyActivityRollup(day=yesterday - timedelta(days=40), user=self.admin, dataset=self.dataset,
+                                action='update', count=7),
+        ])
+
+        data = self.client.get('/api/GetDailyActivityReport/', {'group_by': 'dataset'}).data
+        self.assertEqual(data['total'], 6)
+        self.assertEqual(data['results'], [
+            {'dataset_id': self.dataset.id, 'dataset_name': 'dataset', 'count': 5},
+            {'dataset_id': self.other.id, 'dataset_name': 'other', 'count': 1},
+        ])
+
+        data = self.client.get('/api/GetDailyActivityReport/', {
+            'group_by': 'day,user', 'action': 'update', 'dataset': self.dataset.id,
+            'start': (yesterday - timedelta(days=40)).isoformat(),
+        }).data
+        self.assertEqual([(row['day'], row['username'], row['count']) for row in data['results']], [
+            (yesterday - timedelta(days=40), 'admin', 7), (yesterday, 'admin', 3), (yesterday, 'operator', 2),
+        ])
+
+        for params in ({'group_by': 'unknown'}, {'start': 'yesterday'}, {'user': 'admin'}):
+            self.assertEqual(self.client.get('/api/GetDailyActivityReport/', params).status_code, 400)
+
+
+class UniqueNameMigrationTests(MigrationTestCase):
+    migrate_from = [('datasets', '0016_resourceversion'), ('account', '0001_initial')]
+    migrate_to = [('datasets', '0017_unique_dataset_and_tag_names'), ('account', '0001_initial')]
+
+    def test_duplicates_renamed(self):
+        apps = self.migrate(self.migrate_from)
+        Dataset = apps.get_model('datasets', 'Dataset')
+        Tag = apps.get_model('datasets', 'Tag')
+        Text = apps.get_model('datasets', 'Text')
+        Profile = apps.get_model('account', 'Profile')
+
+        first, second = Dataset.objects.create(name='reviews'), Dataset.objects.create(name='reviews')
+        Dataset.objects.create(name=f'reviews ({second.id})')
+        tags = [Tag.objects.create(name='positive', dataset=first) for index in range(2)]
+        other_tag = Tag.objects.create(name='positive', dataset=second)
+        text = Text.objects.create(dataset=first, content='text', content_hash='hash')
+        text.tags.add(*tags)
+        profile = Profile.objects.create(user=apps.get_model('auth', 'User').objects.create(username='operator'))
+        profile.available_datasets.add(second)
+
+        apps = self.migrate(self.migrate_to)
+        Dataset = apps.get_model('datasets', 'Dataset')
+        Tag = apps.get_model('datasets', 'Tag')
+
+        self.assertEqual(Dataset.objects.get(pk=first.pk).name, 'reviews')
+        self.assertEqual(Dataset.objects.get(pk=second.pk).name, f'reviews ({second.id}) ({second.id})')
+        self.assertEqual(list(Tag.objects.order_by('id').values_list('name', flat=True)),
+                         ['positive', f'positive_{tags[1].id}', 'positive'])
+        self.assertEqual(Tag.objects.get(pk=other_tag.pk).dataset_id, second.id)
+
+        # Nothing moved: texts, their tags and the access of the operators
+        text = apps.get_model('datasets', 'Text').objects.get()
+        self.assertEqual((text.dataset_id, set(text.tags.values_list('id', flat=True))),
+                         (first.id, {tag.id for tag in tags}))
+        profile = apps.get_model('account', 'Profile').objects.get()
+        self.assertEqual(list(profile.available_datasets.values_list('id', flat=True)), [second.id])
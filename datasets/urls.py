@@ -9,6 +9,7 @@ urlpatterns = [
     path('CreateDataset/', views.CreateDatasetAPIView.as_view(), name="create_dataset"),
     path('CreateTagForDatasetByDatasetID/<int:pk>/', views.CreateTagForDatasetByDatasetIDAPIView.as_view(), name="create_tag"),
     path('CreateTextForDatasetByDatasetID/<int:pk>/', views.CreateTextForDatasetByDatasetIDAPIView.as_view(), name="create_text"),
+    path('BulkCreateTextsForDatasetByDatasetID/<int:pk>/', views.BulkCreateTextsForDatasetByDatasetIDAPIView.as_view(), name="bulk_create_texts"),
     
     # List of instances 
     path('GetListOfDatasets/', views.GetListOfDatasetsAPIView.as_view(), name="list_of_datasets"),
@@ -24,6 +25,8 @@ urlpatterns = [
     path('UpdateDatasetByID/<int:pk>/', views.UpdateDatasetByIDAPIView.as_view(), name="update_dataset_by_id"),
     path('UpdateTagByID/<int:pk>/', views.UpdateTagByIDAPIView.as_view(), name="update_tag_by_id"),
     path('UpdateTextByID/<int:pk>/', views.UpdateTextByIDAPIView.as_view(), name="update_text_by_id"),
+    path('BulkUpdateTextsTags/', views.BulkUpdateTextsTagsAPIView.as_view(), name="bulk_update_texts_tags"),
+    path('BulkChangeTextsTags/', views.BulkChangeTextsTagsAPIView.as_view(), name="bulk_change_texts_tags"),
 
     # Delete instances by id
     path('DeleteDatasetByID/<int:pk>/', views.DeleteDatasetByIDAPIView.as_view(), name="delete_dataset"),
@@ -36,6 +39,14 @@ urlpatterns = [
     # full text search within text
     path('FullTextSearchWithinTextsInDatasetByDatasetID/<int:pk>/<str:search_string>/', views.FullTextSearchWithinTextsInDatasetByDatasetIDAPIView.as_view(), name='full_tex_search'),
 
+    # Stream all the texts of a dataset with their tags as ndjson or csv
+    path('ExportTextsOfDatasetByDatasetID/<int:pk>/', views.ExportTextsOfDatasetByDatasetIDAPIView.as_view(), name='export_texts'),
+
     # Upload csv file to import data from file to dataset
     path('UploadCSVFile/', views.UploadCSVFileCreateAPIView.as_view(), name='upload_csv_file'),
+    path('GetImportJobStatusByID/<uuid:pk>/', views.GetImportJobStatusByIDAPIView.as_view(), name='import_job_status'),
+
+    # Number of actions per day, user, dataset and action
+    path('GetDailyActivityReport/', views.GetDailyActivityReportAPIView.as_view(), name='daily_activity_report'),
+    path('GetArchivedLogs/', views.GetArchivedLogsAPIView.as_view(), name='archived_logs'),
 ]
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Tag
+
+
+def active_tags_cache_key(dataset_id):
+    return f"datasets:active-tags:{dataset_id}"
+
+
+def get_active_tag_ids(dataset_ids):
+    """
+    Return {dataset id: frozenset of active tag ids} from the cache, the datasets
+    missing from it are loaded with one query.
+    """
+    keys = {active_tags_cache_key(dataset_id): dataset_id for dataset_id in dataset_ids}
+    active_tag_ids = {keys[key]: frozenset(tag_ids) for key, tag_ids in cache.get_many(keys).items()}
+
+    missing = [dataset_id for dataset_id in keys.values() if dataset_id not in active_tag_ids]
+    if missing:
+        loaded = {dataset_id: set() for dataset_id in missing}
+        for dataset_id, tag_id in Tag.objects.filter(dataset_id__in=missing, is_active=True).values_list('dataset_id', 'id'):
+            loaded[dataset_id].add(tag_id)
+
+        cache.set_many(
+            {active_tags_cache_key(dataset_id): sorted(tag_ids) for dataset_id, tag_ids in loaded.items()},
+            settings.ACTIVE_TAGS_CACHE_TIMEOUT,
+        )
+        active_tag_ids.update((dataset_id, frozenset(tag_ids)) for dataset_id, tag_ids in loaded.items())
+
+    return active_tag_ids
+
+
+def invalidate_active_tags(*dataset_ids):
+    cache.delete_many([active_tags_cache_key(dataset_id) for dataset_id in dataset_ids])
+
+
+def load_tags(tag_ids):
+    """
+    Return {tag id: (dataset id, is_active, name)} for the tags that exist.
+    """
+    if not tag_ids:
+        return {}
+
+    return {
+        tag_id: (dataset_id, is_active, name)
+        for tag_id, dataset_id, is_active, name in (Tag.objects.filter(pk__in=tag_ids)
+                                                     .values_list('id', 'dataset_id', 'is_active', 'name'))
+    }
+
+
+class TagValidator:
+    """
+    Check that tag ids are active tags of the dataset of a text, shared by the
+    serializers, the bulk tagging and the CSV import.
+
+    The active tag ids of a dataset are read once per validator from the cache,
+    or with one query for all the datasets missing from it. Rejected tags are
+    looked up with one more query, only to describe why they were rejected.
+    """
+
+    def __init__(self):
+        self.active_tag_ids = {}
+        # Tags created by the caller, e.g. during an import, before the cache is invalidated
+        self.created_tag_ids = {}
+
+    def load(self, dataset_ids):
+        missing = {dataset_id for dataset_id in dataset_ids if dataset_id not in self.active_tag_ids}
+        if missing:
+            self.active_tag_ids.update(get_active_tag_ids(missing))
+
+    def add_created_tag(self, dataset_id, tag_id):
+        self.created_tag_ids.setdefault(dataset_id, set()).add(tag_id)
+
+    def find_invalid(self, dataset_id, tag_ids):
+        """
+        Return the tag ids that are not active tags of the dataset, in order, without duplicates.
+        """
+        self.load([dataset_id])
+        active = self.active_tag_ids[dataset_id]
+        created = self.created_tag_ids.get(dataset_id, ())
+        return [tag_id for tag_id in dict.fromkeys(tag_ids) if tag_id not in active and tag_id not in created]
+
+    def describe(self, dataset_id, tag_ids, tags=None):
+        """
+        Return one error message per invalid tag id. A tag found active in the dataset
+        (the cached ids were not invalidated yet) gets none.
+        """
+        if tags is None:
+            tags = load_tags(tag_ids)
+
+        errors = []
+        stale = False
+        for tag_id in tag_ids:
+            if tag_id not in tags:
+                errors.append(f"Tag {tag_id} not found.")
+                continue
+
+            tag_dataset_id, is_active, name = tags[tag_id]
+            if tag_dataset_id != dataset_id:
+                errors.append(f"The {name} tag doesn't belong to the dataset of this text.")
+            elif not is_active:
+                errors.append(f"The {name} tag is not active.")
+            else:
+                stale = True
+
+        if stale:
+            # Created without signals (bulk_create), reload them next time
+            invalidate_active_tags(dataset_id)
+
+        return errors
+
+    def validate(self, items):
+        """
+        Validate (key, dataset id, tag ids) items at once and return {key: [error messages]}
+        for the rejected items.
+        """
+        items = list(items)
+        self.load({dataset_id for key, dataset_id, tag_ids in items})
+
+        invalid = {}
+        for key, dataset_id, tag_ids in items:
+            invalid_ids = self.find_invalid(dataset_id, tag_ids)
+            if invalid_ids:
+                invalid[key] = (dataset_id, invalid_ids)
+
+        if not invalid:
+            return {}
+
+        tags = load_tags({tag_id for dataset_id, tag_ids in invalid.values() for tag_id in tag_ids})
+        errors = {key: self.describe(dataset_id, tag_ids, tags) for key, (dataset_id, tag_ids) in invalid.items()}
+        return {key: messages for key, messages in errors.items() if messages}
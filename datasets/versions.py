@@ -0,0 +1,88 @@
+from functools import wraps
+
+from django.views.decorators.http import condition
+
+from .models import ResourceVersion, Tag, Text
+
+
+def conditional_on_version(get_key):
+    """
+    Make a GET view conditional on a ResourceVersion: get_key(request, *args, **kwargs)
+    returns the key of the version the response depends on, or None to skip the check.
+
+    200 responses get a strong ETag and a Last-Modified header, and a request with a matching
+    If-None-Match or If-Modified-Since gets a 304 Not Modified without running the view.
+    On DRF views, apply it with method_decorator so authentication and permissions
+    are checked first.
+    """
+    def get_version(request, *args, **kwargs):
+        return get_request_version(request, get_key, *args, **kwargs)
+
+    def get_etag(request, *args, **kwargs):
+        resource_version = get_version(request, *args, **kwargs)
+        if resource_version is None:
+            return None
+
+        key, version, updated_at = resource_version
+        return f'"{key}.{version}"'
+
+    def get_last_modified(request, *args, **kwargs):
+        resource_version = get_version(request, *args, **kwargs)
+        return resource_version and resource_version[2]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=get_etag, last_modified_func=get_last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # An error (e.g. 404 of a missing dataset) must not be cached by the client
+            if response.status_code not in (200, 304):
+                for header in ('ETag', 'Last-Modified'):
+                    if response.has_header(header):
+                        del response[header]
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def get_request_version(request, get_key, *args, **kwargs):
+    """
+    Return (key, version, updated at) of the ResourceVersion of a request, or None
+    when get_key returns None. Read once per request and key function.
+    """
+    versions = request.__dict__.setdefault('_resource_versions', {})
+    if get_key not in versions:
+        key = get_key(request, *args, **kwargs)
+        versions[get_key] = (key, *ResourceVersion.objects.get_version(key)) if key else None
+
+    return versions[get_key]
+
+
+def dataset_list_key(request, *args, **kwargs):
+    return ResourceVersion.DATASET_LIST_KEY
+
+
+def dataset_key(request, pk, **kwargs):
+    return ResourceVersion.dataset_key(pk)
+
+
+def tag_dataset_key(request, pk, **kwargs):
+    dataset_id = Tag.objects.filter(pk=pk).values_list('dataset_id', flat=True).first()
+    return ResourceVersion.dataset_key(dataset_id) if dataset_id is not None else None
+
+
+def text_dataset_key(request, pk, **kwargs):
+    dataset_id = Text.objects.filter(pk=pk).values_list('dataset_id', flat=True).first()
+    return ResourceVersion.dataset_key(dataset_id) if dataset_id is not None else None
+
+
+def dataset_tag_counts_key(request, pk, **kwargs):
+    # The operators breakdown counts log entries, which don't change the version
+    if 'operators' in request.GET.get('include', ''):
+        return None
+
+    return ResourceVersion.dataset_key(pk)
@@ -1,10 +1,15 @@
-import csv
-from datetime import datetime
+import json
+import time
+from datetime import date, timedelta
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Sum
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import (CreateAPIView, DestroyAPIView,
@@ -14,12 +19,34 @@ from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .exceptions import InactiveTagException
-from .models import Dataset, Log, Tag, Text
+from account.access import get_user_access
+
+from .activity import record_activity
+from .archive import iter_archived_logs
+from .caching import cache_response
+from .exporters import EXPORT_FORMATS, export_dataset_texts
+from .importers import bulk_create_texts
+from .models import (DailyActivityRollup, Dataset, ImportJob, Log, Tag,
+                     TagCount, Text)
+from .pagination import SearchCursorPagination, TextCursorPagination
 from .permissions import (IsAdminOrCanEditLimitedFields,
                           IsAdminOrHasDatasetAccess)
-from .serializers import (DatasetSerializer, FileUploadSerializer,
+from .search import get_search_backend
+from .serializers import (BulkTagChangeSerializer, BulkTagUpdateSerializer,
+                          BulkTextCreateSerializer,
+                          DatasetSerializer, FileUploadSerializer,
+                          ImportJobSerializer, TagChangeSerializer,
                           TagSerializer, TextSerializer)
+from .tagging import bulk_change_tags, bulk_set_tags
+from .tasks import import_csv_file, import_csv_file_sharded
+from .versions import (conditional_on_version, dataset_key, dataset_list_key,
+                       dataset_tag_counts_key, tag_dataset_key,
+                       text_dataset_key)
+
+
+def prefetch_tag_ids():
+    # TextSerializer only needs the ids of the tags
+    return Prefetch('tags', queryset=Tag.objects.only('id'))
 
 
 class CreateDatasetAPIView(CreateAPIView):
@@ -44,22 +71,36 @@ class CreateDatasetAPIView(CreateAPIView):
 class GetListOfDatasetsAPIView(ListAPIView):
     """
     Displays all Datasets
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
     """
     permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
 
     queryset = Dataset.objects.all()
     serializer_class = DatasetSerializer
 
+    @method_decorator(conditional_on_version(dataset_list_key))
+    @method_decorator(cache_response(dataset_list_key))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 class GetDetailOfDatasetByIDAPIView(RetrieveAPIView):
     """
     Displays Dataset details by dataset id
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
     """
     permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
     
     queryset  = Dataset.objects.all()
     serializer_class = DatasetSerializer
 
+    @method_decorator(conditional_on_version(dataset_key))
+    @method_decorator(cache_response(dataset_key))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 class UpdateDatasetByIDAPIView(UpdateAPIView):
     """
@@ -102,8 +143,8 @@ class CreateTagForDatasetByDatasetIDAPIView(APIView):
         # Retrieve the Dataset by pk or return 404 if not found
         dataset = get_object_or_404(Dataset, pk=pk)
         
-        # Create the Tag instance with dataset as a foreign key
-        serializer = TagSerializer(data=request.data)
+        # Create the Tag instance with dataset as a foreign key, names are unique in a dataset
+        serializer = TagSerializer(data=request.data, context={'dataset': dataset})
         
         if serializer.is_valid():
             serializer.save(dataset=dataset)
@@ -115,9 +156,13 @@ class CreateTagForDatasetByDatasetIDAPIView(APIView):
 class GetListOfTagsOfDatasetByDatasetIDAPIView(APIView):
     """
     Displays all Tags of a Dataset by dataset id
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
     """
     permission_classes = [IsAuthenticated, IsAdminOrHasDatasetAccess]
     
+    @method_decorator(conditional_on_version(dataset_key))
+    @method_decorator(cache_response(dataset_key))
     def get(self, request, pk):
         
         # Retrieve the Dataset by pk or return 404 if not found
@@ -133,12 +178,19 @@ class GetListOfTagsOfDatasetByDatasetIDAPIView(APIView):
 class GetDetailOfTagByIDAPIView(RetrieveAPIView):
     """
     Displays Tag details by tag id
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
     """
     permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
 
     queryset  = Tag.objects.all()
     serializer_class = TagSerializer
 
+    @method_decorator(conditional_on_version(tag_dataset_key))
+    @method_decorator(cache_response(tag_dataset_key))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 class UpdateTagByIDAPIView(UpdateAPIView):
     """
@@ -184,8 +236,9 @@ class CreateTextForDatasetByDatasetIDAPIView(APIView):
         # Retrieve the Dataset by pk or return 404 if not found
         dataset = get_object_or_404(Dataset, pk=pk)
         
-        # Create the Text instance with dataset as a foreign key
-        serializer = TextSerializer(data=request.data)
+        # Create the Text instance with dataset as a foreign key,
+        # duplicates in the dataset are found through the content hash index
+        serializer = TextSerializer(data=request.data, context={'dataset': dataset})
         
         if serializer.is_valid():
             serializer.save(dataset=dataset)
@@ -194,32 +247,145 @@ class CreateTextForDatasetByDatasetIDAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+class BulkCreateTextsForDatasetByDatasetIDAPIView(APIView):
+    """
+    Create many Texts for specific Dataset by dataset id in one request,
+    written with bulk inserts in one transaction
+    
+    headers: 
+    Content-Type: application/json,
+    X-CSRFToken : your-csrf-token
+    
+    fields:
+    texts: list of {content, tags: list of tags IDs, tag_names: list of tags names},
+    on_duplicate: skip (default) or upsert, for the texts already in the dataset,
+    create_tags: create the unknown tag names instead of rejecting them (default false)
+
+    returns the result of every text, in order: its id and created, updated or skipped,
+    or error with the reason
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
+
+
+    def post(self, request, pk):
+        dataset = get_object_or_404(Dataset, pk=pk)
+        serializer = BulkTextCreateSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = bulk_create_texts(
+            dataset,
+            serializer.validated_data['texts'],
+            on_duplicate=serializer.validated_data['on_duplicate'],
+            create_tags=serializer.validated_data['create_tags'],
+        )
+
+        counts = {result_status: 0 for result_status in ('created', 'updated', 'skipped', 'error')}
+        for result in results:
+            counts[result['status']] += 1
+
+        return Response(
+            {
+                "created": counts['created'],
+                "updated": counts['updated'],
+                "skipped": counts['skipped'],
+                "errors": counts['error'],
+                "results": results,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
 class GetListOfTextsOfDatasetByDatasetIDAPIView(APIView):
     """
-    Displays all Texts of a Dataset by dataset id
+    Displays all Texts of a Dataset by dataset id, paginated with a cursor
+
+    query params:
+    cursor (from the next/previous links),
+    page_size
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
     """
     permission_classes = [IsAuthenticated, IsAdminOrHasDatasetAccess]
     
+    @method_decorator(conditional_on_version(dataset_key))
+    @method_decorator(cache_response(dataset_key))
     def get(self, request, pk):
         
         # Retrieve the Dataset by pk or return 404 if not found
         dataset = get_object_or_404(Dataset, pk=pk)
         
-        # Filter texts that belong to this dataset
-        texts = Text.objects.filter(dataset=dataset)
-        serializer = TextSerializer(texts, many=True)
+        # Filter texts that belong to this dataset, one page at a time
+        # Tag ids of the page are loaded with one query
+        texts = Text.objects.filter(dataset=dataset).prefetch_related(prefetch_tag_ids())
+
+        paginator = TextCursorPagination()
+        page = paginator.paginate_queryset(texts, request, view=self)
+        serializer = TextSerializer(page, many=True)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
     
 
+class ExportTextsOfDatasetByDatasetIDAPIView(APIView):
+    """
+    Download all Texts of a Dataset with their tag names by dataset id.
+    The file is streamed while it is read from the database.
+
+    query params:
+    export_format: ndjson (default) - csv,
+    compress: gzip (optional)
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrHasDatasetAccess]
+
+    @method_decorator(conditional_on_version(dataset_key))
+    def get(self, request, pk):
+
+        # Retrieve the Dataset by pk or return 404 if not found
+        dataset = get_object_or_404(Dataset, pk=pk)
+
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"export_format must be one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        compress = request.query_params.get('compress') == 'gzip'
+        filename = f"dataset_{dataset.pk}.{export_format}"
+
+        if compress:
+            content_type = 'application/gzip'
+            filename += '.gz'
+        else:
+            content_type = EXPORT_FORMATS[export_format]
+
+        response = StreamingHttpResponse(
+            export_dataset_texts(dataset, export_format, compress=compress),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['X-Accel-Buffering'] = 'no'  # Let nginx send the first bytes right away
+        return response
+
+
 class GetDetailOfTextByIDAPIView(RetrieveAPIView):
     """
     Displays Text details by text id
+
+    Conditional GET: send back the ETag in If-None-Match to get a 304 when unchanged
     """
     permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
 
     queryset  = Text.objects.all()
     serializer_class = TextSerializer
+
+    @method_decorator(conditional_on_version(text_dataset_key))
+    @method_decorator(cache_response(text_dataset_key))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
     
     
 class UpdateTextByIDAPIView(UpdateAPIView):
@@ -247,7 +413,11 @@ class UpdateTextByIDAPIView(UpdateAPIView):
         """
         
         pk = self.kwargs.get('pk')  # Retrieve pk from URL kwargs
-        return get_object_or_404(Text, pk=pk)
+        text_instance = get_object_or_404(Text, pk=pk)
+
+        # Operators need access to the dataset of the text
+        self.check_object_permissions(self.request, text_instance)
+        return text_instance
 
     
     def put(self, request, *args, **kwargs):
@@ -256,7 +426,7 @@ class UpdateTextByIDAPIView(UpdateAPIView):
 
         # Check user role
         user = request.user
-        is_operator = (hasattr(user, 'profile') and user.profile.role == 'operator')
+        is_operator = get_user_access(user).is_operator
         
         if is_operator:
             raise PermissionDenied("You don't have permission to do this action")
@@ -274,6 +444,8 @@ class UpdateTextByIDAPIView(UpdateAPIView):
         """
         Handle full updates for a Text instance by admins.
         operators can update only the tags field.
+
+        add_tags and remove_tags change only the given tags and keep the others.
         """
         
         # Retrieve the Text instance
@@ -281,35 +453,36 @@ class UpdateTextByIDAPIView(UpdateAPIView):
 
         # Check user role
         user = request.user
-        is_admin = user.is_superuser or (hasattr(user, 'profile') and user.profile.role == 'admin')
+        access = get_user_access(user)
 
-        # If user is an admin, allow updating all fields
-        if is_admin:
-            serializer = self.get_serializer(text_instance, data=request.data, partial=True)
-        else:
-            # For operators, filter data to only include `tags` field
-            allowed_fields = {'tags'}
-            limited_data = {key: value for key, value in request.data.items() if key in allowed_fields}
-            
-            # If the request contains fields outside of allowed ones, raise an error
-            if set(request.data.keys()) - allowed_fields:
-                raise PermissionDenied("You can only update 'tags' field.")
-                
-            serializer = self.get_serializer(text_instance, data=limited_data, partial=True)
+        # For operators, only the tags can be updated
+        allowed_fields = {'tags', 'add_tags', 'remove_tags'}
+        if not access.is_admin and set(request.data.keys()) - allowed_fields:
+            raise PermissionDenied("You can only update 'tags' field.")
+
+        delta_fields = {'add_tags', 'remove_tags'}
+        if delta_fields & set(request.data.keys()):
+            if set(request.data.keys()) - delta_fields:
+                return Response({"error": "'add_tags' and 'remove_tags' can't be combined with other fields."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            return self.change_tags(request, text_instance, access)
+
+        serializer = self.get_serializer(text_instance, data=request.data, partial=True)
 
         # Validate and save the data
         if serializer.is_valid():
             serializer.save()
             
-            # Create a log entry for the operator's action
-            action_description = f"Updated 'tags' field to {limited_data}"
-            Log.objects.create(
-                user=user,
-                text_instance=text_instance,
+            # Create a log entry for the action
+            updated_data = {key: value for key, value in request.data.items()}
+            action_description = f"Updated {', '.join(repr(key) for key in updated_data)} field to {updated_data}"
+            record_activity(
+                user,
+                text_instance.pk,
                 action="update",
-                updated_field="tags",
+                updated_field=", ".join(updated_data),
                 action_details=action_description,
-                datetime=datetime.now()
             )
             
             
@@ -317,6 +490,107 @@ class UpdateTextByIDAPIView(UpdateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+    def change_tags(self, request, text_instance, access):
+        serializer = TagChangeSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        result, = bulk_change_tags(
+            [text_instance.pk],
+            serializer.validated_data['add_tags'],
+            serializer.validated_data['remove_tags'],
+            request.user,
+            access,
+        )
+        if result['status'] == 'error':
+            return Response({"error": result['error']}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(self.get_serializer(text_instance).data, status=status.HTTP_200_OK)
+
+
+class BulkUpdateTextsTagsAPIView(APIView):
+    """
+    Replace the tags of many texts in one request.
+    Admins can update every text, operators the texts of their datasets.
+    
+    headers: 
+    Content-Type: application/json,
+    X-CSRFToken : your-csrf-token
+    
+    fields:
+    items: list of {text_id, tags: list of tags IDs}
+    or
+    text_ids: list of texts IDs,
+    tags: list of tags IDs set on all the texts
+
+    returns the result of every text: updated, or error with the reason
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrCanEditLimitedFields]
+
+
+    def post(self, request):
+        serializer = BulkTagUpdateSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = bulk_set_tags(serializer.validated_data['items'], request.user, get_user_access(request.user))
+
+        return Response(
+            {
+                "updated": sum(1 for result in results if result['status'] == 'updated'),
+                "errors": sum(1 for result in results if result['status'] == 'error'),
+                "results": results,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class BulkChangeTextsTagsAPIView(APIView):
+    """
+    Add tags to and remove tags from many texts in one request,
+    the other tags of the texts are kept.
+    Admins can update every text, operators the texts of their datasets.
+    
+    headers: 
+    Content-Type: application/json,
+    X-CSRFToken : your-csrf-token
+    
+    fields:
+    text_ids: list of texts IDs,
+    add_tags: list of tags IDs,
+    remove_tags: list of tags IDs
+
+    returns the result of every text: the tags really added and removed, or error with the reason
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrCanEditLimitedFields]
+
+
+    def post(self, request):
+        serializer = BulkTagChangeSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = bulk_change_tags(
+            serializer.validated_data['text_ids'],
+            serializer.validated_data['add_tags'],
+            serializer.validated_data['remove_tags'],
+            request.user,
+            get_user_access(request.user),
+        )
+
+        return Response(
+            {
+                "updated": sum(1 for result in results if result['status'] == 'updated'),
+                "errors": sum(1 for result in results if result['status'] == 'error'),
+                "results": results,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
 class DeleteTextByIDAPIView(DestroyAPIView):
     """
     Destroy Text by text id
@@ -329,37 +603,69 @@ class DeleteTextByIDAPIView(DestroyAPIView):
 
 class CountNumberOfTextLabeldByTagUsingDatasetIDAPIView(APIView):
     """
-    Displays number of text labeld with unique Tag in specific Dataset by dataset id
+    Displays number of text labeld with unique active Tag in specific Dataset by dataset id
+
+    query params:
+    include: comma separated extra breakdowns (optional)
+        untagged: number of texts without any active tag,
+        operators: number of logged actions per operator on the dataset texts
+    when include is given the tag counts are returned under "tags"
     """
     permission_classes = [IsAuthenticated, IsAdminOrHasDatasetAccess]
     
+    breakdowns = {'untagged', 'operators'}
     
+    
+    @method_decorator(cache_response(dataset_tag_counts_key))
     def get(self, request, pk):
         try:
             dataset = Dataset.objects.get(pk=pk)
         except Dataset.DoesNotExist:
             return Response({"error": "Dataset not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Get all texts for this dataset
-        texts = Text.objects.filter(dataset=dataset)
+        include = {name.strip() for name in request.query_params.get('include', '').split(',') if name.strip()}
+        if include - self.breakdowns:
+            return Response(
+                {"error": f"include must be a comma separated list of: {', '.join(sorted(self.breakdowns))}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Read the maintained counters of the active tags of this dataset,
+        # sorted alphabetically
+        tag_counts = (
+            TagCount.objects
+            .filter(dataset=dataset, tag__is_active=True, count__gt=0)
+            .values_list('tag__name')
+            .annotate(count=Sum('count'))
+            .order_by('tag__name')
+        )
+        sorted_tag_counts = dict(tag_counts)
 
-        # Group texts by tag and count occurrences
-        tag_counts = {}
-        for text in texts:
-            for tag in text.tags.all():
-                if tag.is_active and tag.name not in tag_counts:
-                    tag_counts[tag.name] = 0
-                tag_counts[tag.name] += 1
+        if not include:
+            return Response(sorted_tag_counts)
 
-        # Sort tags alphabetically
-        sorted_tag_counts = dict(sorted(tag_counts.items()))
+        data = {"tags": sorted_tag_counts}
 
-        return Response(sorted_tag_counts)
+        if 'untagged' in include:
+            data["untagged"] = Text.objects.filter(dataset=dataset).exclude(tags__is_active=True).count()
+
+        if 'operators' in include:
+            data["operators"] = dict(
+                Log.objects.filter(text_instance__dataset=dataset)
+                .values_list('user__username')
+                .annotate(count=Count('id'))
+                .order_by('user__username')
+            )
+
+        return Response(data)
 
 
 class FullTextSearchWithinTextsInDatasetByDatasetIDAPIView(APIView):
     """
     Search for texts within a specific dataset by dataset id based on a query string.
+    Uses the full-text index of TEXT_SEARCH_BACKEND: results are ranked by relevance,
+    paginated with a cursor (query params: cursor, page_size), and the search
+    time is returned in took_ms.
     """
     permission_classes = [IsAuthenticated, IsAdminOrHasDatasetAccess]
     
@@ -368,26 +674,40 @@ class FullTextSearchWithinTextsInDatasetByDatasetIDAPIView(APIView):
         # Get the dataset by name or return 404 if it does not exist
         dataset = get_object_or_404(Dataset, pk=pk)
 
-        # Filter texts that belong to this dataset and contain the search string
-        texts = Text.objects.filter(dataset=dataset).filter(
-            Q(content__icontains=search_string)
+        # Search the index for one page of text ids, best matches first
+        backend = get_search_backend()
+        paginator = SearchCursorPagination()
+
+        started = time.perf_counter()
+        hits = paginator.paginate_hits(
+            lambda limit, after: backend.search(dataset.pk, search_string, limit, after=after),
+            request
         )
+        took_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        # Load the texts of the page and keep the ranking order
+        texts = Text.objects.prefetch_related(prefetch_tag_ids()).in_bulk([text_id for text_id, score in hits])
+        ranked_texts = [texts[text_id] for text_id, score in hits if text_id in texts]
 
         # Serialize the results
-        serializer = TextSerializer(texts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = TextSerializer(ranked_texts, many=True)
+        return paginator.get_paginated_response(serializer.data, took_ms=took_ms)
     
     
 class UploadCSVFileCreateAPIView(CreateAPIView):
     """
-    Upload file to import data from csv file to database
+    Upload file to import data from csv file to database.
+    The file is saved on disk and imported in background by a Celery worker,
+    the response contains the id of the import job to follow its progress.
     
     headers: 
     Content-Type: application/json,
     X-CSRFToken : your-csrf-token
     
     fields:
-    file (just .csv file)
+    file (just .csv file),
+    shards: number of parts imported in parallel (default=1),
+            only for files with one row per line
     """
     permission_classes = [IsAuthenticated, IsAdminUser]
     serializer_class = FileUploadSerializer
@@ -402,61 +722,141 @@ class UploadCSVFileCreateAPIView(CreateAPIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         file = serializer.validated_data['file']
+        shards = serializer.validated_data['shards']
+
+        # Step 2: Save the file on disk and create the import job
+        job = ImportJob.objects.create(user_id=request.user.pk, file=file, shards=shards, total_bytes=file.size)
+
+        # Step 3: Hand the file over to the Celery workers
+        task = import_csv_file if shards == 1 else import_csv_file_sharded
+        transaction.on_commit(lambda: task.delay(str(job.pk)))
+
+        return Response(
+            {
+                "message": "File received, the import will run in background",
+                "job_id": job.pk,
+                "status_url": reverse('import_job_status', kwargs={'pk': job.pk}),
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class GetImportJobStatusByIDAPIView(RetrieveAPIView):
+    """
+    Displays the progress of a CSV import job by job id:
+    rows processed, rows/sec, errors and estimated remaining time
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
+
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
 
+
+class GetDailyActivityReportAPIView(APIView):
+    """
+    Displays the number of actions per day, user, dataset and action,
+    read from the daily activity rollups (computed every night for the previous day).
+
+    query params (all optional):
+    start, end: first and last day, YYYY-MM-DD (default: the last 30 days)
+    dataset: dataset id
+    user: user id
+    action: e.g. update
+    group_by: comma separated list of day, user, dataset, action (default: all of them)
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
+
+    group_by_fields = {
+        'day': ['day'],
+        'user': ['user_id', 'user__username'],
+        'dataset': ['dataset_id', 'dataset__name'],
+        'action': ['action'],
+    }
+    output_names = {'user__username': 'username', 'dataset__name': 'dataset_name'}
+
+    def get(self, request):
         try:
-            # Step 2: Process the CSV data
-            csv_reader = csv.DictReader(file.read().decode('utf-8').splitlines())
-
-            with transaction.atomic():  # Ensure all-or-nothing on database actions
-                for row in csv_reader:
-                    # Extract fields from CSV row
-                    dataset_name = row.get('dataset_name')
-                    tags_names = row.get('tags_name', '').split(' ')
-                    text_content = row.get('text_content')
-
-                    if not dataset_name or not text_content:
-                        return Response(
-                            {"error": "Each row must contain 'dataset_name' and 'text_content'."},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-
-                    # Step 3: Get or create the Dataset instance
-                    dataset, created = Dataset.objects.get_or_create(name=dataset_name)
-                    
-                    # Step 4: Get or create the Tag instances for this Dataset
-                    tag_objects = []
-                    for tag_name in tags_names:
-                        tag_name = tag_name.strip()
-                        
-                        if tag_name:
-                            tag, created = Tag.objects.get_or_create(
-                            name=tag_name,
-                            dataset=dataset,  # Ensure the tag is associated with the current dataset
-                            defaults={'dataset': dataset}
-                            )
-
-                            # If tag already exists with a different dataset, raise an error
-                            if not created and tag.dataset != dataset:
-                                return Response(
-                                    {"error": f"Tag '{tag_name}' is already associated with another dataset."},
-                                    status=status.HTTP_400_BAD_REQUEST
-                                )
-
-                        tag_objects.append(tag)
-                        
-                    # Step 5: Check if a Text instance already exists for the same dataset and content
-                    text_instance, created = Text.objects.update_or_create(
-                        content=text_content,
-                        dataset=dataset,
-                    )
-
-                    # Step 6: Associate tags with the Text instance
-                    text_instance.tags.set(tag_objects)
-
-            return Response({"message": "File processed successfully"}, status=status.HTTP_201_CREATED)
-
-        except Exception as e:
-            return Response(
-                {"error": f"An error occurred while processing the file: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params \
+                else timezone.localdate() - timedelta(days=1)
+            start = date.fromisoformat(request.query_params['start']) if 'start' in request.query_params \
+                else end - timedelta(days=29)
+        except ValueError:
+            return Response({"error": "start and end must be dates formatted as YYYY-MM-DD."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        group_by = [value for value in request.query_params.get('group_by', 'day,user,dataset,action').split(',') if value]
+        unknown = set(group_by) - set(self.group_by_fields)
+        if unknown or not group_by:
+            return Response({"error": f"group_by must be a list of {', '.join(self.group_by_fields)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = DailyActivityRollup.objects.filter(day__gte=start, day__lte=end)
+
+        for param in ('dataset', 'user'):
+            if param in request.query_params:
+                if not request.query_params[param].isdigit():
+                    return Response({"error": f"{param} must be an id."}, status=status.HTTP_400_BAD_REQUEST)
+
+                rollups = rollups.filter(**{f'{param}_id': int(request.query_params[param])})
+
+        if 'action' in request.query_params:
+            rollups = rollups.filter(action=request.query_params['action'])
+
+        fields = [field for group in group_by for field in self.group_by_fields[group]]
+        rows = rollups.values(*fields).annotate(total=Sum('count')).order_by(*fields)
+
+        results = [
+            dict({self.output_names.get(field, field): row[field] for field in fields}, count=row['total'])
+            for row in rows
+        ]
+
+        return Response({
+            "start": start,
+            "end": end,
+            "total": sum(result['count'] for result in results),
+            "results": results,
+        })
+
+
+class GetArchivedLogsAPIView(APIView):
+    """
+    Streams the archived Log entries (older than LOG_RETENTION_DAYS) of a range of days as NDJSON,
+    the archive files are read lazily, one day at a time.
+
+    query params:
+    start, end: first and last day, YYYY-MM-DD, at most max_days days
+    dataset: dataset id (optional)
+    user: user id (optional)
+    action: e.g. update (optional)
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only admins can access
+    max_days = 31
+
+    def get(self, request):
+        try:
+            start = date.fromisoformat(request.query_params['start'])
+            end = date.fromisoformat(request.query_params['end'])
+        except (KeyError, ValueError):
+            return Response({"error": "start and end are required, formatted as YYYY-MM-DD."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not 0 <= (end - start).days < self.max_days:
+            return Response({"error": f"end must be after start, and the range at most {self.max_days} days."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        filters = {}
+        for param in ('dataset', 'user'):
+            if param in request.query_params:
+                if not request.query_params[param].isdigit():
+                    return Response({"error": f"{param} must be an id."}, status=status.HTTP_400_BAD_REQUEST)
+
+                filters[f'{param}_id'] = int(request.query_params[param])
+
+        entries = iter_archived_logs(start, end, action=request.query_params.get('action'), **filters)
+
+        response = StreamingHttpResponse(
+            (json.dumps(entry, cls=DjangoJSONEncoder) + '\n' for entry in entries),
+            content_type='application/x-ndjson',
+        )
+        response['X-Accel-Buffering'] = 'no'  # Let nginx send the first bytes right away
+        return response